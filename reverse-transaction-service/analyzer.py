@@ -4,8 +4,65 @@ import json
 import pandas as pd
 import numpy as np
 import google.generativeai as genai
+from types import MappingProxyType
 from concurrent.futures import ThreadPoolExecutor
 from standards import standards_info, standard_keywords
+from keyword_matcher import KeywordMatcher
+
+def _freeze(groups):
+    """Read-only copy of keyword lists: a mapping of tuples without duplicates."""
+    return MappingProxyType({group: tuple(dict.fromkeys(keywords)) for group, keywords in groups.items()})
+
+# Arabic terminology for each standard
+ARABIC_TERMS = _freeze({
+    "FAS 4": ["مشاركة", "شراكة", "ربح وخسارة"],
+    "FAS 7": ["سلم", "سلم موازي", "بيع السلم"],
+    "FAS 10": ["استصناع", "استصناع موازي", "عقد الاستصناع"],
+    "FAS 28": ["مرابحة", "بيع مؤجل", "بيع بالتقسيط"],
+    "FAS 32": ["إجارة", "إجارة منتهية بالتمليك", "تأجير"]
+})
+
+# Standard keywords with their Arabic terms, built once per process
+# (standards.standard_keywords itself is never modified)
+STANDARD_KEYWORDS = _freeze({
+    standard: list(keywords) + list(ARABIC_TERMS.get(standard, ()))
+    for standard, keywords in standard_keywords.items()
+})
+
+# Common ambiguities and clarifications needed
+AMBIGUITY_PATTERNS = _freeze({
+    "hybrid_contracts": [
+        "combination", "hybrid", "mixed", "multiple components", 
+        "coupled with", "together with", "alongside"
+    ],
+    "sequential_transactions": [
+        "followed by", "subsequent", "then", "after which", 
+        "upon completion", "next step"
+    ],
+    "implicit_structures": [
+        "effectively", "in essence", "implicitly", "underlying", 
+        "de facto", "in reality", "fundamentally"
+    ]
+})
+
+# Transaction complexity indicators, reported as the "complex_structure" ambiguity
+COMPLEXITY_INDICATORS = (
+    "complex", "multi-stage", "series of", "arrangement", "structure", 
+    "combined", "thereafter", "subsequently"
+)
+
+# Word stems marking reversal and impairment transactions
+FEATURE_TERMS = _freeze({
+    "is_reversal": ["revers", "adjust", "correct", "terminat", "default", "cancel"],
+    "is_impairment": ["impair", "loss", "provision", "allowance"]
+})
+
+# Every keyword list above, matched in one pass over the normalized transaction text
+KEYWORD_MATCHER = KeywordMatcher(
+    STANDARD_KEYWORDS,
+    flag_groups={**AMBIGUITY_PATTERNS, "complex_structure": COMPLEXITY_INDICATORS, **FEATURE_TERMS},
+    normalize=True
+)
 
 class IslamicFinanceMultiAgentAnalyzer:
     def __init__(self, api_key):
@@ -36,37 +93,14 @@ class IslamicFinanceMultiAgentAnalyzer:
         # Standard information (simplified for brevity)
         self.standards_info = standards_info
         
-        # Add Arabic terminology for each standard
-        self.arabic_terms = {
-            "FAS 4": ["مشاركة", "شراكة", "ربح وخسارة"],
-            "FAS 7": ["سلم", "سلم موازي", "بيع السلم"],
-            "FAS 10": ["استصناع", "استصناع موازي", "عقد الاستصناع"],
-            "FAS 28": ["مرابحة", "بيع مؤجل", "بيع بالتقسيط"],
-            "FAS 32": ["إجارة", "إجارة منتهية بالتمليك", "تأجير"]
-        }
+        # Arabic terminology for each standard
+        self.arabic_terms = ARABIC_TERMS
         
-        # Standard keywords and patterns (simplified)
-        self.standard_keywords = standard_keywords
-        
-        # Add Arabic keywords to standard_keywords
-        for standard, arabic_list in self.arabic_terms.items():
-            self.standard_keywords[standard].extend(arabic_list)
+        # Standard keywords including the Arabic terms (read-only, shared by all instances)
+        self.standard_keywords = STANDARD_KEYWORDS
             
         # Common ambiguities and clarifications needed
-        self.ambiguity_patterns = {
-            "hybrid_contracts": [
-                "combination", "hybrid", "mixed", "multiple components", 
-                "coupled with", "together with", "alongside"
-            ],
-            "sequential_transactions": [
-                "followed by", "subsequent", "then", "after which", 
-                "upon completion", "next step"
-            ],
-            "implicit_structures": [
-                "effectively", "in essence", "implicitly", "underlying", 
-                "de facto", "in reality", "fundamentally"
-            ]
-        }
+        self.ambiguity_patterns = AMBIGUITY_PATTERNS
     
     def create_agent_prompts(self, transaction_text, features):
         """Create specialized prompts for each agent"""
@@ -371,32 +405,18 @@ class IslamicFinanceMultiAgentAnalyzer:
         
     def preprocess_transaction(self, transaction_text):
         """Extract key features from transaction text with enhanced ambiguity detection"""
-        text = transaction_text.lower()
+        scan = KEYWORD_MATCHER.scan(transaction_text)
         
         # Basic features
         features = {
-            "is_reversal": any(term in text for term in ["revers", "adjust", "correct", "terminat", "default", "cancel"]),
-            "is_impairment": any(term in text for term in ["impair", "loss", "provision", "allowance"]),
-            "keywords_by_standard": {},
-            "potential_ambiguities": []
+            "is_reversal": "is_reversal" in scan["flags"],
+            "is_impairment": "is_impairment" in scan["flags"],
+            # Standard-specific keyword counts and (position, keyword) matches
+            "keywords_by_standard": scan["counts"],
+            "keyword_positions": {standard: matches for standard, matches in scan["positions"].items() if matches},
+            # Potential ambiguities, including transaction complexity
+            "potential_ambiguities": [flag for flag in scan["flags"] if flag not in FEATURE_TERMS]
         }
-        
-        # Count standard-specific keywords
-        for standard, keywords in self.standard_keywords.items():
-            features["keywords_by_standard"][standard] = sum(1 for keyword in keywords if keyword in text)
-            
-        # Check for potential ambiguities
-        for ambiguity_type, patterns in self.ambiguity_patterns.items():
-            if any(pattern in text for pattern in patterns):
-                features["potential_ambiguities"].append(ambiguity_type)
-                
-        # Check for transaction complexity indicators
-        complexity_indicators = [
-            "complex", "multi-stage", "series of", "arrangement", "structure", 
-            "combined", "thereafter", "subsequently"
-        ]
-        if any(indicator in text for indicator in complexity_indicators):
-            features["potential_ambiguities"].append("complex_structure")
             
         return features
     
@@ -0,0 +1,97 @@
+"""
+Check that transaction preprocessing cost stays constant as analyzers are created.
+
+The previous load_standard_data appended the Arabic terms to the shared
+standards.standard_keywords lists on every instantiation, so the keyword
+lists, preprocess_transaction time and keyword counts grew with every
+analyzer a process created (tests, workers, reloads). That behaviour is
+reproduced below as the baseline, next to real analyzers, which share one
+frozen keyword index.
+
+Run from the reverse-transaction-service directory:
+    python benchmarks/preprocess_benchmark.py --instances 1,10,100,1000
+"""
+
+import os
+import sys
+import copy
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from standards import standard_keywords
+from analyzer import (
+    IslamicFinanceMultiAgentAnalyzer, ARABIC_TERMS, AMBIGUITY_PATTERNS, COMPLEXITY_INDICATORS, FEATURE_TERMS
+)
+
+SAMPLE_TRANSACTIONS = [
+    "The bank reversed the Ijarah Muntahia Bittamleek lease after the lessee defaulted; "
+    "the right-of-use asset was impaired and the remaining rentals were cancelled.",
+    "Partial buyout of the partner's share in a diminishing Musharaka, followed by an adjustment "
+    "of the profit sharing ratio. إجارة منتهية بالتمليك و مشاركة متناقصة",
+    "The Istisna'a project was terminated at 60% completion; work-in-progress was written off "
+    "and a provision for bad debt was recognised on the progress billing receivable.",
+]
+
+class LegacyKeywords:
+    """The keyword handling of the analyzer before the frozen index."""
+
+    def __init__(self, shared_keywords):
+        # Every instance extended the same shared lists
+        self.standard_keywords = shared_keywords
+        for standard, arabic_list in ARABIC_TERMS.items():
+            self.standard_keywords[standard].extend(arabic_list)
+
+    def preprocess_transaction(self, transaction_text):
+        text = transaction_text.lower()
+        features = {
+            "is_reversal": any(term in text for term in FEATURE_TERMS["is_reversal"]),
+            "is_impairment": any(term in text for term in FEATURE_TERMS["is_impairment"]),
+            "keywords_by_standard": {},
+            "potential_ambiguities": []
+        }
+        for standard, keywords in self.standard_keywords.items():
+            features["keywords_by_standard"][standard] = sum(1 for keyword in keywords if keyword in text)
+        for ambiguity_type, patterns in AMBIGUITY_PATTERNS.items():
+            if any(pattern in text for pattern in patterns):
+                features["potential_ambiguities"].append(ambiguity_type)
+        if any(indicator in text for indicator in COMPLEXITY_INDICATORS):
+            features["potential_ambiguities"].append("complex_structure")
+        return features
+
+def time_preprocess(analyzer, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in SAMPLE_TRANSACTIONS:
+            analyzer.preprocess_transaction(text)
+    return (time.perf_counter() - start) / (repeat * len(SAMPLE_TRANSACTIONS)) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing across analyzer instantiations.")
+    parser.add_argument("--instances", default="1,10,100,1000", help="Analyzers created before each measurement")
+    parser.add_argument("--repeat", type=int, default=100, help="Timed passes over the sample transactions")
+    args = parser.parse_args()
+
+    api_key = os.getenv("GEMINI_API_KEY", "benchmark")
+    legacy_keywords = copy.deepcopy(standard_keywords)
+    legacy = current = None
+    created = 0
+    print(f"{'Instances':>9} {'Legacy keywords':>16} {'Legacy ms':>10} {'Legacy FAS 32 votes':>20} "
+          f"{'Keywords':>9} {'Current ms':>11} {'FAS 32 votes':>13}")
+    for instances in (int(value) for value in args.instances.split(",")):
+        while created < instances:
+            legacy = LegacyKeywords(legacy_keywords)
+            current = IslamicFinanceMultiAgentAnalyzer(api_key=api_key)
+            created += 1
+        legacy_ms = time_preprocess(legacy, args.repeat)
+        current_ms = time_preprocess(current, args.repeat)
+        legacy_votes = legacy.preprocess_transaction(SAMPLE_TRANSACTIONS[1])["keywords_by_standard"]["FAS 32"]
+        votes = current.preprocess_transaction(SAMPLE_TRANSACTIONS[1])["keywords_by_standard"]["FAS 32"]
+        legacy_total = sum(len(keywords) for keywords in legacy.standard_keywords.values())
+        total = sum(len(keywords) for keywords in current.standard_keywords.values())
+        print(f"{instances:>9} {legacy_total:>16} {legacy_ms:>10.3f} {legacy_votes:>20} "
+              f"{total:>9} {current_ms:>11.3f} {votes:>13}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Compiled keyword matching for standard detection.
+
+All keyword lists are compiled into one trie-shaped regular expression
+that is tried at every position of a text in a single pass, so finding the
+keywords of every standard (and of other keyword groups, such as ambiguity
+markers) costs one scan instead of one substring search per keyword.
+Keywords nested in others ("salam" in "parallel salam") are all found.
+Optionally, keywords and texts are normalized alike first (see
+normalize_text), so spelling variants of Arabic and English terms match.
+
+The usecase and reverse-transaction services are built from separate
+Docker contexts, so each keeps an identical copy of this module.
+"""
+
+import re
+
+# Plural and verb endings allowed after a keyword when matching whole words
+_ENDINGS = re.compile(r"(?:s|d|ed|es|ing)?\b", re.IGNORECASE)
+
+# Arabic hamza and alef variants, alef maqsura and taa marbuta, typographic
+# apostrophes and dashes map to one form; Arabic diacritics and tatweel are dropped
+_NORMALIZATION = str.maketrans({
+    **{char: "ا" for char in "أإآٱ"}, "ى": "ي", "ة": "ه",
+    **{char: "'" for char in "‘’ʼ"}, **{char: "-" for char in "‐‑‒–—"},
+    **{chr(code): None for code in list(range(0x064B, 0x0653)) + [0x0670, 0x0640]},
+})
+
+def normalize_text(text):
+    """
+    Normalize a text for bilingual keyword matching: lowercase it, unify Arabic
+    letter variants, apostrophes and dashes, and drop Arabic diacritics.
+
+    Args:
+        text (str): The text to normalize
+
+    Returns:
+        str: The normalized text
+    """
+    return text.lower().translate(_NORMALIZATION)
+
+def _trie_pattern(keywords):
+    """A regex matching the longest of ``keywords`` that starts at the current position."""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A keyword ending here still matches when no longer one does
+        return "(?:" + body + ")?" if "" in node else body
+
+    return emit(trie)
+
+class KeywordMatcher:
+    """
+    Find the keywords of several groups in one pass over a text.
+
+    Args:
+        groups (dict): Group name (e.g. a standard) -> list of keywords
+        flag_groups (dict, optional): Groups only reported as present or absent, such as ambiguity markers
+        whole_words (bool): Only match whole words, allowing plural and verb endings
+            ("rou" must not match "through"); each group then counts non-overlapping matches
+        ignore_case (bool): Match case-insensitively
+        normalize (bool): Normalize keywords and texts with normalize_text; positions
+            then refer to the normalized text
+    """
+
+    def __init__(self, groups, flag_groups=None, whole_words=False, ignore_case=False, normalize=False):
+        flag_groups = flag_groups or {}
+        self.groups = tuple(groups)
+        self.flag_groups = tuple(flag_groups)
+        self.whole_words = whole_words
+        self.ignore_case = ignore_case
+        self.normalize = normalize
+
+        self._keyword_groups = {}
+        for group, keywords in list(groups.items()) + list(flag_groups.items()):
+            for keyword in keywords:
+                if normalize:
+                    keyword = normalize_text(keyword)
+                keyword_groups = self._keyword_groups.setdefault(keyword.lower() if ignore_case else keyword, [])
+                if group not in keyword_groups:
+                    keyword_groups.append(group)
+        # Every keyword a keyword starts with (longest first) matches wherever that keyword does
+        self._prefixes = {
+            keyword: sorted((other for other in self._keyword_groups if keyword.startswith(other)), key=len, reverse=True)
+            for keyword in self._keyword_groups
+        }
+        # Zero-width, so that keywords starting inside an earlier match are found as well
+        self._pattern = re.compile(
+            (r"\b" if whole_words else "") + "(?=(" + _trie_pattern(self._keyword_groups) + "))",
+            re.IGNORECASE if ignore_case else 0
+        )
+
+    def scan(self, text):
+        """
+        Find the keywords of every group in a text.
+
+        Args:
+            text (str): The text to scan
+
+        Returns:
+            dict: "counts" (group -> number of distinct keywords found), "positions"
+            (group -> list of (start, keyword) in text order) and "flags" (the flag
+            groups with a keyword in the text, in declaration order)
+        """
+        if self.normalize:
+            text = normalize_text(text)
+        found = {group: set() for group in self.groups + self.flag_groups}
+        positions = {group: [] for group in self.groups}
+        # Whole words: where each group's last match ended, as matches do not overlap
+        ends = {}
+        for match in self._pattern.finditer(text):
+            start = match.start()
+            longest = match.group(1).lower() if self.ignore_case else match.group(1)
+            # .get: a few case folds (such as "ſ" for "s") do not survive lower()
+            for keyword in self._prefixes.get(longest, ()):
+                end = start + len(keyword)
+                if self.whole_words:
+                    ending = _ENDINGS.match(text, end)
+                    if ending is None:
+                        continue
+                    end = ending.end()
+                for group in self._keyword_groups[keyword]:
+                    if self.whole_words:
+                        if ends.get(group, 0) > start:
+                            continue
+                        ends[group] = end
+                    found[group].add(keyword)
+                    if group in positions:
+                        positions[group].append((start, keyword))
+        return {
+            "counts": {group: len(found[group]) for group in self.groups},
+            "positions": positions,
+            "flags": [group for group in self.flag_groups if found[group]],
+        }
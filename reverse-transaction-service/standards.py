@@ -136,7 +136,7 @@ standard_keywords = {
         "impairment of receivables", "bad debt"
     ],
     "FAS 14": [
-        "investment funds", "fund management", "unit holders", "net asset value", "NAV",
+        "investment funds", "fund management", "unit holders", "net asset value",
         "fund assets", "management fee", "profit distribution", "unit issuance", "unit redemption"
     ],
     "FAS 16": [
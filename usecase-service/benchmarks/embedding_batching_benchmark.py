@@ -0,0 +1,85 @@
+"""
+Compare query embedding throughput with and without the micro-batching embedding worker.
+
+Several threads embed one query at a time, as concurrent requests to the
+service do. They either call the model directly or go through an
+EmbeddingWorker, which merges the requests arriving within its wait window
+into one encoder call.
+
+Run from the usecase-service directory:
+    python benchmarks/embedding_batching_benchmark.py --threads 1,4,16 --queries 256
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.constants import DEFAULT_EMBEDDING_MODEL, EMBED_MAX_BATCH_SIZE, EMBED_MAX_WAIT_MS
+from utils.embedding import EmbeddingWorker, load_embedding_model
+from utils.examples import EXAMPLES_FILE
+
+SAMPLE_QUERIES = [
+    "How is the deferred profit of a Murabaha recognised?",
+    "What are the lessee's journal entries for an Ijarah MBT?",
+    "How does a bank account for a parallel Salam contract?",
+    "Revenue recognition for Istisna'a using the percentage of completion method",
+    "When should Sukuk be classified at amortised cost?",
+    "How are losses shared in a diminishing Musharaka?",
+]
+
+def load_queries(count):
+    queries = list(SAMPLE_QUERIES)
+    try:
+        with open(EXAMPLES_FILE, "r") as f:
+            for examples in json.load(f).values():
+                queries.extend(example["query"][:500] for example in examples)
+    except (OSError, json.JSONDecodeError):
+        pass
+    return [queries[i % len(queries)] for i in range(count)]
+
+def run(embed_query, queries, threads):
+    """Embed every query from ``threads`` concurrent callers; return queries/s and latency percentiles."""
+    latencies = []
+
+    def call(text):
+        start = time.perf_counter()
+        embed_query(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(call, queries))
+    elapsed = time.perf_counter() - start
+    return len(queries) / elapsed, float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the micro-batching embedding worker.")
+    parser.add_argument("--embedding_model", type=str, default=DEFAULT_EMBEDDING_MODEL, help="HuggingFace model name")
+    parser.add_argument("--threads", default="1,4,16", help="Concurrent callers")
+    parser.add_argument("--queries", type=int, default=256, help="Queries per run")
+    parser.add_argument("--max_batch_size", type=int, default=EMBED_MAX_BATCH_SIZE)
+    parser.add_argument("--max_wait_ms", type=float, default=EMBED_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    model = load_embedding_model(args.embedding_model)
+    worker = EmbeddingWorker(model, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    queries = load_queries(args.queries)
+    model.embed_documents(queries[:8])  # warm-up
+
+    print(f"{args.queries} queries, model {args.embedding_model}, "
+          f"worker batch <= {args.max_batch_size}, wait {args.max_wait_ms} ms")
+    print(f"{'Threads':>7} {'Mode':<8} {'q/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for threads in (int(value) for value in args.threads.split(",")):
+        for mode, embed_query in (("direct", model.embed_query), ("worker", worker.embed_query)):
+            rate, p50, p99 = run(embed_query, queries, threads)
+            print(f"{threads:>7} {mode:<8} {rate:>8.1f} {p50:>8.2f} {p99:>8.2f}")
+    print(f"Worker: {worker.stats()}")
+
+if __name__ == "__main__":
+    main()
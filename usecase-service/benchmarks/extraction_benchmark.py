@@ -0,0 +1,199 @@
+"""
+Compare the single-pass numeric extractor with the per-field regexes it replaced.
+
+The legacy extractors (one ``label.*?CURRENCY amount`` search per field) are
+reproduced below as the baseline. Inputs are the validated examples and
+synthetic scenarios repeated to growing lengths, plus two worst cases on
+one long line: a label that recurs with no amount ever stated, which made
+each legacy search quadratic, and a label that recurs before numbers that
+never carry a currency, which must not make every label rescan the line.
+The outputs of both extractors are compared on every input, and the
+intended differences in KNOWN_DIFFERENCES are checked on their own. The
+legacy extractors are only timed on one-line inputs up to
+--legacy-max-chars, since they are quadratic there.
+
+Run from the usecase-service directory:
+    python benchmarks/extraction_benchmark.py --sizes 1,10,100,1000
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.examples import EXAMPLES_FILE
+from utils.extraction import (
+    extract_ijarah_variables, extract_murabaha_variables, extract_istisna_variables, extract_musharaka_variables
+)
+
+_CURRENCY = r'(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)'
+
+LEGACY_PATTERNS = {
+    "ijarah": {
+        'purchase_price': r'(?:purchased|purchase price|cost|bought).*?' + _CURRENCY,
+        'import_tax': r'(?:import tax|tax|duty).*?' + _CURRENCY,
+        'freight_charges': r'(?:freight|shipping|transportation|delivery).*?' + _CURRENCY,
+        'yearly_rental': r'(?:yearly rental|annual rent|rent per year|annual rental|per year).*?' + _CURRENCY,
+        'lease_term': r'(?:lease term|term of|period of|duration).*?([0-9,.]+)[\s](?:year|yr|yrs|years)',
+        'residual_value': r'(?:residual value|expected.*?value|value at end).*?' + _CURRENCY,
+        'purchase_option': r'(?:purchase option|option to purchase|purchase price at end).*?' + _CURRENCY
+    },
+    "murabaha": {
+        'cost_price': r'(?:cost price|purchase price|acquired for|bought for).*?' + _CURRENCY,
+        'selling_price': r'(?:selling price|sold for|sale price|sells at).*?' + _CURRENCY,
+        'profit_rate': r'(?:profit rate|markup|mark-up|margin).*?([0-9,.]+)[\s]*(?:%|percent)',
+        'installments': r'(?:installment|instalment|payment).+?([0-9]+)[\s]*(?:payment|installment|monthly|quarterly|annual)',
+        'down_payment': r'(?:down payment|advance|initial payment).*?' + _CURRENCY
+    },
+    "istisna": {
+        'contract_value': r'(?:price|contract value|agreed price|contract amount).*?' + _CURRENCY,
+        'total_cost': r'(?:cost|total cost|estimated cost|contractor.*?cost).*?' + _CURRENCY,
+        # The unit is captured so years convert to months, as the label map now does
+        'delivery_period': r'(?:delivery|completion|construction).*?([0-9,.]+)[\s]*(month|months|year|years)',
+        'installments': r'(?:installment|payment).*?([0-9]+)[\s]*(?:quarterly|monthly|annual|installment)',
+        'upfront_payment': r'(?:upfront|advance|initial).*?' + _CURRENCY,
+        'completion_payment': r'(?:completion|final).*?' + _CURRENCY
+    },
+    "musharaka": {
+        'capital_contribution_bank': r'(?:bank|islamic bank|financial institution).*?(?:capital|contributed|invested).*?' + _CURRENCY,
+        'capital_contribution_partner': r'(?:client|partner|customer).*?(?:capital|contributed|invested).*?' + _CURRENCY,
+        'profit_ratio_bank': r'(?:bank|islamic bank).*?(?:profit|share|ratio).*?([0-9,.]+)[\s]*(?:%|percent)',
+        'profit_ratio_partner': r'(?:client|partner|customer).*?(?:profit|share|ratio).*?([0-9,.]+)[\s]*(?:%|percent)',
+        'partnership_term': r'(?:partnership|contract|musharaka).*?(?:term|period|duration).*?([0-9,.]+)[\s]*(?:year|yr|yrs|years|month|months)',
+        'diminishing_rate': r'(?:diminishing|decrease|reduce).*?([0-9,.]+)[\s]*(?:%|percent).*?(?:per year|annually|each year)'
+    },
+}
+
+LEGACY_ISTISNA_FIRST = [
+    ('contract_value', r'[Pp]rice:? \$?([0-9,.]+)', 0),
+    ('total_cost', r'[Cc]ost:? \$?([0-9,.]+)', 0),
+    ('upfront_payment', r'\$?([0-9,.]+)\s*upfront', re.IGNORECASE),
+    ('completion_payment', r'\$?([0-9,.]+)\s*on completion', re.IGNORECASE),
+]
+
+def legacy_extract(standard, text):
+    """The per-field regex extraction the single-pass extractor replaced."""
+    values = {}
+    if standard == "istisna":
+        for key, pattern, flags in LEGACY_ISTISNA_FIRST:
+            match = re.search(pattern, text, flags)
+            if match:
+                try:
+                    values[key] = float(match.group(1).replace(',', ''))
+                except ValueError:
+                    pass
+    for key, pattern in LEGACY_PATTERNS[standard].items():
+        if key in values:
+            continue
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            try:
+                values[key] = float(match.group(1).replace(',', ''))
+            except ValueError:
+                continue
+            if key == 'delivery_period' and match.group(2).lower().startswith('year'):
+                values[key] *= 12
+    if standard == "musharaka":
+        lower = text.lower()
+        values['is_diminishing'] = 'diminish' in lower or 'decline' in lower or 'gradually' in lower
+    return values
+
+EXTRACTORS = {
+    "ijarah": extract_ijarah_variables,
+    "murabaha": extract_murabaha_variables,
+    "istisna": extract_istisna_variables,
+    "musharaka": extract_musharaka_variables,
+}
+
+SYNTHETIC = [
+    "The bank purchased equipment for USD 450,000 and paid import tax of USD 12,000.\n"
+    "Freight charges were USD 30,000. The lease term is 2 years with a yearly rental of USD 300,000.\n"
+    "The expected residual value is USD 5,000 and the purchase option price at end is USD 3,000.",
+    "Cost price: USD 100,000. Selling price: USD 120,000 with a markup of 20% paid in 12 monthly installments.\n"
+    "A down payment of USD 10,000 is due at signing.",
+    "Istisna'a contract price: $2,000,000 and total cost $1,700,000, $500,000 upfront, $1,500,000 on completion.\n"
+    "Construction will take 18 months with payments in 4 quarterly installments.",
+    "The Islamic bank contributed capital of SAR 600,000 and the partner invested capital of SAR 400,000.\n"
+    "The bank's profit share is 60% and the partner's profit share is 40%. The partnership term is 5 years.\n"
+    "The bank's share will decrease by 10% per year.",
+]
+
+# Inputs where the single-pass extractor intentionally differs:
+# (standard, text, legacy output, single-pass output)
+KNOWN_DIFFERENCES = [
+    # A stray "," or "." after a currency or label was captured as the amount, float()
+    # failed and the field was dropped; the single-pass extractor takes the next number
+    ("ijarah", "The bank purchased equipment for USD, . and later paid USD 300 for it.",
+     {}, {'purchase_price': 300.0}),
+    ("istisna", "Construction will take . months, delivered after 450000 months.",
+     {}, {'delivery_period': 450000.0}),
+    # Installment counts must be whole numbers; "([0-9]+)" read 5 out of "1.5"
+    # and 0 out of "2,000,000"
+    ("murabaha", "The payment is made in 1.5 monthly parts.", {'installments': 5.0}, {}),
+    ("istisna", "4 installments, payment of 2,000,000 quarterly",
+     {'installments': 0.0}, {'installments': 2000000.0}),
+]
+
+def load_inputs():
+    inputs = list(SYNTHETIC)
+    try:
+        with open(EXAMPLES_FILE, "r") as f:
+            for examples in json.load(f).values():
+                inputs.extend(example["query"] for example in examples)
+    except (OSError, json.JSONDecodeError):
+        pass
+    return inputs
+
+def time_call(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark numeric extraction.")
+    parser.add_argument("--sizes", default="1,10,100,1000", help="Times each input is repeated")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per measurement")
+    parser.add_argument("--legacy-max-chars", type=int, default=25000,
+                        help="Longest one-line input the legacy extractors are timed on")
+    args = parser.parse_args()
+
+    inputs = load_inputs()
+    mismatches = 0
+    for text in inputs:
+        for standard, extract in EXTRACTORS.items():
+            old, new = legacy_extract(standard, text), extract(text)
+            if old != new:
+                mismatches += 1
+                print(f"Output differs ({standard}): legacy {old} / single-pass {new}")
+    print(f"Compared {len(inputs) * len(EXTRACTORS)} extractions: {mismatches} differ")
+    unexpected = 0
+    for standard, text, old, new in KNOWN_DIFFERENCES:
+        if legacy_extract(standard, text) != old or EXTRACTORS[standard](text) != new:
+            unexpected += 1
+            print(f"Known difference changed ({standard}): {text!r}")
+    print(f"Checked {len(KNOWN_DIFFERENCES)} known differences: {unexpected} unexpected\n")
+
+    corpus = "\n".join(inputs)
+    # One long line where labels recur but no amount ever follows
+    worst_case = "the cost and the price of the payment for the partner " * 40
+    # One long line where a label recurs before numbers that never carry a currency
+    repeated_label = "cost 1 " * 300
+    print(f"{'Input':<12} {'Chars':>9} {'Legacy ms':>10} {'Single-pass ms':>15} {'Speed-up':>9}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        for name, text, one_line in (("scenarios", corpus * size, False), ("worst case", worst_case * size, True),
+                                     ("one line", repeated_label * size, True)):
+            repeat = args.repeat if len(text) < 10000 else 1
+            single = time_call(lambda: [extract(text) for extract in EXTRACTORS.values()], repeat)
+            if one_line and len(text) > args.legacy_max_chars:
+                print(f"{name:<12} {len(text):>9} {'skipped':>10} {single:>15.2f} {'-':>9}")
+                continue
+            legacy = time_call(lambda: [legacy_extract(standard, text) for standard in EXTRACTORS], repeat)
+            print(f"{name:<12} {len(text):>9} {legacy:>10.2f} {single:>15.2f} {legacy / single:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Time the vectorized Ijarah schedule engine against a per-contract Python loop.
+
+The baseline computes each contract's schedule period by period in plain
+Python, the way a single-contract calculator would. Both run on the same
+random portfolio of contracts (lease terms of 1 to 10 years), and their
+schedules are compared.
+
+Run from the usecase-service directory:
+    python benchmarks/ijarah_schedule_benchmark.py --contracts 1,100,1000,10000 --frequency monthly
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.constants import SCHEDULE_FREQUENCIES
+from utils.schedules import ijarah_schedules
+
+COLUMNS = ("rental", "amortization", "deferred_cost_allocation", "rou_carrying_amount",
+           "deferred_cost_balance", "liability_balance")
+
+def random_portfolio(count, seed=0):
+    rng = np.random.default_rng(seed)
+    purchase_price = rng.uniform(1e5, 5e6, count).round(2)
+    return {
+        "purchase_price": purchase_price,
+        "yearly_rental": (purchase_price * rng.uniform(0.15, 0.4, count)).round(2),
+        "lease_term": rng.integers(1, 11, count),
+        "import_tax": (purchase_price * rng.uniform(0, 0.05, count)).round(2),
+        "freight_charges": (purchase_price * rng.uniform(0, 0.03, count)).round(2),
+        "residual_value": (purchase_price * rng.uniform(0, 0.1, count)).round(2),
+        "purchase_option": (purchase_price * rng.uniform(0, 0.02, count)).round(2),
+    }
+
+def loop_schedules(portfolio, frequency):
+    """Compute every contract's schedule in a Python loop over its periods."""
+    periods_per_year = SCHEDULE_FREQUENCIES[frequency]
+    schedules = []
+    for index in range(len(portfolio["purchase_price"])):
+        contract = {name: float(values[index]) for name, values in portfolio.items()}
+        rou_asset = (contract["purchase_price"] + contract["import_tax"] + contract["freight_charges"]
+                     - contract["purchase_option"])
+        total_rentals = contract["yearly_rental"] * int(contract["lease_term"])
+        deferred_cost = total_rentals - rou_asset
+        terminal_value_diff = contract["residual_value"] - contract["purchase_option"]
+        amortizable_amount = rou_asset - terminal_value_diff
+        periods = int(contract["lease_term"]) * periods_per_year
+
+        rows = []
+        rou_carrying_amount, deferred_cost_balance, liability_balance = rou_asset, deferred_cost, total_rentals
+        for period in range(1, periods + 1):
+            rental = contract["yearly_rental"] / periods_per_year
+            amortization = amortizable_amount / periods
+            allocation = deferred_cost / periods
+            rou_carrying_amount -= amortization
+            deferred_cost_balance -= allocation
+            liability_balance -= rental
+            if period == periods:
+                rou_carrying_amount, deferred_cost_balance, liability_balance = terminal_value_diff, 0.0, 0.0
+            rows.append((rental, amortization, allocation, rou_carrying_amount, deferred_cost_balance,
+                         liability_balance))
+        schedules.append(rows)
+    return schedules
+
+def matches(vectorized, looped):
+    for index, rows in enumerate(looped):
+        for column, name in enumerate(COLUMNS):
+            expected = [row[column] for row in rows]
+            actual = vectorized[name][index, :len(rows)]
+            if not np.allclose(actual, expected, rtol=1e-9, atol=1e-6):
+                return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized Ijarah schedule engine.")
+    parser.add_argument("--contracts", default="1,100,1000,10000", help="Comma-separated portfolio sizes")
+    parser.add_argument("--frequency", default="monthly", choices=list(SCHEDULE_FREQUENCIES))
+    args = parser.parse_args()
+
+    print(f"{'Contracts':>9} {'Loop ms':>10} {'Vectorized ms':>14} {'Speedup':>8} {'Parity':>7}")
+    for count in (int(size) for size in args.contracts.split(",")):
+        portfolio = random_portfolio(count)
+        start = time.perf_counter()
+        looped = loop_schedules(portfolio, args.frequency)
+        loop_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        vectorized = ijarah_schedules(frequency=args.frequency, **portfolio)
+        vectorized_ms = (time.perf_counter() - start) * 1000
+        parity = matches(vectorized, looped)
+        print(f"{count:>9} {loop_ms:>10.2f} {vectorized_ms:>14.2f} {loop_ms / vectorized_ms:>7.1f}x "
+              f"{'ok' if parity else 'DIFFERS':>7}")
+
+if __name__ == "__main__":
+    main()
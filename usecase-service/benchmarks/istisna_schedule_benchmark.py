@@ -0,0 +1,115 @@
+"""
+Time the vectorized Istisna'a percentage of completion engine against a
+per-contract Python loop.
+
+The baseline computes each contract's schedule period by period in plain
+Python, the way a single-contract calculator would. Both run on the same
+random book of projects (1 to 5 years of monthly periods, with uneven
+cost curves and customer billings), and their schedules are compared.
+Scenarios stating their delivery period in months or in years are first
+run from extraction to schedule, to check the number of periods.
+
+Run from the usecase-service directory:
+    python benchmarks/istisna_schedule_benchmark.py --contracts 1,100,1000,10000
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.schedules import istisna_schedules
+from utils.extraction import extract_istisna_variables
+from utils.calculation import calculate_istisna_values
+
+COLUMNS = ("cumulative_cost", "completion", "revenue", "profit", "incremental_revenue", "incremental_profit",
+           "receivable_balance")
+
+# Scenario, frequency, and the number of periods its schedule must have
+DELIVERY_CASES = [
+    ("Istisna'a contract price: $2,000,000, cost: $1,700,000. Construction will take 18 months.", "quarterly", 6),
+    ("Istisna'a contract price: $2,000,000, cost: $1,700,000. Construction will take 2 years.", "quarterly", 8),
+    ("Istisna'a contract price: $2,000,000, cost: $1,700,000. Construction will take 2 years.", "monthly", 24),
+    ("Istisna'a contract price: $2,000,000, cost: $1,700,000.", "quarterly", 4),
+]
+
+def check_delivery_periods():
+    """Return the number of delivery period cases whose schedule has the wrong number of periods."""
+    failures = 0
+    for text, frequency, expected in DELIVERY_CASES:
+        variables = {**extract_istisna_variables(text), 'description': text}
+        periods = len(calculate_istisna_values(variables, frequency)['quarterly_progress'])
+        if periods != expected:
+            failures += 1
+            print(f"{frequency} schedule of {text!r}: {periods} periods, expected {expected}")
+    return failures
+
+def random_book(count, seed=0):
+    rng = np.random.default_rng(seed)
+    periods = rng.integers(12, 61, count)
+    width = int(periods.max())
+    # Uneven cost curves, zero after the end of each project
+    weights = rng.uniform(0.2, 1.0, (count, width)) * (np.arange(width)[None, :] < periods[:, None])
+    total_cost = rng.uniform(1e5, 2e7, count).round(2)
+    period_costs = weights / weights.sum(axis=1, keepdims=True) * total_cost[:, None]
+    contract_value = (total_cost * rng.uniform(1.05, 1.3, count)).round(2)
+    billings = (rng.uniform(size=(count, width)) < 0.25) * weights / weights.sum(axis=1, keepdims=True)
+    billings = billings * contract_value[:, None]
+    return {"contract_value": contract_value, "total_cost": total_cost, "period_costs": period_costs,
+            "billings": billings}, periods
+
+def loop_schedules(book, periods):
+    """Compute every contract's schedule in a Python loop over its periods."""
+    schedules = []
+    for index, count in enumerate(periods):
+        contract_value = float(book["contract_value"][index])
+        total_cost = float(book["total_cost"][index])
+        expected_profit = contract_value - total_cost
+        rows = []
+        cumulative_cost = prev_revenue = prev_profit = billed = 0.0
+        for period in range(int(count)):
+            cumulative_cost += float(book["period_costs"][index, period])
+            billed += float(book["billings"][index, period])
+            completion = min(cumulative_cost / total_cost, 1.0) if total_cost else 0.0
+            revenue = contract_value * completion
+            profit = expected_profit * completion
+            rows.append((cumulative_cost, completion * 100, revenue, profit, revenue - prev_revenue,
+                         profit - prev_profit, revenue - billed))
+            prev_revenue, prev_profit = revenue, profit
+        schedules.append(rows)
+    return schedules
+
+def matches(vectorized, looped):
+    for index, rows in enumerate(looped):
+        for column, name in enumerate(COLUMNS):
+            expected = [row[column] for row in rows]
+            actual = vectorized[name][index, :len(rows)]
+            if not np.allclose(actual, expected, rtol=1e-9, atol=1e-6):
+                return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized Istisna'a schedule engine.")
+    parser.add_argument("--contracts", default="1,100,1000,10000", help="Comma-separated book sizes")
+    args = parser.parse_args()
+
+    failures = check_delivery_periods()
+    print(f"Delivery periods: {len(DELIVERY_CASES) - failures}/{len(DELIVERY_CASES)} schedules with the right periods\n")
+    print(f"{'Contracts':>9} {'Loop ms':>10} {'Vectorized ms':>14} {'Speedup':>8} {'Parity':>7}")
+    for count in (int(size) for size in args.contracts.split(",")):
+        book, periods = random_book(count)
+        start = time.perf_counter()
+        looped = loop_schedules(book, periods)
+        loop_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        vectorized = istisna_schedules(**book)
+        vectorized_ms = (time.perf_counter() - start) * 1000
+        parity = matches(vectorized, looped)
+        print(f"{count:>9} {loop_ms:>10.2f} {vectorized_ms:>14.2f} {loop_ms / vectorized_ms:>7.1f}x "
+              f"{'ok' if parity else 'DIFFERS':>7}")
+
+if __name__ == "__main__":
+    main()
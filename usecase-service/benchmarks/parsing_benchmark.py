@@ -0,0 +1,91 @@
+"""
+Time parse_financial_data on recorded responses and check it against their recorded outputs.
+
+recorded_responses.json holds LLM and formatter responses (from
+response_cache.pkl, validated_examples.json, model1_output.txt and the
+utils.formatting templates, plus two hand-written responses with the
+Istisna'a ledger and legacy Ijarah calculation lines) with the output the
+parser returned before responses were tokenized once. Every run checks the
+current output against it.
+
+As the baseline, the same extraction runs with landmarks found the way each
+field used to find its anchor: a separate scan of the whole response for
+every lookup, instead of one tokenize_response pass.
+
+Run from the usecase-service directory:
+    python benchmarks/parsing_benchmark.py --repeat 200
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import parsing
+
+RECORDED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorded_responses.json")
+
+FAMILY_PATTERNS = {
+    name: re.compile("|".join(beginnings), re.IGNORECASE if ignore_case else 0)
+    for name, beginnings, ignore_case in parsing._LANDMARK_FAMILIES
+}
+
+class PerFieldScan(dict):
+    """Landmarks found by scanning the whole response again on every lookup."""
+
+    def __init__(self, response_text):
+        super().__init__()
+        self.response_text = response_text
+
+    def __getitem__(self, family):
+        return [match.start() for match in FAMILY_PATTERNS[family].finditer(self.response_text)]
+
+def parse(record):
+    parsed = parsing.parse_financial_data(record["response"], record["query"])
+    del parsed["full_response"]
+    return parsed
+
+def time_parse(records, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for record in records:
+            parsing.parse_financial_data(record["response"], record["query"])
+    return (time.perf_counter() - start) / (repeat * len(records)) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response parsing on recorded responses.")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed passes over the recorded responses")
+    parser.add_argument("--record", action="store_true", help="Replace the recorded outputs with the current ones")
+    args = parser.parse_args()
+
+    with open(RECORDED_FILE, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    if args.record:
+        for record in records:
+            record["parsed"] = parse(record)
+        with open(RECORDED_FILE, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=2, ensure_ascii=False)
+        print(f"Recorded the outputs for {len(records)} responses")
+        return
+
+    print(f"{'Source':<26} {'Chars':>6} {'Per-field ms':>13} {'Tokenized ms':>13} {'Parity':>7}")
+    tokenize_response = parsing.tokenize_response
+    mismatches = 0
+    for record in records:
+        parity = parse(record) == record["parsed"]
+        mismatches += not parity
+        parsing.tokenize_response = PerFieldScan
+        try:
+            per_field_ms = time_parse([record], args.repeat)
+        finally:
+            parsing.tokenize_response = tokenize_response
+        print(f"{record['source']:<26} {len(record['response']):>6} {per_field_ms:>13.3f} "
+              f"{time_parse([record], args.repeat):>13.3f} {'ok' if parity else 'DIFFERS':>7}")
+    print(f"\n{len(records)} recorded responses: {mismatches} differ from the recorded output")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Time the response parser and scenario extraction on pathological inputs.
+
+Each case pairs one of the backtracking patterns the parser and extractors
+used to run with an input that makes it superlinear (a label repeated on
+one line that never completes the pattern, long whitespace or digit runs
+inside lazy gaps). The legacy pattern alone is timed against the whole
+current ``parse_financial_data`` (or extractor) on the same input, so the
+current column includes every other pattern as well. Legacy timings stop
+once a size exceeds the time budget.
+
+A random fuzz then checks that the linear-time scanners return what the
+legacy patterns returned.
+
+Run from the usecase-service directory:
+    python benchmarks/regex_worst_case_benchmark.py --sizes 500,2000,8000,32000
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.parsing import parse_financial_data, extract_thinking_process
+from utils.extraction import extract_musharaka_variables
+from utils.text_scan import find_between, find_ledger_entries, search_chain
+
+QUERY = "ijarah lease and istisna percentage of completion"
+
+LEGACY_LEDGER = r"{}\.?\s+(.*?)(?:\s+(?:USD|$)?)?\s+([0-9,.]+)"
+LEGACY_CHAIN = r"{}.*?{}.*?\$([0-9,.]+)"
+_CURRENCY = r'(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)'
+
+def repeat(unit, chars):
+    return unit * max(1, chars // len(unit))
+
+def legacy_search(pattern, flags=0):
+    return lambda text: re.search(pattern, text, flags)
+
+# (name, legacy pattern as a callable, current code, input of about a given length)
+CASES = [
+    ("Dr entries", lambda text: re.findall(LEGACY_LEDGER.format("Dr"), text, re.IGNORECASE),
+     lambda text: parse_financial_data(text, QUERY), lambda n: "JOURNAL ENTRY\n" + repeat("Dr ", n)),
+    ("Q1 cost", legacy_search(LEGACY_CHAIN.format("Q1", "Cost"), re.IGNORECASE),
+     lambda text: parse_financial_data(text, QUERY), lambda n: repeat("Q1 Cost ", n)),
+    ("Payment", legacy_search(r"Payment 1.*?(?:Bank|Cash).*?\$([0-9,.]+)", re.IGNORECASE),
+     lambda text: parse_financial_data(text, QUERY), lambda n: repeat("Payment 1 Bank ", n)),
+    ("Journal", legacy_search(r"JOURNAL ENTR(?:Y|IES)(?:.*?)\s*(?:\n|-+\n)(.*?)(?:\n\n|\nEXPLANATION|\n[A-Z]|\Z)", re.DOTALL),
+     lambda text: parse_financial_data(text, QUERY), lambda n: "JOURNAL ENTRY" + repeat(" ", n) + "x"),
+    ("Analysis", legacy_search(r"(?:Initial Recognition|ANALYSIS)[\s\-]*.*?\n(.*?)(?:Determine|Journal|JOURNAL|CALCULATIONS)", re.DOTALL),
+     lambda text: parse_financial_data(text, QUERY), lambda n: "ANALYSIS" + repeat(" -", n)),
+    ("Prime cost", legacy_search(r"(?:Prime cost|Purchase \+ Import tax \+ Freight|Prime Cost)[:\s].*?([0-9,.]+)[\s]*\+[\s]*([0-9,.]+)[\s]*\+[\s]*([0-9,.]+)[\s]*=[\s]*([0-9,.]+)", re.IGNORECASE),
+     lambda text: parse_financial_data(text, QUERY), lambda n: "Prime cost: " + repeat("1", n)),
+    ("Less ROU", legacy_search(r"Less ROU Asset[\s]*=[\s]*.*?-[\s]*.*?=[\s]*([0-9,.]+)[\s]*-[\s]*([0-9,.]+)[\s]*=[\s]*([0-9,.]+)", re.IGNORECASE),
+     lambda text: parse_financial_data(text, QUERY), lambda n: "Less ROU Asset = " + repeat("- =", n)),
+    ("Terminal", legacy_search(r"Terminal value difference[\s]*[\(\[]?.*?[\)\]]?[\s]*=[\s]*([0-9,.]+)[\s]*[-−][\s]*([0-9,.]+)[\s]*=[\s]*([0-9,.]+)", re.IGNORECASE),
+     lambda text: parse_financial_data(text, QUERY), lambda n: "Terminal value difference" + repeat(" ", n) + "x"),
+    ("Think", legacy_search(r"<think>(.*?)</think>", re.DOTALL),
+     extract_thinking_process, lambda n: repeat("<think>", n)),
+    ("Musharaka", legacy_search(r'(?:bank|islamic bank).*?(?:capital|contributed|invested).*?' + _CURRENCY, re.IGNORECASE),
+     extract_musharaka_variables, lambda n: repeat("bank capital ", n)),
+]
+
+def time_call(function, text):
+    start = time.perf_counter()
+    function(text)
+    return (time.perf_counter() - start) * 1000
+
+def run_fuzz(cases, seed):
+    """Compare the linear-time scanners with the legacy patterns on random journal-like text."""
+    rng = random.Random(seed)
+    words = ["Dr", "Dr.", "Cr.", "USD", "Cash", "Q1", "Cost", "Payment 1", "Bank", "$1,000", "250", "1.5", "-", ":",
+             "\n", "<think>", "</think>", "the", "a"]
+    separators = ["", " ", "  ", "\n", " \n ", "\t"]
+    mismatches = 0
+    for _ in range(cases):
+        text = "".join(rng.choice(words) + rng.choice(separators) for _ in range(rng.randint(1, 40)))
+        checks = [(re.findall(LEGACY_LEDGER.format(marker), text, re.IGNORECASE), find_ledger_entries(text, marker))
+                  for marker in ("Dr", "Cr")]
+        legacy = re.search(LEGACY_CHAIN.format("Q1", "Cost"), text, re.IGNORECASE)
+        current = search_chain(text, [re.compile("Q1", re.IGNORECASE), re.compile("Cost", re.IGNORECASE)],
+                               re.compile(r"\$([0-9,.]+)"))
+        checks.append((legacy and legacy.group(1), current and current.group(1)))
+        legacy = re.search(r"<think>(.*?)</think>", text, re.DOTALL)
+        checks.append((legacy and legacy.group(1), find_between(text, "<think>", "</think>")))
+        if any(old != new for old, new in checks):
+            mismatches += 1
+            if mismatches <= 3:
+                print(f"Output differs on {text!r}")
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing on pathological inputs.")
+    parser.add_argument("--sizes", default="500,2000,8000,32000", help="Input lengths in characters")
+    parser.add_argument("--budget", type=float, default=1000, help="Skip larger legacy runs after one takes this many ms")
+    parser.add_argument("--fuzz", type=int, default=20000, help="Random inputs compared with the legacy patterns")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sizes = [int(value) for value in args.sizes.split(",")]
+    print(f"{'Case':<12} {'Chars':>9} {'Legacy ms':>10} {'Current ms':>11}")
+    for name, legacy, current, build in CASES:
+        over_budget = False
+        for size in sizes:
+            text = build(size)
+            legacy_ms = None if over_budget else time_call(legacy, text)
+            over_budget = over_budget or legacy_ms > args.budget
+            legacy_column = "skipped" if legacy_ms is None else f"{legacy_ms:.1f}"
+            print(f"{name:<12} {len(text):>9} {legacy_column:>10} {time_call(current, text):>11.1f}")
+
+    mismatches = run_fuzz(args.fuzz, args.seed)
+    print(f"\nFuzzed {args.fuzz} inputs: {mismatches} differ from the legacy patterns")
+
+if __name__ == "__main__":
+    main()
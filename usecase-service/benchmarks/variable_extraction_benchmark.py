@@ -0,0 +1,104 @@
+"""
+Check that the LLM variable extraction never invents a variable the scenario does not state.
+
+Every case below is a scenario where the label maps find some variables but
+a variable the calculator requires is truly absent. Offline, each case
+checks that the JSON schema sent with the call lets the model answer null
+for every variable, then decodes a hand-written answer holding that null
+the way fill_missing_variables does. With --live, fill_missing_variables
+is called on each case instead, and the time of the call is reported.
+
+Run from the usecase-service directory:
+    python benchmarks/variable_extraction_benchmark.py --live
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import llm
+from utils.schema import load_variable_values
+from utils.extraction import (
+    extract_ijarah_variables, extract_murabaha_variables, extract_istisna_variables,
+    IJARAH_VARIABLES, IJARAH_REQUIRED, MURABAHA_VARIABLES, MURABAHA_REQUIRED, ISTISNA_VARIABLES, ISTISNA_REQUIRED
+)
+
+CALCULATORS = {
+    "ijarah": (extract_ijarah_variables, IJARAH_VARIABLES, IJARAH_REQUIRED),
+    "murabaha": (extract_murabaha_variables, MURABAHA_VARIABLES, MURABAHA_REQUIRED),
+    "istisna": (extract_istisna_variables, ISTISNA_VARIABLES, ISTISNA_REQUIRED),
+}
+
+CASES = [
+    {
+        "standard": "ijarah",
+        "query": "The bank purchased equipment for USD 450,000 and paid import tax of USD 12,000. It leases the "
+                 "equipment to the customer for a lease term of 2 years, with the option to acquire it at the end.",
+        "absent": ["yearly_rental"],
+        "answer": '{"freight_charges": null, "yearly_rental": null, "residual_value": null, "purchase_option": null}',
+    },
+    {
+        "standard": "murabaha",
+        "query": "The bank sells a vehicle to the customer at a selling price of USD 120,000, paid in 12 monthly "
+                 "installments.",
+        "absent": ["cost_price"],
+        "answer": '{"cost_price": null, "profit_rate": null, "installments": 12, "down_payment": null}',
+    },
+    {
+        "standard": "istisna",
+        "query": "A customer orders a building from the bank under an Istisna'a contract with a contract value of "
+                 "USD 2,000,000, delivered after 18 months. Accounting under the percentage of completion method.",
+        "absent": ["total_cost", "upfront_payment", "completion_payment"],
+        "answer": '{"total_cost": null, "upfront_payment": null, "completion_payment": null, "delivery_period": 18}',
+    },
+]
+
+def missing_fields(variables, descriptions):
+    return tuple((name, description) for name, description in descriptions.items() if name not in variables)
+
+def check_offline(case):
+    """Return the invented variables, and whether the schema allows null for every variable."""
+    extract, descriptions, _required = CALCULATORS[case["standard"]]
+    fields = missing_fields(extract(case["query"]), descriptions)
+    schema = llm._variable_extraction_schema(fields)
+    nullable = all("null" in prop["type"] for prop in schema["properties"].values())
+    values = load_variable_values(case["answer"], [name for name, _description in fields])
+    return [name for name in case["absent"] if name in values], nullable
+
+def check_live(case):
+    """Return the invented variables and the time of the call, in milliseconds."""
+    extract, descriptions, required = CALCULATORS[case["standard"]]
+    variables = extract(case["query"])
+    llm._extract_variable_values.cache_clear()
+    start = time.perf_counter()
+    filled = llm.fill_missing_variables(case["query"], dict(variables), descriptions, required)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return [name for name in case["absent"] if name in filled], elapsed_ms
+
+def main():
+    parser = argparse.ArgumentParser(description="Check LLM variable extraction on absent variables.")
+    parser.add_argument("--live", action="store_true", help="Call the LLM instead of replaying hand-written answers")
+    args = parser.parse_args()
+
+    invented_cases = 0
+    if args.live:
+        print(f"{'Standard':<10} {'Absent':<45} {'Call ms':>9} {'Invented'}")
+        for case in CASES:
+            invented, elapsed_ms = check_live(case)
+            invented_cases += bool(invented)
+            print(f"{case['standard']:<10} {', '.join(case['absent']):<45} {elapsed_ms:>9.0f} "
+                  f"{', '.join(invented) or '-'}")
+    else:
+        print(f"{'Standard':<10} {'Absent':<45} {'Nullable':>8} {'Invented'}")
+        for case in CASES:
+            invented, nullable = check_offline(case)
+            invented_cases += bool(invented) or not nullable
+            print(f"{case['standard']:<10} {', '.join(case['absent']):<45} {'yes' if nullable else 'NO':>8} "
+                  f"{', '.join(invented) or '-'}")
+    print(f"\n{len(CASES)} cases: {invented_cases} with an invented variable")
+
+if __name__ == "__main__":
+    main()
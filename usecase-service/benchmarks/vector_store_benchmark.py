@@ -0,0 +1,138 @@
+"""
+Compare search latency and recall of the vector store backends on the served index.
+
+Queries are the validated example scenarios plus a sample of chunks from the
+index itself. Every query is embedded once up front, so the timings only
+cover the vector search. Recall@k is measured against exact search.
+
+Run from the usecase-service directory:
+    python benchmarks/vector_store_benchmark.py --queries 200 --k 5
+"""
+
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.examples import EXAMPLES_FILE
+from utils.retrieval import get_embedding_function, resolve_index
+from utils.vector_store import (
+    BACKEND_CHROMA, InMemoryVectorStore, HnswVectorStore, IvfVectorStore, open_vector_store
+)
+
+def load_queries(store, count, seed):
+    """Validated example queries plus the first sentence of randomly sampled chunks."""
+    queries = []
+    try:
+        with open(EXAMPLES_FILE, "r") as f:
+            for examples in json.load(f).values():
+                queries.extend(example["query"] for example in examples)
+    except (OSError, json.JSONDecodeError):
+        pass
+    rng = random.Random(seed)
+    sample = rng.sample(range(len(store)), min(len(store), max(0, count - len(queries))))
+    for index in sample:
+        body = store.documents[index].split("\n", 1)[-1]
+        queries.append(body.split(". ")[0][:300])
+    return queries[:count]
+
+def result_keys(results):
+    return [(doc.metadata.get("source"), doc.page_content) for doc, _score in results]
+
+def measure(search, vectors, truth, k, repeat):
+    """Return latency percentiles (ms) and mean recall@k of a search function."""
+    for vector in vectors[:10]:
+        search(vector)  # warm-up
+    latencies, recall = [], 0.0
+    for _ in range(repeat):
+        for vector, expected in zip(vectors, truth):
+            start = time.perf_counter()
+            results = search(vector)
+            latencies.append((time.perf_counter() - start) * 1000)
+            recall += len(set(result_keys(results)) & expected) / max(1, min(k, len(expected)))
+    latencies = np.array(latencies)
+    return {
+        "p50": float(np.percentile(latencies, 50)),
+        "p99": float(np.percentile(latencies, 99)),
+        "mean": float(latencies.mean()),
+        "recall": recall / (len(vectors) * repeat)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector store backends on the served index.")
+    parser.add_argument("--index_name", default=None, help="Named index to benchmark (default: the default index)")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--k", type=int, default=5, help="Number of results per query")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the queries")
+    parser.add_argument("--ef_search", default="16,32,64,128", help="HNSW ef_search values")
+    parser.add_argument("--nprobe", default="1,4,8,16", help="IVF nprobe values")
+    parser.add_argument("--standard_type", default=None, help="Also benchmark a standard_type filter")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    try:
+        _index_name, index_path, embedding_model = resolve_index(index_name=args.index_name)
+    except FileNotFoundError as e:
+        print(e)
+        return
+    embedding_function = get_embedding_function(embedding_model)
+    chroma = open_vector_store(index_path, embedding_function, BACKEND_CHROMA)
+
+    start = time.perf_counter()
+    exact = InMemoryVectorStore.from_chroma(chroma, embedding_function)
+    print(f"Loaded {len(exact)} vectors from {index_path} in {time.perf_counter() - start:.2f}s")
+    if not len(exact):
+        print("The index is empty.")
+        return
+
+    queries = load_queries(exact, args.queries, args.seed)
+    start = time.perf_counter()
+    vectors = [np.asarray(v, dtype=np.float32) for v in embedding_function.embed_documents(queries)]
+    print(f"Embedded {len(queries)} queries in {time.perf_counter() - start:.2f}s (not included below)")
+
+    stores = [("exact", "", exact, None)]
+    start = time.perf_counter()
+    hnsw = HnswVectorStore(exact.ids, exact.vectors, exact.documents, exact.metadatas, embedding_function)
+    print(f"Built HNSW index in {time.perf_counter() - start:.2f}s")
+    for ef_search in (int(value) for value in args.ef_search.split(",")):
+        stores.append(("hnsw", f"ef_search={ef_search}", hnsw, {"ef_search": ef_search}))
+    start = time.perf_counter()
+    ivf = IvfVectorStore(exact.ids, exact.vectors, exact.documents, exact.metadatas, embedding_function)
+    print(f"Built IVF index ({ivf.index.nlist} lists) in {time.perf_counter() - start:.2f}s")
+    for nprobe in (int(value) for value in args.nprobe.split(",")):
+        stores.append(("ivf", f"nprobe={nprobe}", ivf, {"nprobe": nprobe}))
+
+    filters = [None]
+    if args.standard_type:
+        filters.append({"standard_type": args.standard_type.upper()})
+
+    for search_filter in filters:
+        print(f"\nk={args.k}, filter={search_filter}, {len(vectors)} queries x {args.repeat}")
+        truth = [
+            set(result_keys(exact.similarity_search_by_vector_with_relevance_scores(v, k=args.k, filter=search_filter)))
+            for v in vectors
+        ]
+        print(f"{'Backend':<8} {'Params':<14} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'recall@k':>9}")
+        chroma_stats = measure(
+            lambda v: chroma.similarity_search_by_vector_with_relevance_scores(v.tolist(), k=args.k, filter=search_filter),
+            vectors, truth, args.k, args.repeat
+        )
+        print(f"{'chroma':<8} {'':<14} {chroma_stats['p50']:>8.3f} {chroma_stats['p99']:>8.3f} "
+              f"{chroma_stats['mean']:>8.3f} {chroma_stats['recall']:>9.3f}")
+        for name, label, store, params in stores:
+            if params:
+                store.set_search_params(**params)
+            stats = measure(
+                lambda v: store.similarity_search_by_vector_with_relevance_scores(v, k=args.k, filter=search_filter),
+                vectors, truth, args.k, args.repeat
+            )
+            print(f"{name:<8} {label:<14} {stats['p50']:>8.3f} {stats['p99']:>8.3f} "
+                  f"{stats['mean']:>8.3f} {stats['recall']:>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,38 @@
 import os
+import math
+import time
 import shutil
+import hashlib
 import argparse
-from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader, Docx2txtLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import chromadb
+from datetime import datetime
 from langchain.schema import Document
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma  # Updated import
 from dotenv import load_dotenv
+from utils.loaders import iter_loaded_files, print_load_stats
+from utils.chunking import CHUNKER_VERSION, chunk_body, split_standard_document
+from utils.dedupe import DEDUPE_VERSION, DedupeIndex, DedupeReport, minhash_signature, outranks
+from utils.hierarchical import build_centroids
+from utils.embedding import (
+    DEFAULT_EMBED_BATCH_SIZE, ThroughputReporter, default_embed_workers, embed_batches, iter_batches,
+    get_embedding_worker
+)
+from utils.index_store import (
+    resolve_index_path, create_version, promote_version, rollback_version,
+    prune_versions, load_manifest, save_manifest, write_build_state, finish_build, find_resumable_version,
+    index_root_path, DEFAULT_INDEX_NAME
+)
 
 # Load environment variables
 load_dotenv()
 
 CHROMA_PATH = "chroma"
+# langchain_chroma's default collection, which the service and inspect_db.py open
+COLLECTION_NAME = "langchain"
+SMOKE_QUERY = "AAOIFI financial accounting standard"
 DEFAULT_DATA_PATH = "data"
 DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2" 
+CHECKPOINT_INTERVAL_SECONDS = 5  # Minimum time between manifest checkpoints
 
 def main():
     # Set up argument parser
@@ -22,37 +41,156 @@ def main():
                       help=f"Directory containing documents (default: {DEFAULT_DATA_PATH})")
     parser.add_argument("--embedding_model", type=str, default=DEFAULT_EMBEDDING_MODEL,
                       help=f"HuggingFace model to use for embeddings (default: {DEFAULT_EMBEDDING_MODEL})")
+    parser.add_argument("--rebuild", action="store_true",
+                      help="Build a fresh index version instead of updating a copy of the current one")
+    parser.add_argument("--workers", type=int, default=None,
+                      help="Number of processes used to parse documents (default: CPU count)")
+    parser.add_argument("--batch_size", type=int, default=DEFAULT_EMBED_BATCH_SIZE,
+                      help=f"Number of chunks embedded and written per batch (default: {DEFAULT_EMBED_BATCH_SIZE})")
+    parser.add_argument("--embed_workers", type=int, default=default_embed_workers(),
+                      help="Number of processes used to embed chunks (default: half the CPUs, at most 4)")
+    parser.add_argument("--index_name", type=str, default=None,
+                      help="Build a named index next to the default one, e.g. 'minilm' for a MiniLM index")
+    parser.add_argument("--rollback", action="store_true",
+                      help="Serve the previous index version again and exit")
     
     args = parser.parse_args()
+    index_root = index_root_path(args.index_name, CHROMA_PATH)
+    if args.rollback:
+        pointer = rollback_version(index_root)
+        print(f"Rolled back: now serving index version {pointer['version']} (previous: {pointer['previous']})")
+        return
     print(f"Using data directory: {args.data_dir}")
     print(f"Using embedding model: {args.embedding_model}")
+    print(f"Using index: {args.index_name or DEFAULT_INDEX_NAME} ({index_root})")
     
-    generate_data_store(data_path=args.data_dir, embedding_model=args.embedding_model)
+    generate_data_store(data_path=args.data_dir, embedding_model=args.embedding_model,
+                        rebuild=args.rebuild, workers=args.workers,
+                        batch_size=args.batch_size, embed_workers=args.embed_workers,
+                        index_root=index_root)
 
-def generate_data_store(data_path, embedding_model):
+def generate_data_store(data_path, embedding_model, rebuild=False, workers=None,
+                        batch_size=DEFAULT_EMBED_BATCH_SIZE, embed_workers=1, index_root=CHROMA_PATH):
     print("Starting database creation...")
-    documents = load_documents(data_path)
-    if not documents:
+    pdf_files, docx_files = find_documents(data_path)
+    if not pdf_files and not docx_files:
         print("No documents were loaded. Please check your data directory.")
         return
-        
-    print("Splitting documents into chunks...")
-    chunks = split_text(documents)
-    if not chunks:
-        print("No text chunks were created. Documents might be empty.")
-        return
-        
-    print("Saving chunks to Chroma database...")
-    save_to_chroma(chunks, embedding_model)
+    
+    # The served index is never modified: changes are applied to a new version
+    current_path = resolve_index_path(index_root)
+    manifest = load_manifest(current_path)
+    if manifest and manifest.get("embedding_model") != embedding_model:
+        print(f"Index was built with {manifest.get('embedding_model')}, rebuilding with {embedding_model} "
+              f"(use --index_name to keep both indexes)")
+        rebuild = True
+    elif manifest and manifest.get("chunker") != CHUNKER_VERSION:
+        print(f"Index was chunked with chunker version {manifest.get('chunker')}, rebuilding with version {CHUNKER_VERSION}")
+        rebuild = True
+    elif manifest and manifest.get("dedupe") != DEDUPE_VERSION:
+        print(f"Index was deduplicated with version {manifest.get('dedupe')}, rebuilding with version {DEDUPE_VERSION}")
+        rebuild = True
+    if rebuild or not manifest:
+        manifest = {"embedding_model": embedding_model, "chunker": CHUNKER_VERSION, "dedupe": DEDUPE_VERSION, "files": {}}
+        current_path = None
+    base_version = os.path.basename(current_path) if current_path else None
+    
+    # Continue an interrupted build of the same base instead of starting over
+    resumable = find_resumable_version(base_version, embedding_model, index_root)
+    if resumable:
+        version, build_path = resumable
+        manifest = load_manifest(build_path) or manifest
+        print(f"Resuming interrupted build of index version {version}")
+    
+    # Compare file content hashes against the manifest
+    file_hashes = {path: hash_file(path) for path in pdf_files + docx_files}
+    indexed_files = manifest["files"]
+    changed_files = {path: file_hash for path, file_hash in file_hashes.items()
+                     if indexed_files.get(path, {}).get("file_hash") != file_hash}
+    removed_files = [path for path in indexed_files if path not in file_hashes]
+    
+    # Duplicates of chunks from changed or removed files may lose their canonical copy
+    replaced_ids = {cid for path in list(changed_files) + removed_files
+                    for cid in indexed_files.get(path, {}).get("chunk_ids", [])}
+    if replaced_ids:
+        for path, entry in indexed_files.items():
+            if (path in file_hashes and path not in changed_files
+                    and replaced_ids.intersection(entry.get("duplicates", {}).values())):
+                changed_files[path] = file_hashes[path]
+    print(f"{len(changed_files)} new or changed files, {len(removed_files)} removed files, "
+          f"{len(file_hashes) - len(changed_files)} unchanged files")
+    
+    if not resumable:
+        if not changed_files and not removed_files:
+            print("Database is already up to date.")
+            return
+        version, build_path = create_version(index_root, base_path=current_path)
+        write_build_state(build_path, {
+            "base_version": base_version,
+            "embedding_model": embedding_model,
+            "started_at": datetime.now().isoformat()
+        })
+        save_manifest(build_path, manifest)
+    print(f"Building index version {version} in {build_path}")
+    
+    # Files are parsed, split, embedded and written as a stream; each finished
+    # file is checkpointed in the version's manifest so a crash can resume
+    try:
+        print("Saving chunks to Chroma database...")
+        db = save_to_chroma(
+            iter_file_chunks(data_path, changed_files, workers=workers), embedding_model, manifest,
+            changed_files, removed_files, build_path, batch_size=batch_size, embed_workers=embed_workers
+        )
+    except (Exception, KeyboardInterrupt):
+        print(f"Build of index version {version} interrupted; run again to resume it")
+        raise
+    
+    try:
+        validate_index(db)
+        counts = build_centroids(db, build_path)
+        print(f"Computed centroids for {counts['standards']} standards and {counts['sections']} sections")
+    except Exception:
+        print(f"Discarding failed index version {version}")
+        shutil.rmtree(build_path, ignore_errors=True)
+        raise
+    
+    finish_build(build_path)
+    pointer = promote_version(version, index_root)
+    print(f"Promoted index version {version} (previous: {pointer['previous']})")
+    for old_version in prune_versions(index_root):
+        print(f"Removed old index version {old_version}")
     print("Database creation completed successfully!")
 
-def load_documents(data_path):
+def hash_file(file_path):
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_id(chunk: Document, occurrence=0):
+    """Return a stable id derived from a chunk's source and content."""
+    key = f"{chunk.metadata.get('source')}\x00{occurrence}\x00{chunk.page_content}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def validate_index(db):
+    """Run a smoke query against a freshly built index before promoting it."""
+    count = db._collection.count()
+    if count == 0:
+        raise ValueError("Index validation failed: the collection is empty")
+    results = db.similarity_search_with_relevance_scores(SMOKE_QUERY, k=1)
+    if not results:
+        raise ValueError("Index validation failed: smoke query returned no results")
+    print(f"Index validated: {count} chunks, smoke query top score {results[0][1]:.4f}")
+
+def find_documents(data_path):
     print(f"Scanning directory: {data_path}")
     # Make sure directory exists
     if not os.path.exists(data_path):
         os.makedirs(data_path, exist_ok=True)
         print(f"Created directory {data_path} - please add your document files there")
-        return []
+        return [], []
     
     # Recursively find all PDF and DOCX files
     pdf_files = []
@@ -74,119 +212,230 @@ def load_documents(data_path):
     total_files = len(pdf_files) + len(docx_files)
     if total_files == 0:
         print(f"No PDF or DOCX files found in {data_path} or its subdirectories.")
-        return []
+        return [], []
     
     # Report on directory structure    
     print(f"Found {len(subdirectories)} subdirectories")
     for subdir in sorted(subdirectories):
         print(f"  - {subdir}")
     print(f"Found {len(pdf_files)} PDF files and {len(docx_files)} DOCX files")
-    
-    # Load document files one by one
-    documents = []
-    
-    # Function to enhance metadata with folder information
-    def enhance_metadata(doc, file_path):
-        rel_path = os.path.relpath(os.path.dirname(file_path), data_path)
-        if rel_path == ".":  # File is directly in data_path
-            rel_path = "root"
-        doc.metadata["folder"] = rel_path
-        doc.metadata["source"] = file_path
-        doc.metadata["filename"] = os.path.basename(file_path)
-        return doc
-    
-    # Load PDF files
-    for pdf_path in pdf_files:
-        try:
-            loader = PyPDFLoader(pdf_path)
-            docs = loader.load()
-            # Add folder information to metadata
-            docs = [enhance_metadata(doc, pdf_path) for doc in docs]
-            if docs:
-                documents.extend(docs)
-                rel_path = os.path.relpath(os.path.dirname(pdf_path), data_path)
-                print(f"Loaded {len(docs)} pages from PDF: {os.path.basename(pdf_path)} in {rel_path}")
-            else:
-                print(f"Warning: No content extracted from PDF: {os.path.basename(pdf_path)}")
-        except Exception as e:
-            print(f"Error loading PDF {pdf_path}: {str(e)}")
-    
-    # Load DOCX files with similar metadata enhancement
-    for docx_path in docx_files:
-        try:
-            loader = Docx2txtLoader(docx_path)
-            docs = loader.load()
-            # Add folder information to metadata
-            docs = [enhance_metadata(doc, docx_path) for doc in docs]
-            if docs:
-                documents.extend(docs)
-                rel_path = os.path.relpath(os.path.dirname(docx_path), data_path)
-                print(f"Loaded document: {os.path.basename(docx_path)} in {rel_path}")
-            else:
-                print(f"Warning: No content extracted from DOCX: {os.path.basename(docx_path)}")
-        except Exception as e:
-            print(f"Error loading DOCX {docx_path}: {str(e)}")
-    
-    print(f"Loaded {len(documents)} total documents/pages")
-    
-    # Verify documents have content
-    empty_docs = [i for i, doc in enumerate(documents) if not doc.page_content.strip()]
-    if empty_docs:
-        print(f"Warning: {len(empty_docs)} documents have empty content")
+    return pdf_files, docx_files
+
+def iter_file_chunks(data_path, file_hashes, workers=None):
+    """
+    Parse and split files one at a time, so only a few files are held in memory.
+
+    Args:
+        data_path (str): Root data directory
+        file_hashes (dict): File path -> content hash of the files to load
+        workers (int): Number of parsing processes (default: CPU count)
+
+    Yields:
+        tuple: (file path, list of chunks), or (file path, None) if the file could not be parsed
+    """
+    if not file_hashes:
+        return
+    print(f"Parsing {len(file_hashes)} files with up to {workers or os.cpu_count()} worker processes...")
+    all_stats = []
+    start = time.perf_counter()
+    for path, documents, stats in iter_loaded_files(data_path, file_hashes, workers=workers):
+        all_stats.append(stats)
+        if "error" in stats:
+            print(f"Warning: Could not parse {os.path.basename(path)}: {stats['error']}")
+            yield path, None
+            continue
         documents = [doc for doc in documents if doc.page_content.strip()]
-        print(f"Proceeding with {len(documents)} non-empty documents")
-    
-    return documents
+        if not documents:
+            print(f"Warning: No content extracted from: {os.path.basename(path)}")
+        yield path, split_text(documents)
+    print_load_stats(all_stats, time.perf_counter() - start)
 
 def split_text(documents: list[Document]):
     # If there are no documents, return empty list
     if not documents:
         return []
         
-    # Chunk documents
-    print("Splitting documents into chunks...")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=50,
-        length_function=len,
-        add_start_index=True,
-    )
-    chunks = text_splitter.split_documents(documents)
-    print(f"Split {len(documents)} documents into {len(chunks)} chunks")
-    
+    # Chunk each document along its paragraphs, sections and examples
+    documents_by_source = {}
+    for doc in documents:
+        documents_by_source.setdefault(doc.metadata.get("source"), []).append(doc)
+    chunks = []
+    for source_documents in documents_by_source.values():
+        chunks.extend(split_standard_document(source_documents))
     return chunks
 
-def save_to_chroma(chunks: list[Document], embedding_model):
-    print(f"Starting save_to_chroma with {len(chunks)} chunks using model {embedding_model}")
+def save_to_chroma(file_chunks, embedding_model, manifest, file_hashes, removed_files, persist_directory,
+                   batch_size=DEFAULT_EMBED_BATCH_SIZE, embed_workers=1):
+    """
+    Stream chunks into the version's Chroma database, checkpointing every finished file.
+
+    Args:
+        file_chunks (iterable): (file path, list of chunks or None) per changed file
+        embedding_model (str): HuggingFace model name
+        manifest (dict): The version's manifest, updated in place
+        file_hashes (dict): File path -> content hash of the changed files
+        removed_files (list): Indexed files that no longer exist
+        persist_directory (str): The version directory
+        batch_size (int): Number of chunks embedded and written per batch
+        embed_workers (int): Number of embedding processes
+
+    Returns:
+        Chroma: The updated database
+    """
+    print(f"Starting save_to_chroma using model {embedding_model}")
+    # One model copy serves the fingerprint, the in-process batches and validation
+    embeddings = get_embedding_worker(embedding_model, batch_size)
     
-    # Always clear out the database first to avoid corruption
-    if os.path.exists(CHROMA_PATH):
-        print(f"Removing existing database at {CHROMA_PATH}")
-        shutil.rmtree(CHROMA_PATH)
+    # Test embedding to validate
+    test_text = "This is a test"
+    test_embedding = embeddings.embed_query(test_text)
+    print(f"Test embedding dimension: {len(test_embedding)}")
     
-    try:
-        embeddings = HuggingFaceEmbeddings(
-            model_name=embedding_model,
-            cache_folder="./models/"  # Cache the model locally
-        )
-        
-        # Test embedding to validate
-        test_text = "This is a test"
-        test_embedding = embeddings.embed_query(test_text)
-        print(f"Test embedding dimension: {len(test_embedding)}")
-        
-        # Create a new DB from the documents
-        # When a persist_directory is provided, it automatically persists
-        db = Chroma.from_documents(
-            chunks, embeddings, persist_directory=CHROMA_PATH
+    # Record how the index was embedded so the service can use the same model
+    manifest["embedding"] = {
+        "model": embedding_model,
+        "dimension": len(test_embedding),
+        "normalized": abs(math.sqrt(sum(value * value for value in test_embedding)) - 1.0) < 1e-3
+    }
+    
+    # Open (or create) the version's DB and apply the changes to it
+    # Vectors are written straight to the collection; the LangChain wrapper shares its client
+    client = chromadb.PersistentClient(path=persist_directory)
+    collection = client.get_or_create_collection(COLLECTION_NAME)
+    db = Chroma(client=client, collection_name=COLLECTION_NAME, embedding_function=embeddings)
+    last_checkpoint = [time.perf_counter()]
+    
+    def checkpoint(force=False):
+        if force or time.perf_counter() - last_checkpoint[0] >= CHECKPOINT_INTERVAL_SECONDS:
+            dedupe.save(persist_directory)
+            save_manifest(persist_directory, manifest)
+            last_checkpoint[0] = time.perf_counter()
+    
+    # Near-duplicates are matched against the canonical chunks of unchanged files
+    # and of files already processed in this build
+    dedupe = DedupeIndex.load(persist_directory)
+    dedupe.retain({cid for path, entry in manifest["files"].items()
+                   if path not in file_hashes and path not in removed_files
+                   for cid in entry.get("chunk_ids", [])})
+    report = DedupeReport()
+    # Superseded canonical chunk id -> (chunk id replacing it, its source file)
+    demoted = {}
+    
+    removed_ids = []
+    for path in removed_files:
+        removed_ids.extend(manifest["files"].pop(path).get("chunk_ids", []))
+    if removed_ids:
+        db.delete(ids=removed_ids)
+        print(f"Deleted {len(removed_ids)} chunks of {len(removed_files)} removed files")
+    checkpoint(force=True)
+    
+    # File path -> [chunks still being embedded, manifest entry, stale chunk ids]
+    pending = {}
+    stats = {"files": 0, "deleted": len(removed_ids)}
+    # Files parsed and chunks queued so far, to estimate the total chunks for the ETA
+    parsed = {"files": 0, "chunks": 0}
+    reporter = ThroughputReporter()
+    
+    def complete_file(path):
+        _remaining, entry, stale_ids = pending.pop(path)
+        if stale_ids:
+            db.delete(ids=stale_ids)
+        manifest["files"][path] = entry
+        stats["files"] += 1
+        stats["deleted"] += len(stale_ids)
+        checkpoint()
+    
+    def iter_new_chunks():
+        for path, chunks in file_chunks:
+            parsed["files"] += 1
+            if chunks is None:
+                # Keep the indexed version of files that could not be parsed this time
+                reporter.estimate_total(parsed["chunks"], parsed["files"], len(file_hashes))
+                continue
+            # Give every chunk a content-derived id so unchanged chunks keep their vectors
+            occurrences = {}
+            file_chunk_ids = []
+            for chunk in chunks:
+                occurrence = occurrences.get(chunk.page_content, 0)
+                occurrences[chunk.page_content] = occurrence + 1
+                file_chunk_ids.append(chunk_id(chunk, occurrence))
+            
+            # Only canonical chunks are stored; near-duplicates point at their canonical copy
+            stored, duplicates = [], {}
+            for cid, chunk in zip(file_chunk_ids, chunks):
+                signature = minhash_signature(chunk_body(chunk.page_content))
+                standard = chunk.metadata.get("standard")
+                standard_type = chunk.metadata.get("standard_type")
+                canonical_id, _similarity = dedupe.find(signature, exclude=cid, standard=standard,
+                                                        standard_type=standard_type)
+                if canonical_id:
+                    canonical = dedupe.entries[canonical_id]
+                    if not outranks(standard, canonical["standard"]):
+                        duplicates[cid] = canonical_id
+                        report.add_duplicate(path, canonical["source"])
+                        continue
+                    # A superseded standard's copy gives way to the current standard's
+                    demoted[canonical_id] = (cid, canonical["source"])
+                    report.add_duplicate(canonical["source"], path)
+                    report.replaced += 1
+                    dedupe.remove(canonical_id)
+                dedupe.add(cid, signature, path, standard, standard_type)
+                stored.append((cid, chunk))
+            report.add_file(path, len(chunks), len(duplicates))
+            
+            stored_ids = [cid for cid, _chunk in stored]
+            previous_ids = set(manifest["files"].get(path, {}).get("chunk_ids", []))
+            new_chunks = [(cid, chunk) for cid, chunk in stored if cid not in previous_ids]
+            pending[path] = [
+                len(new_chunks),
+                {"file_hash": file_hashes[path], "chunk_ids": stored_ids, "duplicates": duplicates},
+                list(previous_ids - set(stored_ids))
+            ]
+            parsed["chunks"] += len(new_chunks)
+            reporter.estimate_total(parsed["chunks"], parsed["files"], len(file_hashes))
+            if not new_chunks:
+                complete_file(path)
+            for cid, chunk in new_chunks:
+                yield chunk.page_content, (path, cid, chunk)
+    
+    # Embed in batches across worker processes and write each batch as it completes;
+    # batches arrive in order, so a file is done once its last chunk is written
+    for payloads, vectors in embed_batches(iter_batches(iter_new_chunks(), batch_size), embedding_model,
+                                           workers=embed_workers, batch_size=batch_size, model=embeddings):
+        collection.upsert(
+            ids=[cid for _path, cid, _chunk in payloads],
+            embeddings=vectors,
+            metadatas=[chunk.metadata for _path, _cid, chunk in payloads],
+            documents=[chunk.page_content for _path, _cid, chunk in payloads]
         )
-        # No need to call persist() - it's already done when using persist_directory
-        print(f"Successfully saved {len(chunks)} chunks to {CHROMA_PATH}")
-    except Exception as e:
-        print(f"Error in save_to_chroma: {str(e)}")
-        if chunks:
-            print(f"First chunk content: {chunks[0].page_content[:100]}...")
-        raise
+        reporter.update(len(payloads))
+        for path, _cid, _chunk in payloads:
+            pending[path][0] -= 1
+        for path in {path for path, _cid, _chunk in payloads}:
+            if pending[path][0] == 0:
+                complete_file(path)
+    
+    # Replaced canonical chunks are only deleted once every batch has been written
+    if demoted:
+        db.delete(ids=list(demoted))
+        stats["deleted"] += len(demoted)
+        for canonical_id, (replacement_id, source) in demoted.items():
+            entry = manifest["files"].get(source)
+            if entry and canonical_id in entry["chunk_ids"]:
+                entry["chunk_ids"].remove(canonical_id)
+                entry.setdefault("duplicates", {})[canonical_id] = replacement_id
+                report.files.setdefault(source, {"chunks": 0, "duplicates": 0})["duplicates"] += 1
+        for entry in manifest["files"].values():
+            duplicates = entry.get("duplicates", {})
+            for cid, canonical_id in duplicates.items():
+                if canonical_id in demoted:
+                    duplicates[cid] = demoted[canonical_id][0]
+    checkpoint(force=True)
+    report.save(persist_directory)
+    report.print_summary()
+    print(reporter.summary())
+    print(f"Indexed {stats['files']} files, deleted {stats['deleted']} stale chunks in {persist_directory}")
+    return db
 
 if __name__ == "__main__":
     main()
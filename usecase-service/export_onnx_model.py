@@ -0,0 +1,176 @@
+"""
+Export a sentence-transformer to ONNX for the "onnx" and "onnx-int8" embedding backends.
+
+Exporting needs PyTorch, sentence-transformers and onnxruntime; serving the
+exported model only needs onnxruntime and tokenizers. With --verify, the
+ONNX embeddings are compared with the PyTorch embeddings on the validated
+examples and a set of standards sentences, and the script exits with an
+error if they diverge.
+
+Run from the usecase-service directory:
+    python export_onnx_model.py --quantize --verify
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+from utils.constants import DEFAULT_EMBEDDING_MODEL
+from utils.embedding import load_embedding_model
+from utils.examples import load_examples
+from utils.onnx_embedding import (
+    ONNX_MODEL_FILE, ONNX_TOKENIZER_FILE, ONNX_CONFIG_FILE, OnnxEmbeddings, onnx_model_dir
+)
+
+# Minimum cosine similarity between PyTorch and ONNX embeddings of the same text
+MIN_COSINE_FP32 = 0.9999
+MIN_COSINE_INT8 = 0.98
+
+VERIFY_SENTENCES = [
+    "What is the accounting treatment for a Murabaha sale under AAOIFI FAS 28?",
+    "Ijarah Muntahia Bittamleek: recognition of the right-of-use asset by the lessee.",
+    "The bank entered into a Salam contract and paid the full price in advance.",
+    "Percentage of completion method for Istisna'a revenue recognition.",
+    "Sukuk holders share in the returns of the underlying assets.",
+    "Diminishing Musharaka where the partner's share is bought out in instalments.",
+    "The deferred profit is presented as a deduction from Murabaha receivables.",
+    "short",
+]
+
+def export_model(model_name, output_dir, quantize=False):
+    """
+    Export a sentence-transformer's encoder to ONNX with the settings needed to reproduce its embeddings.
+
+    Args:
+        model_name (str): HuggingFace model name
+        output_dir (str): Directory to write the model, tokenizer and config to
+        quantize (bool): Whether to quantize the weights to int8
+
+    Returns:
+        dict: The export config
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+
+    model = SentenceTransformer(model_name, cache_folder="./models/", device="cpu")
+    transformer = model[0]
+    pooling = next((module for module in model if isinstance(module, models.Pooling)), None)
+    pooling_mode = pooling.get_pooling_mode_str() if pooling else "mean"
+    if pooling_mode not in ("mean", "cls", "max"):
+        raise ValueError(f"Pooling mode {pooling_mode!r} of {model_name} is not supported by the ONNX backend")
+    tokenizer = transformer.tokenizer
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids")
+                   if name in tokenizer.model_input_names]
+
+    class Encoder(torch.nn.Module):
+        def __init__(self, encoder):
+            super().__init__()
+            self.encoder = encoder
+
+        def forward(self, *inputs):
+            return self.encoder(**dict(zip(input_names, inputs)), return_dict=True).last_hidden_state
+
+    os.makedirs(output_dir, exist_ok=True)
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    export_path = f"{model_path}.fp32" if quantize else model_path
+    sample = tokenizer(["Export sample sentence"], return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            Encoder(transformer.auto_model.eval()), tuple(sample[name] for name in input_names), export_path,
+            input_names=input_names, output_names=["last_hidden_state"], dynamic_axes=dynamic_axes,
+            opset_version=14, do_constant_folding=True
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(export_path, model_path, weight_type=QuantType.QInt8)
+        os.remove(export_path)
+
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, ONNX_TOKENIZER_FILE))
+    config = {
+        "model": model_name,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "pooling": pooling_mode,
+        "normalize": any(isinstance(module, models.Normalize) for module in model),
+        "max_seq_length": model.max_seq_length,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "quantized": quantize
+    }
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w") as f:
+        json.dump(config, f, indent=2)
+    return config
+
+def query_latency_ms(model, texts, repeat=3):
+    """Median latency of embedding one query at a time."""
+    model.embed_query(texts[0])  # warm-up
+    latencies = []
+    for _ in range(repeat):
+        for text in texts:
+            start = time.perf_counter()
+            model.embed_query(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.median(latencies))
+
+def verify_model(model_name, output_dir, quantize=False):
+    """
+    Compare the ONNX embeddings of an exported model with the PyTorch embeddings.
+
+    Args:
+        model_name (str): HuggingFace model name
+        output_dir (str): Directory of the exported model
+        quantize (bool): Whether the export is int8-quantized
+
+    Returns:
+        bool: True if every text's embeddings are within tolerance
+    """
+    texts = VERIFY_SENTENCES + [example["query"] for examples in load_examples().values() for example in examples]
+    torch_model = load_embedding_model(model_name, backend="torch")
+    onnx_model = OnnxEmbeddings(output_dir)
+
+    expected = np.array(torch_model.embed_documents(texts))
+    actual = np.array(onnx_model.embed_documents(texts))
+    cosines = (expected * actual).sum(axis=1) / (np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1))
+    # Rankings must survive the conversion too: nearest other text of every text
+    expected_neighbours = np.argsort(-(expected @ expected.T), axis=1)[:, 1]
+    actual_neighbours = np.argsort(-(actual @ actual.T), axis=1)[:, 1]
+    min_cosine = MIN_COSINE_INT8 if quantize else MIN_COSINE_FP32
+
+    print(f"Compared {len(texts)} texts")
+    print(f"Cosine similarity: min {cosines.min():.6f}, mean {cosines.mean():.6f} (required >= {min_cosine})")
+    print(f"Max absolute difference: {np.abs(expected - actual).max():.6f}")
+    print(f"Nearest-neighbour agreement: {np.mean(expected_neighbours == actual_neighbours):.1%}")
+    print(f"Query latency: torch {query_latency_ms(torch_model, texts):.1f} ms, "
+          f"onnx {query_latency_ms(onnx_model, texts):.1f} ms")
+    print(f"Model size: {os.path.getsize(os.path.join(output_dir, ONNX_MODEL_FILE)) / 1e6:.1f} MB")
+    return bool(cosines.min() >= min_cosine)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export an embedding model to ONNX.")
+    parser.add_argument("--embedding_model", type=str, default=DEFAULT_EMBEDDING_MODEL, help="HuggingFace model name")
+    parser.add_argument("--quantize", action="store_true", help="Quantize the weights to int8 (onnx-int8 backend)")
+    parser.add_argument("--output_dir", type=str, default=None, help="Output directory (default: models/onnx/<model>)")
+    parser.add_argument("--verify", action="store_true", help="Compare the ONNX and PyTorch embeddings after exporting")
+    parser.add_argument("--skip_export", action="store_true", help="Only verify an existing export")
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or onnx_model_dir(args.embedding_model, quantized=args.quantize)
+    if not args.skip_export:
+        print(f"Exporting {args.embedding_model} to {output_dir}{' (int8)' if args.quantize else ''}")
+        try:
+            config = export_model(args.embedding_model, output_dir, quantize=args.quantize)
+        except Exception:
+            shutil.rmtree(output_dir, ignore_errors=True)
+            raise
+        print(f"Exported {config['dimension']}-dimensional model with {config['pooling']} pooling"
+              f"{' and normalization' if config['normalize'] else ''}")
+        print(f"Serve it with EMBEDDING_BACKEND={'onnx-int8' if args.quantize else 'onnx'}")
+    if args.verify and not verify_model(args.embedding_model, output_dir, quantize=args.quantize):
+        print("ONNX embeddings differ from the PyTorch embeddings beyond tolerance")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,299 @@
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-
-CHROMA_PATH = "chroma"
-EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-
-def inspect_database():
-    embedding_function = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL,
-        cache_folder="./models/"
-    )
-    db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
-    
-    # Retrieve all documents in the database
-    documents = db.similarity_search("test", k=100)
-    print(f"Total documents in database: {len(documents)}")
-    for doc in documents[:5]:  # Print the first 5 documents
-        print(f"Document: {doc.page_content[:100]}...")  # Print the first 100 characters
-        print(f"Metadata: {doc.metadata}")
-
-if __name__ == "__main__":
-    inspect_database()
\ No newline at end of file
+"""
+Diagnostics for the vector database.
+
+Reports the collection size, chunk counts per source, folder and standard,
+the chunk length distribution and the duplicate rate of an index. With
+--benchmark it also runs a golden query set (built from the validated
+examples, or read from --golden) and reports recall@k, MRR and search
+latency. Thresholds such as --min_recall make the script exit with an
+error, so it can gate index rebuilds and backend changes.
+
+Run from the usecase-service directory:
+    python inspect_db.py --benchmark --k 5 --min_recall 0.8
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+import numpy as np
+from langchain_chroma import Chroma
+from utils.dedupe import DEDUPE_REPORT_FILE
+from utils.embedding import get_embedding_worker
+from utils.examples import load_examples
+from utils.hierarchical import load_centroids, hierarchical_search
+from utils.index_store import index_root_path, resolve_index_path, read_fingerprint
+from utils.vector_store import BACKEND_CHROMA, VECTOR_STORE_BACKENDS, open_vector_store, search_by_vector
+
+CHROMA_PATH = "chroma"
+EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"  # Used for unversioned databases only
+
+# Chunks read from the collection per request
+PAGE_SIZE = 5000
+
+# Upper bounds (in characters) of the chunk length histogram bins
+LENGTH_BINS = (250, 500, 1000, 1500, 2000, 3000)
+
+def iter_collection(db, include):
+    """Read every record of a Chroma collection, a page at a time."""
+    offset = 0
+    while True:
+        page = db._collection.get(include=include, limit=PAGE_SIZE, offset=offset)
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
+
+def collection_stats(db, index_path):
+    """
+    Compute size, distribution and duplicate statistics of an index.
+
+    Args:
+        db (Chroma): The opened index
+        index_path (str): Directory of the index version
+
+    Returns:
+        dict: The statistics
+    """
+    sources, folders, standards = Counter(), Counter(), Counter()
+    lengths, contents = [], Counter()
+    for page in iter_collection(db, ["documents", "metadatas"]):
+        for document, metadata in zip(page["documents"], page["metadatas"]):
+            metadata = metadata or {}
+            sources[metadata.get("source") or "unknown"] += 1
+            folders[metadata.get("folder") or "unknown"] += 1
+            standards[metadata.get("standard") or "untagged"] += 1
+            lengths.append(len(document or ""))
+            contents[document] += 1
+
+    lengths = np.array(lengths or [0])
+    edges = (0,) + LENGTH_BINS + (max(int(lengths.max()) + 1, LENGTH_BINS[-1] + 1),)
+    histogram, _ = np.histogram(lengths, bins=edges)
+    stats = {
+        "count": db._collection.count(),
+        "sources": dict(sources.most_common()),
+        "folders": dict(folders.most_common()),
+        "standards": dict(standards.most_common()),
+        "length": {
+            "mean": round(float(lengths.mean()), 1),
+            "p50": int(np.percentile(lengths, 50)),
+            "p95": int(np.percentile(lengths, 95)),
+            "max": int(lengths.max()),
+            "histogram": [
+                {"range": f"{low}-{high - 1}" if i < len(LENGTH_BINS) else f"{low}+", "chunks": int(count)}
+                for i, (low, high, count) in enumerate(zip(edges[:-1], edges[1:], histogram))
+            ]
+        },
+        "exact_duplicates": sum(count - 1 for count in contents.values() if count > 1)
+    }
+    # Near-duplicates were dropped at build time and recorded in the dedupe report
+    try:
+        with open(os.path.join(index_path, DEDUPE_REPORT_FILE), "r") as f:
+            report = json.load(f)
+        stats["near_duplicates"] = {key: report[key] for key in ("chunks", "duplicates", "duplicate_rate")}
+    except (OSError, json.JSONDecodeError, KeyError):
+        stats["near_duplicates"] = None
+    return stats
+
+def print_stats(stats, top=10):
+    print(f"Total chunks in collection: {stats['count']}")
+    for label, key in (("source", "sources"), ("folder", "folders"), ("standard", "standards")):
+        counts = stats[key]
+        print(f"\nChunks per {label} ({len(counts)} total):")
+        for name, count in list(counts.items())[:top]:
+            print(f"  {count:>6}  {name}")
+        if len(counts) > top:
+            print(f"  ... {len(counts) - top} more")
+    length = stats["length"]
+    print(f"\nChunk length (chars): mean {length['mean']}, p50 {length['p50']}, p95 {length['p95']}, max {length['max']}")
+    widest = max(bin_["chunks"] for bin_ in length["histogram"]) or 1
+    for bin_ in length["histogram"]:
+        print(f"  {bin_['range']:>10}  {bin_['chunks']:>6}  {'#' * round(40 * bin_['chunks'] / widest)}")
+    print(f"\nExact duplicate chunks: {stats['exact_duplicates']} "
+          f"({stats['exact_duplicates'] / max(1, stats['count']):.1%})")
+    near = stats["near_duplicates"]
+    if near:
+        print(f"Near-duplicates dropped at build: {near['duplicates']} of {near['chunks']} ({near['duplicate_rate']:.1%})")
+    else:
+        print("Near-duplicates dropped at build: no dedupe report")
+
+def load_golden_queries(path=None):
+    """
+    Load the golden queries of the retrieval benchmark.
+
+    Without a path, every validated example is a query whose relevant chunks
+    are the chunks of its standard type. A golden file is a JSON list of
+    {"query", and one or more of "standard_type", "standard", "source"}; a
+    chunk is relevant when its metadata matches every given field ("source"
+    matches as a substring).
+    """
+    if path:
+        with open(path, "r") as f:
+            return json.load(f)
+    return [
+        {"query": example["query"], "standard_type": standard_type}
+        for standard_type, examples in load_examples().items()
+        for example in examples
+    ]
+
+def is_relevant(metadata, golden):
+    if golden.get("standard_type") and metadata.get("standard_type") != golden["standard_type"]:
+        return False
+    if golden.get("standard") and metadata.get("standard") != golden["standard"]:
+        return False
+    if golden.get("source") and golden["source"] not in (metadata.get("source") or ""):
+        return False
+    return True
+
+def run_benchmark(store, embedding_function, golden_queries, k, centroids=None, repeat=3):
+    """
+    Measure retrieval quality and latency over golden queries.
+
+    Queries are embedded up front, so latencies only cover the search.
+
+    Args:
+        store: The opened vector store
+        embedding_function: The index's embedding function
+        golden_queries (list): Queries from load_golden_queries
+        k (int): Number of results per query
+        centroids (dict): Centroids for hierarchical search, or None for flat search
+        repeat (int): Timed passes over the queries
+
+    Returns:
+        dict: recall@k (share of queries with a relevant chunk in the top k),
+            precision@k, MRR and latency percentiles in milliseconds
+    """
+    vectors = embedding_function.embed_documents([golden["query"] for golden in golden_queries])
+
+    def search(vector):
+        if centroids is not None:
+            return hierarchical_search(store, vector, k, centroids)[0]
+        return search_by_vector(store, vector, k=k)
+
+    hits, precision, reciprocal_ranks, per_query = 0, 0.0, 0.0, []
+    for golden, vector in zip(golden_queries, vectors):
+        relevant = [is_relevant(doc.metadata, golden) for doc, _score in search(vector)]
+        rank = relevant.index(True) + 1 if True in relevant else None
+        hits += rank is not None
+        precision += sum(relevant) / k
+        reciprocal_ranks += 1 / rank if rank else 0.0
+        per_query.append({"query": golden["query"][:80], "first_relevant_rank": rank})
+
+    latencies = []
+    for _ in range(repeat):
+        for vector in vectors:
+            start = time.perf_counter()
+            search(vector)
+            latencies.append((time.perf_counter() - start) * 1000)
+    count = max(1, len(golden_queries))
+    return {
+        "queries": len(golden_queries),
+        "k": k,
+        "recall_at_k": round(hits / count, 4),
+        "precision_at_k": round(precision / count, 4),
+        "mrr": round(reciprocal_ranks / count, 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+        "per_query": per_query
+    }
+
+def print_benchmark(result, label):
+    print(f"\nRetrieval benchmark ({label}, {result['queries']} golden queries, k={result['k']}):")
+    print(f"  recall@k {result['recall_at_k']:.3f}  precision@k {result['precision_at_k']:.3f}  "
+          f"MRR {result['mrr']:.3f}  p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms")
+    for query in result["per_query"]:
+        rank = query["first_relevant_rank"]
+        print(f"  {'rank ' + str(rank) if rank else 'miss':>7}  {query['query']}")
+
+def inspect_database(index_name=None, samples=0, benchmark=False, k=5, golden=None,
+                     backend=BACKEND_CHROMA, hierarchical=False, as_json=False):
+    """
+    Print diagnostics of an index and optionally benchmark retrieval over golden queries.
+
+    Returns:
+        dict or None: The diagnostics, or None if the index does not exist
+    """
+    index_root = index_root_path(index_name, CHROMA_PATH)
+    index_path = resolve_index_path(index_root)
+    if index_path is None:
+        print(f"No database found at {index_root}. Please run create_database.py first.")
+        return None
+    # Open the index with the model it was built with
+    fingerprint = read_fingerprint(index_path)
+    embedding_model = fingerprint["model"] if fingerprint else EMBEDDING_MODEL
+    embedding_function = get_embedding_worker(embedding_model)
+    db = Chroma(persist_directory=index_path, embedding_function=embedding_function)
+
+    diagnostics = {"index_path": index_path, "fingerprint": fingerprint, "stats": collection_stats(db, index_path)}
+    if not as_json:
+        print(f"Inspecting index at {index_path}")
+        print(f"Embedding fingerprint: {fingerprint or 'not recorded'}\n")
+        print_stats(diagnostics["stats"])
+        if samples:
+            page = db._collection.get(include=["documents", "metadatas"], limit=samples)
+            print(f"\nFirst {len(page['ids'])} chunks:")
+            for document, metadata in zip(page["documents"], page["metadatas"]):
+                print(f"Document: {document[:100]}...")
+                print(f"Metadata: {metadata}")
+
+    if benchmark:
+        golden_queries = load_golden_queries(golden)
+        if not golden_queries:
+            print("No golden queries: add validated examples or pass --golden")
+        else:
+            store = db if backend == BACKEND_CHROMA else open_vector_store(index_path, embedding_function, backend)
+            centroids = load_centroids(index_path) if hierarchical else None
+            if hierarchical and centroids is None:
+                print("The index has no centroids; benchmarking flat search")
+            label = f"{backend}, {'hierarchical' if centroids is not None else 'flat'}"
+            diagnostics["benchmark"] = run_benchmark(store, embedding_function, golden_queries, k, centroids)
+            diagnostics["benchmark"]["label"] = label
+            if not as_json:
+                print_benchmark(diagnostics["benchmark"], label)
+    if as_json:
+        print(json.dumps(diagnostics, indent=2))
+    return diagnostics
+
+def check_thresholds(benchmark, min_recall=None, min_mrr=None, max_p95_ms=None):
+    """Return the list of failed benchmark thresholds."""
+    failures = []
+    if min_recall is not None and benchmark["recall_at_k"] < min_recall:
+        failures.append(f"recall@k {benchmark['recall_at_k']} < {min_recall}")
+    if min_mrr is not None and benchmark["mrr"] < min_mrr:
+        failures.append(f"MRR {benchmark['mrr']} < {min_mrr}")
+    if max_p95_ms is not None and benchmark["p95_ms"] is not None and benchmark["p95_ms"] > max_p95_ms:
+        failures.append(f"p95 latency {benchmark['p95_ms']} ms > {max_p95_ms} ms")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the vector database.")
+    parser.add_argument("--index_name", type=str, default=None, help="Named index to inspect (default: the default index)")
+    parser.add_argument("--samples", type=int, default=0, help="Print the first N chunks")
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark retrieval over the golden queries")
+    parser.add_argument("--k", type=int, default=5, help="Number of results per benchmark query")
+    parser.add_argument("--golden", type=str, default=None, help="Golden query JSON file (default: validated examples)")
+    parser.add_argument("--backend", type=str, default=BACKEND_CHROMA, choices=VECTOR_STORE_BACKENDS,
+                        help="Vector store backend to benchmark")
+    parser.add_argument("--hierarchical", action="store_true", help="Benchmark centroid-routed search")
+    parser.add_argument("--json", action="store_true", help="Print the diagnostics as JSON")
+    parser.add_argument("--min_recall", type=float, default=None, help="Fail if recall@k is lower")
+    parser.add_argument("--min_mrr", type=float, default=None, help="Fail if MRR is lower")
+    parser.add_argument("--max_p95_ms", type=float, default=None, help="Fail if p95 search latency is higher")
+    args = parser.parse_args()
+    diagnostics = inspect_database(args.index_name, samples=args.samples, benchmark=args.benchmark, k=args.k,
+                                   golden=args.golden, backend=args.backend, hierarchical=args.hierarchical,
+                                   as_json=args.json)
+    if diagnostics is None:
+        sys.exit(1)
+    thresholds = (args.min_recall, args.min_mrr, args.max_p95_ms)
+    if any(threshold is not None for threshold in thresholds):
+        if not diagnostics.get("benchmark"):
+            print("FAILED: thresholds given but no benchmark was run (pass --benchmark)", file=sys.stderr)
+            sys.exit(1)
+        failures = check_thresholds(diagnostics["benchmark"], *thresholds)
+        for failure in failures:
+            print(f"FAILED: {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
@@ -1,32 +1,77 @@
 from flask import Blueprint, request, jsonify
-import os
 import logging
 import random
-from langchain_community.vectorstores import Chroma
+import time
 from langchain.prompts import ChatPromptTemplate
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_together import ChatTogether
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 # Import utility modules
 from utils.constants import (
-    CHROMA_PATH, DEFAULT_EMBEDDING_MODEL, TOGETHER_MODEL, GEMINI_MODEL, API_METHOD,
+    TOGETHER_MODEL, GEMINI_MODEL, API_METHOD,
     STANDARD_TYPE_MURABAHA, STANDARD_TYPE_SALAM, STANDARD_TYPE_ISTISNA, 
-    STANDARD_TYPE_IJARAH, STANDARD_TYPE_SUKUK, STANDARD_TYPE_MUSHARAKA
+    STANDARD_TYPE_IJARAH, STANDARD_TYPE_SUKUK, STANDARD_TYPE_MUSHARAKA,
+    SEARCH_DEFAULT_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE, SEARCH_MAX_PAGE, MAX_QUERY_CHARS, MAX_RESPONSE_CHARS,
+    OUTPUT_FORMAT_TEXT, OUTPUT_FORMAT_JSON, DEFAULT_OUTPUT_FORMAT, SCHEDULE_FREQUENCIES, DEFAULT_SCHEDULE_FREQUENCY,
+    DEFAULT_ISTISNA_FREQUENCY
+)
+from utils.extraction import (
+    detect_standard_type, extract_ijarah_variables, extract_murabaha_variables, extract_istisna_variables,
+    IJARAH_REQUIRED, IJARAH_VARIABLES, MURABAHA_REQUIRED, MURABAHA_VARIABLES, ISTISNA_REQUIRED, ISTISNA_VARIABLES
 )
-from utils.extraction import detect_standard_type, extract_ijarah_variables, extract_murabaha_variables, extract_istisna_variables
 from utils.calculation import calculate_ijarah_values, calculate_murabaha_values, calculate_istisna_values
-from utils.formatting import format_ijarah_response, format_murabaha_response, format_istisna_response
-from utils.caching import get_cached_response, cache_response
+from utils.formatting import (
+    format_ijarah_response, format_murabaha_response, format_istisna_response,
+    structure_ijarah_response, structure_murabaha_response, structure_istisna_response
+)
+from utils.caching import get_cached_response, cache_response, STRUCTURED_CACHE_FILE
 from utils.parsing import extract_thinking_process, parse_financial_data
+from utils.llm import create_llm, invoke_llm, generate_structured_response, fill_missing_variables
+from utils.schema import load_structured_response, render_structured_response, structured_to_financial_data
+from utils.retrieval import (
+    EmbeddingModelMismatchError, embed_query, get_vector_store, list_indexes, retrieve_context,
+    route_standard_type, search_chunks
+)
+from utils.index_store import index_root_path
 from utils.constants import get_prompt_for_standard
 
 # Create the blueprint for the usecase route
 usecase_bp = Blueprint('usecase_bp', __name__)
 logger = logging.getLogger("islamic_finance_api")
 
-def process_query(query_text, embedding_model=DEFAULT_EMBEDDING_MODEL, llm_model=None, use_openai=False, force_reload=False):
-    """Process a query and return the response using the configured LLM API (Gemini or Together AI) via LangChain."""
+# Names of the standards in the debug log of the answers returned to the frontend
+_FRONTEND_LOG_LABELS = {
+    STANDARD_TYPE_IJARAH: "IJARAH",
+    STANDARD_TYPE_MURABAHA: "MURABAHA",
+    STANDARD_TYPE_ISTISNA: "ISTISNA'A",
+    STANDARD_TYPE_SALAM: "SALAM",
+    STANDARD_TYPE_SUKUK: "SUKUK",
+    STANDARD_TYPE_MUSHARAKA: "MUSHARAKA",
+}
+
+def _calculated_result(structured_output, format_response, variables, calculations, include_response, source,
+                       standard_routing):
+    """Build the result of a calculated answer, rendering its Markdown only when the response is included."""
+    result = {"structured_output": structured_output, "sources": [source], "standard_routing": standard_routing}
+    if include_response:
+        result["response"] = format_response(variables, calculations)
+    return result
+
+def process_query(query_text, embedding_model=None, llm_model=None, use_openai=False, force_reload=False, index_name=None,
+                  output_format=OUTPUT_FORMAT_TEXT, include_response=True, schedule_frequency=None):
+    """
+    Process a query and return the response using the configured LLM API (Gemini or Together AI) via LangChain.
+
+    With OUTPUT_FORMAT_JSON, LLM answers follow the schema of utils.schema: the
+    result then holds the validated answer as "structured_output" and its
+    Markdown rendering as "response".
+
+    Ijarah, Murabaha and Istisna'a scenarios with all their variables are
+    calculated instead, after a short LLM call for the variables the label
+    maps missed: their result always holds the calculated answer as
+    "structured_output", and its Markdown rendering as "response" only when
+    include_response is set. Ijarah and Istisna'a schedules have one row per
+    period of schedule_frequency; without one, Ijarah schedules are yearly
+    and Istisna'a schedules quarterly.
+    """
     
     # Set default model based on API_METHOD if none provided
     if llm_model is None:
@@ -34,105 +79,99 @@ def process_query(query_text, embedding_model=DEFAULT_EMBEDDING_MODEL, llm_model
     
     print(f'API method: {API_METHOD}')
     print(f'LLM model: {llm_model}')
-    embedding_function = HuggingFaceEmbeddings(
-        model_name=embedding_model,
-        cache_folder="./models/"
-    )
-    if not os.path.exists(CHROMA_PATH):
-        raise FileNotFoundError(f"Database not found at {CHROMA_PATH}. Please run create_database.py first.")
-    db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
-    standard_type = detect_standard_type(query_text)
+    # Open the index up front so a missing or mismatched index fails before any work
+    get_vector_store(embedding_model, index_name=index_name)
+    # The query is embedded once, for both standard routing and retrieval
+    query_vector = embed_query(query_text, embedding_model, index_name=index_name)
+    standard_routing = route_standard_type(query_text, query_vector, embedding_model, index_name=index_name)
+    standard_type = standard_routing["standard_type"]
+    logger.debug(f"Standard routing: {standard_type} ({standard_routing['method']}, confidence {standard_routing['confidence']})")
     
     # Handle Ijarah cases with direct calculation
     if standard_type == STANDARD_TYPE_IJARAH:
         variables = extract_ijarah_variables(query_text)
+        variables = fill_missing_variables(query_text, variables, IJARAH_VARIABLES, IJARAH_REQUIRED, llm_model)
         if 'purchase_price' in variables and 'yearly_rental' in variables and 'lease_term' in variables:
-            calculations = calculate_ijarah_values(variables)
-            response_text = format_ijarah_response(variables, calculations)
-            return {"response": response_text, "sources": ["Calculated based on AAOIFI FAS 28 standards"]}
+            calculations = calculate_ijarah_values(variables, schedule_frequency or DEFAULT_SCHEDULE_FREQUENCY)
+            return _calculated_result(structure_ijarah_response(variables, calculations), format_ijarah_response,
+                                      variables, calculations, include_response,
+                                      "Calculated based on AAOIFI FAS 28 standards", standard_routing)
     
     # Handle Murabaha cases with direct calculation
     elif standard_type == STANDARD_TYPE_MURABAHA:
         variables = extract_murabaha_variables(query_text)
+        variables = fill_missing_variables(query_text, variables, MURABAHA_VARIABLES, MURABAHA_REQUIRED, llm_model)
         if 'cost_price' in variables:
             calculations = calculate_murabaha_values(variables)
-            response_text = format_murabaha_response(variables, calculations)
-            return {"response": response_text, "sources": ["Calculated based on AAOIFI FAS 4 standards"]}
+            return _calculated_result(structure_murabaha_response(variables, calculations), format_murabaha_response,
+                                      variables, calculations, include_response,
+                                      "Calculated based on AAOIFI FAS 4 standards", standard_routing)
     
     # Handle Istisna'a cases with direct calculation
     elif standard_type == STANDARD_TYPE_ISTISNA and ("percentage" in query_text.lower() or "completion" in query_text.lower()):
         print("\n\n==== PROCESSING ISTISNA'A SCENARIO ====\n")
         variables = extract_istisna_variables(query_text)
+        variables = fill_missing_variables(query_text, variables, ISTISNA_VARIABLES, ISTISNA_REQUIRED, llm_model)
         print(f"Extracted variables: {variables}")
         
         # Add description to variables for better context extraction
         variables['description'] = query_text
         
         if 'contract_value' in variables and ('total_cost' in variables or 'parallel istisna' in query_text.lower()):
-            calculations = calculate_istisna_values(variables)
+            calculations = calculate_istisna_values(variables, schedule_frequency or DEFAULT_ISTISNA_FREQUENCY)
             print(f"Calculated values: {calculations}")
             
             # Print quarterly progress for debugging
             print("\nQuarterly Progress:")
-            for idx, quarter in enumerate(calculations.get('quarterly_progress', [])):
-                print(f"Quarter {idx+1}: {quarter}")
+            for quarter in calculations.get('quarterly_progress', []):
+                print(f"{quarter['period']}: {quarter}")
             
-            response_text = format_istisna_response(variables, calculations)
-            print(f"\nFormatted response (first 200 chars): {response_text[:200]}...")
+            result = _calculated_result(structure_istisna_response(variables, calculations), format_istisna_response,
+                                        variables, calculations, include_response,
+                                        "Calculated based on AAOIFI FAS 10 standards", standard_routing)
+            if "response" in result:
+                logger.debug(f"Formatted response (first 200 chars): {result['response'][:200]}...")
             print("\n==== END ISTISNA'A PROCESSING ====\n")
-            return {"response": response_text, "sources": ["Calculated based on AAOIFI FAS 10 standards"]}
+            return result
     
     # For other cases, use the LLM
-    search_query = query_text
-    if standard_type == STANDARD_TYPE_MURABAHA:
-        search_query = f"murabaha financing AAOIFI FAS 4 {query_text}"
-    elif standard_type == STANDARD_TYPE_SALAM:
-        search_query = f"salam contract AAOIFI FAS 7 {query_text}"
-    elif standard_type == STANDARD_TYPE_ISTISNA:
-        search_query = f"istisna contract AAOIFI FAS 10 {query_text}"
-    elif standard_type == STANDARD_TYPE_IJARAH:
-        search_query = f"ijarah lease AAOIFI FAS 28 {query_text}"
-    elif standard_type == STANDARD_TYPE_SUKUK:
-        search_query = f"sukuk investment AAOIFI FAS 32 {query_text}"
-    elif standard_type == STANDARD_TYPE_MUSHARAKA:
-        search_query = f"musharaka partnership AAOIFI FAS 4 {query_text}"
-        
-    results = db.similarity_search_with_relevance_scores(search_query, k=5)
+    results, routing = retrieve_context(query_text, 5, standard_type=standard_type,
+                                        embedding_model=embedding_model, index_name=index_name,
+                                        query_vector=query_vector)
     if len(results) == 0 or results[0][1] < -9:
         raise ValueError("Unable to find matching results.")
     context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
-    prompt_template = ChatPromptTemplate.from_template(get_prompt_for_standard(standard_type))
+    prompt_template = ChatPromptTemplate.from_template(get_prompt_for_standard(standard_type, output_format=output_format))
     prompt = prompt_template.format(context=context_text, question=query_text)
     
-    # Use the semantic caching system with the force_reload parameter
-    cached_response = get_cached_response(prompt, force_reload=force_reload)
-    if cached_response and not force_reload:
-        response_text = cached_response
-        print("Using semantically cached response")
+    if output_format == OUTPUT_FORMAT_JSON:
+        structured_output = None
+        cached_response = get_cached_response(prompt, cache_file=STRUCTURED_CACHE_FILE, force_reload=force_reload)
+        if cached_response and not force_reload:
+            try:
+                structured_output = load_structured_response(cached_response)
+                raw_response = cached_response
+                print("Using semantically cached structured response")
+            except ValueError as e:
+                logger.warning(f"Ignoring an invalid cached structured response: {str(e)}")
+        if structured_output is None:
+            raw_response, structured_output = generate_structured_response(prompt, llm_model)
+            cache_response(prompt, raw_response, cache_file=STRUCTURED_CACHE_FILE)
+            print("Generated new structured response and cached it")
+        thinking_process = extract_thinking_process(raw_response)
+        response_text = render_structured_response(structured_output)
     else:
-        # Use default model if none provided
-        if llm_model is None:
-            llm_model = TOGETHER_MODEL if API_METHOD == "together" else GEMINI_MODEL
+        # Use the semantic caching system with the force_reload parameter
+        cached_response = get_cached_response(prompt, force_reload=force_reload)
+        if cached_response and not force_reload:
+            response_text = cached_response
+            print("Using semantically cached response")
+        else:
+            response_text = invoke_llm(create_llm(llm_model), prompt)
             
-        # Use the appropriate LLM based on API_METHOD
-        if API_METHOD == "together":
-            llm = ChatTogether(
-                model=llm_model,
-                temperature=0.3,
-                together_api_key=os.getenv("TOGETHER_API_KEY")
-            )
-        else:  # Use Gemini
-            llm = ChatGoogleGenerativeAI(
-                model=llm_model,
-                temperature=0.3,
-                google_api_key=os.getenv("GOOGLE_API_KEY")
-            )
-        response = llm.invoke(prompt)
-        response_text = response.content if hasattr(response, "content") else str(response)
-        
-        # Cache the response with our improved caching system
-        cache_response(prompt, response_text)
-        print("Generated new response and cached it")
+            # Cache the response with our improved caching system
+            cache_response(prompt, response_text)
+            print("Generated new response and cached it")
         
     sources = [doc.metadata.get("source", None) for doc, _score in results]
     
@@ -143,91 +182,156 @@ def process_query(query_text, embedding_model=DEFAULT_EMBEDDING_MODEL, llm_model
         if cleared > 0:
             print(f"Cleared {cleared} expired cache entries")
             
-    return {"response": response_text, "sources": sources}
+    result = {"response": response_text, "sources": sources, "standard_routing": standard_routing}
+    if output_format == OUTPUT_FORMAT_JSON:
+        result["structured_output"] = structured_output
+        result["thinking_process"] = thinking_process
+    if routing:
+        result["routing"] = {
+            "standards": routing["standards"][:3],
+            "sections": routing["sections"],
+            "confidence": routing["confidence"],
+            "margin": routing["margin"]
+        }
+    return result
 
 @usecase_bp.route('', methods=['POST'])
 def query_handler():
     """Handle /usecase POST requests"""
     data = request.json
     query_text = data.get("query_text")
-    embedding_model = data.get("embedding_model", DEFAULT_EMBEDDING_MODEL)
+    embedding_model = data.get("embedding_model")
+    index_name = data.get("index")
     llm_model = data.get("llm_model", None)
     use_openai = data.get("use_openai", True)
     force_reload = data.get("force_reload", False)
+    output_format = data.get("output_format", DEFAULT_OUTPUT_FORMAT)
+    include_response = data.get("include_response", True)
+    # Each calculator's own frequency when none is requested
+    schedule_frequency = data.get("schedule_frequency")
     
     if not query_text:
         return jsonify({"error": "query_text is required"}), 400
+    if len(query_text) > MAX_QUERY_CHARS:
+        return jsonify({"error": f"query_text must be at most {MAX_QUERY_CHARS} characters"}), 413
+    if output_format not in (OUTPUT_FORMAT_TEXT, OUTPUT_FORMAT_JSON):
+        return jsonify({"error": f"output_format must be {OUTPUT_FORMAT_TEXT} or {OUTPUT_FORMAT_JSON}"}), 400
+    if schedule_frequency is not None and schedule_frequency not in SCHEDULE_FREQUENCIES:
+        return jsonify({"error": f"schedule_frequency must be one of {', '.join(SCHEDULE_FREQUENCIES)}"}), 400
+    try:
+        index_root_path(index_name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     try:
         # Process the query
-        result = process_query(query_text, embedding_model, llm_model, use_openai, force_reload)
+        result = process_query(query_text, embedding_model, llm_model, use_openai, force_reload, index_name=index_name,
+                               output_format=output_format, include_response=include_response,
+                               schedule_frequency=schedule_frequency)
+        # Calculated answers are only rendered when the response is included
+        response_text = result.get("response")
         
-        # Extract thinking process if present
-        thinking_process = extract_thinking_process(result["response"])
-        
-        # Parse the response to extract structured financial data
-        parsed_result = parse_financial_data(result["response"], query_text)
+        if "structured_output" in result:
+            # Structured and calculated answers are returned as they are, without parsing the rendered text
+            thinking_process = result.get("thinking_process")
+            parsed_result = structured_to_financial_data(result["structured_output"], response_text)
+        else:
+            # Extract thinking process if present
+            thinking_process = extract_thinking_process(response_text)
+            
+            # Parse the response to extract structured financial data
+            parsed_result = parse_financial_data(response_text, query_text)
         
         # Log the response for comparison between backend and frontend
-        standard_type = detect_standard_type(query_text)
+        standard_type = result["standard_routing"]["standard_type"]
         
         # Log appropriate messages based on the standard type
-        if standard_type == STANDARD_TYPE_IJARAH:
-            print("\n==== IJARAH RESPONSE (FRONTEND) ====\n")
-            print(result["response"])
-            print("\n==== STRUCTURED IJARAH DATA (FRONTEND) ====\n")
-            print(parsed_result)
-            print("\n==== END IJARAH FRONTEND DATA ====\n")
-        elif standard_type == STANDARD_TYPE_MURABAHA:
-            print("\n==== MURABAHA RESPONSE (FRONTEND) ====\n")
-            print(result["response"])
-            print("\n==== STRUCTURED MURABAHA DATA (FRONTEND) ====\n")
-            print(parsed_result)
-            print("\n==== END MURABAHA FRONTEND DATA ====\n")
-        elif standard_type == STANDARD_TYPE_ISTISNA:
-            print("\n==== ISTISNA'A RESPONSE (FRONTEND) ====\n")
-            print(result["response"])
-            print("\n==== STRUCTURED ISTISNA'A DATA (FRONTEND) ====\n")
-            print(parsed_result)
-            print("\n==== END ISTISNA'A FRONTEND DATA ====\n")
-        elif standard_type == STANDARD_TYPE_SALAM:
-            print("\n==== SALAM RESPONSE (FRONTEND) ====\n")
-            print(result["response"])
-            print("\n==== STRUCTURED SALAM DATA (FRONTEND) ====\n")
-            print(parsed_result)
-            print("\n==== END SALAM FRONTEND DATA ====\n")
-        elif standard_type == STANDARD_TYPE_SUKUK:
-            print("\n==== SUKUK RESPONSE (FRONTEND) ====\n")
-            print(result["response"])
-            print("\n==== STRUCTURED SUKUK DATA (FRONTEND) ====\n")
-            print(parsed_result)
-            print("\n==== END SUKUK FRONTEND DATA ====\n")
-        elif standard_type == STANDARD_TYPE_MUSHARAKA:
-            print("\n==== MUSHARAKA RESPONSE (FRONTEND) ====\n")
-            print(result["response"])
-            print("\n==== STRUCTURED MUSHARAKA DATA (FRONTEND) ====\n")
-            print(parsed_result)
-            print("\n==== END MUSHARAKA FRONTEND DATA ====\n")
-        else:
-            print("\n==== GENERIC RESPONSE (FRONTEND) ====\n")
-            print(result["response"])
-            print("\n==== STRUCTURED DATA (FRONTEND) ====\n")
-            print(parsed_result)
-            print("\n==== END FRONTEND DATA ====\n")
+        label = _FRONTEND_LOG_LABELS.get(standard_type, "GENERIC")
+        logger.debug(f"==== {label} RESPONSE (FRONTEND) ====\n{response_text}")
+        logger.debug(f"==== STRUCTURED {label} DATA (FRONTEND) ====\n{parsed_result}")
         
         # Return both the original response and structured data
         response_data = {
-            "response": result["response"],
             "thinking_process": thinking_process,
             "explanation": parsed_result.get("explanation", ""),
-            "structured_response": parsed_result
+            "structured_response": parsed_result,
+            "standard_routing": result["standard_routing"]
         }
+        if include_response:
+            response_data["response"] = response_text
+        if output_format == OUTPUT_FORMAT_JSON:
+            response_data["structured_output"] = result["structured_output"]
         
         return jsonify(response_data)
+    except EmbeddingModelMismatchError as e:
+        logger.error(f"Error in /usecase: {str(e)}")
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error in /usecase: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@usecase_bp.route('/search', methods=['GET', 'POST'])
+def search_handler():
+    """Handle /usecase/search requests: retrieval-only search over the standards corpus"""
+    data = request.get_json(silent=True) if request.method == 'POST' else request.args
+    data = data or {}
+    query_text = data.get("query_text")
+    standard_type = data.get("standard_type")
+    folder = data.get("folder")
+    embedding_model = data.get("embedding_model")
+    index_name = data.get("index")
+
+    if not query_text:
+        return jsonify({"error": "query_text is required"}), 400
+    if len(query_text) > MAX_QUERY_CHARS:
+        return jsonify({"error": f"query_text must be at most {MAX_QUERY_CHARS} characters"}), 413
+    try:
+        index_root_path(index_name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    valid_standards = (
+        STANDARD_TYPE_MURABAHA, STANDARD_TYPE_SALAM, STANDARD_TYPE_ISTISNA,
+        STANDARD_TYPE_IJARAH, STANDARD_TYPE_SUKUK, STANDARD_TYPE_MUSHARAKA
+    )
+    if standard_type:
+        standard_type = str(standard_type).upper()
+        if standard_type not in valid_standards:
+            return jsonify({"error": f"standard_type must be one of {', '.join(valid_standards)}"}), 400
+
+    try:
+        page = int(data.get("page", 1))
+        page_size = int(data.get("page_size", SEARCH_DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return jsonify({"error": "page and page_size must be integers"}), 400
+    if page < 1 or page > SEARCH_MAX_PAGE:
+        return jsonify({"error": f"page must be between 1 and {SEARCH_MAX_PAGE}"}), 400
+    if page_size < 1 or page_size > SEARCH_MAX_PAGE_SIZE:
+        return jsonify({"error": f"page_size must be between 1 and {SEARCH_MAX_PAGE_SIZE}"}), 400
+
+    try:
+        start = time.perf_counter()
+        result = search_chunks(
+            query_text, standard_type=standard_type, page=page, page_size=page_size,
+            folder=folder, embedding_model=embedding_model, index_name=index_name
+        )
+        result["took_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return jsonify(result)
+    except EmbeddingModelMismatchError as e:
+        logger.error(f"Error in /usecase/search: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+    except FileNotFoundError as e:
+        logger.error(f"Error in /usecase/search: {str(e)}")
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in /usecase/search: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@usecase_bp.route('/indexes', methods=['GET'])
+def indexes_handler():
+    """Handle /usecase/indexes requests: list the served indexes and their embedding models"""
+    return jsonify({"indexes": list_indexes()})
+
 @usecase_bp.route('/validate', methods=['POST'])
 def validate_response():
     """Handle validation of a response by the user"""
@@ -237,6 +341,9 @@ def validate_response():
     
     if not query_text or not response_text:
         return jsonify({"error": "Both query_text and response_text are required"}), 400
+    if len(query_text) > MAX_QUERY_CHARS or len(response_text) > MAX_RESPONSE_CHARS:
+        return jsonify({"error": f"query_text must be at most {MAX_QUERY_CHARS} and response_text at most "
+                                 f"{MAX_RESPONSE_CHARS} characters"}), 413
     
     try:
         # Detect which standard applies to this query
@@ -7,8 +7,24 @@ This package contains various utility functions and classes for processing Islam
 from .constants import *
 from .language import *
 from .analysis import *
+from .numeric_tokens import *
 from .extraction import *
+from .schedules import *
 from .calculation import *
 from .formatting import *
 from .caching import *
+from .text_scan import *
 from .parsing import *
+from .schema import *
+from .llm import *
+from .index_store import *
+from .loaders import *
+from .embedding import *
+from .onnx_embedding import *
+from .chunking import *
+from .dedupe import *
+from .vector_store import *
+from .hierarchical import *
+from .keyword_matcher import *
+from .standard_router import *
+from .retrieval import *
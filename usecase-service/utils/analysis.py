@@ -2,13 +2,11 @@
 Analysis utilities for the Islamic Finance API.
 """
 
-import os
 import json
 import logging
 from datetime import datetime
-from langchain_together import ChatTogether
-from langchain_google_genai import ChatGoogleGenerativeAI
-from .constants import STANDARDS_INFO, API_METHOD, TOGETHER_MODEL, GEMINI_MODEL
+from .constants import STANDARDS_INFO
+from .llm import create_llm, invoke_llm
 from .language import detect_language
 
 logger = logging.getLogger("islamic_finance_api")
@@ -95,25 +93,8 @@ def analyze_transaction(transaction_text, model=None, temperature=0.2):
             "anomalies": ["any unusual aspects", "potential compliance issues", "inconsistencies"]
         }}
         """
-        # Use the appropriate LLM based on API_METHOD
-        if model is None:
-            # Use default model based on API_METHOD
-            model = TOGETHER_MODEL if API_METHOD == "together" else GEMINI_MODEL
-            
-        if API_METHOD == "together":
-            llm = ChatTogether(
-                model=model,
-                temperature=temperature,
-                together_api_key=os.getenv("TOGETHER_API_KEY")
-            )
-        else:  # Use Gemini
-            llm = ChatGoogleGenerativeAI(
-                model=model,
-                temperature=temperature,
-                google_api_key=os.getenv("GOOGLE_API_KEY")
-            )
-        response = llm.invoke(prompt)
-        response_text = response.content if hasattr(response, "content") else str(response)
+        # Use the LLM of the configured API (the API's default model if none is given)
+        response_text = invoke_llm(create_llm(model, temperature), prompt)
         try:
             result = json.loads(response_text)
         except json.JSONDecodeError:
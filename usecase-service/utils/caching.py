@@ -8,11 +8,15 @@ import os
 import random
 import numpy as np
 from datetime import datetime, timedelta
-from langchain_huggingface import HuggingFaceEmbeddings
+from .embedding import get_embedding_worker
 
 # Cache file for storing responses
 DEFAULT_CACHE_FILE = "response_cache.pkl"
 
+# Cache file for storing structured (JSON) responses, kept apart so that a
+# prompt never gets the cached answer of the other output format
+STRUCTURED_CACHE_FILE = "structured_response_cache.pkl"
+
 # Cache file for storing embeddings
 EMBEDDINGS_CACHE_FILE = "embeddings_cache.pkl"
 
@@ -25,23 +29,15 @@ CACHE_EXPIRY_DAYS = 30
 # Similarity threshold for considering queries as semantically equivalent
 SIMILARITY_THRESHOLD = 0.92
 
-# Global embeddings model (lazy loaded)
-_embeddings_model = None
-
 def get_embeddings_model():
     """
-    Get or initialize the embeddings model.
+    Get the embeddings model, shared with retrieval through the
+    process-wide micro-batching embedding worker.
     
     Returns:
-        HuggingFaceEmbeddings: The embeddings model
+        EmbeddingWorker: The embeddings model (see utils.embedding)
     """
-    global _embeddings_model
-    if _embeddings_model is None:
-        _embeddings_model = HuggingFaceEmbeddings(
-            model_name=DEFAULT_EMBEDDING_MODEL,
-            cache_folder="./models/"
-        )
-    return _embeddings_model
+    return get_embedding_worker(DEFAULT_EMBEDDING_MODEL)
 
 def compute_embedding(text):
     """
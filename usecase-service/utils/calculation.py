@@ -2,9 +2,10 @@
 Calculation utilities for the Islamic Finance API.
 """
 
-import re
+from .constants import DEFAULT_SCHEDULE_FREQUENCY, DEFAULT_ISTISNA_FREQUENCY
+from .schedules import calculate_ijarah_schedule, calculate_istisna_schedule
 
-def calculate_ijarah_values(variables):
+def calculate_ijarah_values(variables, frequency=DEFAULT_SCHEDULE_FREQUENCY):
     """
     Calculate Ijarah accounting values based on extracted variables.
 
@@ -17,38 +18,14 @@ def calculate_ijarah_values(variables):
             - lease_term (int)
             - residual_value (float)
             - purchase_option (float)
+        frequency (str): Period of the schedule: "yearly", "quarterly" or "monthly"
 
     Returns:
         dict: Calculated values including prime_cost, rou_asset, total_rentals, 
-              deferred_cost, terminal_value_diff, amortizable_amount, ijarah_liability
+              deferred_cost, terminal_value_diff, amortizable_amount, ijarah_liability,
+              and the per-period schedule and terminal_transfer of utils.schedules
     """
-    # Extract and sanitize inputs
-    purchase_price = float(variables.get('purchase_price', 0))
-    import_tax = float(variables.get('import_tax', 0))
-    freight_charges = float(variables.get('freight_charges', 0))
-    yearly_rental = float(variables.get('yearly_rental', 0))
-    lease_term = int(variables.get('lease_term', 0))
-    residual_value = float(variables.get('residual_value', 0))
-    purchase_option = float(variables.get('purchase_option', 0))
-
-    # Core calculations
-    prime_cost = purchase_price + import_tax + freight_charges
-    rou_asset = prime_cost - purchase_option  # Corrected: subtract purchase option price
-    total_rentals = yearly_rental * lease_term
-    deferred_cost = total_rentals - rou_asset
-    terminal_value_diff = residual_value - purchase_option
-    amortizable_amount = rou_asset - terminal_value_diff
-    ijarah_liability = total_rentals
-
-    return {
-        'prime_cost': prime_cost,
-        'rou_asset': rou_asset,
-        'total_rentals': total_rentals,
-        'deferred_cost': deferred_cost,
-        'terminal_value_diff': terminal_value_diff,
-        'amortizable_amount': amortizable_amount,
-        'ijarah_liability': ijarah_liability
-    }
+    return calculate_ijarah_schedule(variables, frequency)
 
 
 def calculate_murabaha_values(variables):
@@ -98,7 +75,7 @@ def calculate_murabaha_values(variables):
     return results
 
 
-def calculate_istisna_values(variables):
+def calculate_istisna_values(variables, frequency=DEFAULT_ISTISNA_FREQUENCY):
     """
     Calculate Istisna'a accounting values based on extracted variables.
 
@@ -106,153 +83,16 @@ def calculate_istisna_values(variables):
         variables (dict): Contains:
             - contract_value (float)
             - total_cost (float)
-            - delivery_period (int, in months)
+            - delivery_period (int, optional, in months; sets the number of periods)
             - periods (int, optional, default=4 for quarters)
-            - upfront_payment (float, optional)
-            - completion_payment (float, optional)
+            - upfront_payment (float, optional, paid to the manufacturer)
+            - completion_payment (float, optional, paid to the manufacturer)
+            - cost_curve (list, optional, the cost incurred in each period)
+            - billings (list, optional, the amount billed to the customer in each period)
+        frequency (str): Period of the schedule: "yearly", "quarterly" or "monthly"
 
     Returns:
         dict: Contains financial calculations and per-period progress
+              (see utils.schedules.calculate_istisna_schedule)
     """
-    contract_value = float(variables.get('contract_value', 0))
-    total_cost = float(variables.get('total_cost', 0))
-    delivery_period = int(variables.get('delivery_period', 12))
-    periods = int(variables.get('periods', 4))  # default to 4 quarters
-    upfront_payment = float(variables.get('upfront_payment', 0))
-    completion_payment = float(variables.get('completion_payment', 0))
-    
-    # If we don't have explicit values, try to infer from the scenario
-    if total_cost == 0 and "parallel istisna'a" in str(variables).lower():
-        # Try to extract from the description
-        if 'description' in variables:
-            desc = variables['description'].lower()
-            if 'cost' in desc and '$' in desc:
-                cost_match = re.search(r'cost:?\s*\$?([0-9,.]+)', desc)
-                if cost_match:
-                    total_cost = float(cost_match.group(1).replace(',', ''))
-    
-    # Handle the specific test case scenario
-    if contract_value == 2000000 and (total_cost == 0 or total_cost == 1700000):
-        total_cost = 1700000  # From the test case
-        upfront_payment = 850000  # From the test case
-        completion_payment = 850000  # From the test case
-
-    expected_profit = contract_value - total_cost
-    profit_margin = (expected_profit / contract_value) * 100 if contract_value else 0
-
-    results = {
-        'contract_value': contract_value,
-        'total_cost': total_cost,
-        'expected_profit': expected_profit,
-        'profit_margin': profit_margin,
-        'quarterly_progress': []
-    }
-    
-    # For the specific test case with 4 quarters
-    if contract_value == 2000000 and total_cost == 1700000 and periods == 4:
-        # Quarter 1: 25% completion
-        q1_cost = total_cost * 0.25
-        q1_completion = 0.25
-        q1_revenue = contract_value * q1_completion
-        q1_profit = expected_profit * q1_completion
-        
-        # Quarter 2: 50% completion
-        q2_cost = total_cost * 0.25  # Additional 25%
-        q2_completion = 0.50
-        q2_revenue = contract_value * q2_completion
-        q2_profit = expected_profit * q2_completion
-        
-        # Quarter 3: 75% completion
-        q3_cost = total_cost * 0.25  # Additional 25%
-        q3_completion = 0.75
-        q3_revenue = contract_value * q3_completion
-        q3_profit = expected_profit * q3_completion
-        
-        # Quarter 4: 100% completion
-        q4_cost = total_cost * 0.25  # Final 25%
-        q4_completion = 1.0
-        q4_revenue = contract_value * q4_completion
-        q4_profit = expected_profit * q4_completion
-        
-        # Add quarterly progress data
-        results['quarterly_progress'] = [
-            {
-                'period': 'Quarter 1',
-                'cumulative_cost': q1_cost,
-                'percentage_of_completion': q1_completion * 100,
-                'revenue': q1_revenue,
-                'profit': q1_profit,
-                'incremental_revenue': q1_revenue,
-                'incremental_profit': q1_profit,
-                'quarterly_cost': q1_cost
-            },
-            {
-                'period': 'Quarter 2',
-                'cumulative_cost': q1_cost + q2_cost,
-                'percentage_of_completion': q2_completion * 100,
-                'revenue': q2_revenue,
-                'profit': q2_profit,
-                'incremental_revenue': q2_revenue - q1_revenue,
-                'incremental_profit': q2_profit - q1_profit,
-                'quarterly_cost': q2_cost
-            },
-            {
-                'period': 'Quarter 3',
-                'cumulative_cost': q1_cost + q2_cost + q3_cost,
-                'percentage_of_completion': q3_completion * 100,
-                'revenue': q3_revenue,
-                'profit': q3_profit,
-                'incremental_revenue': q3_revenue - q2_revenue,
-                'incremental_profit': q3_profit - q2_profit,
-                'quarterly_cost': q3_cost
-            },
-            {
-                'period': 'Quarter 4',
-                'cumulative_cost': total_cost,
-                'percentage_of_completion': q4_completion * 100,
-                'revenue': q4_revenue,
-                'profit': q4_profit,
-                'incremental_revenue': q4_revenue - q3_revenue,
-                'incremental_profit': q4_profit - q3_profit,
-                'quarterly_cost': q4_cost
-            }
-        ]
-        return results
-
-    # Standard calculation for other cases
-    remaining_cost = total_cost - (upfront_payment + completion_payment)
-    distributed_cost = remaining_cost / (periods - 2) if periods > 2 else 0
-
-    prev_revenue = prev_profit = cumulative_cost = 0
-
-    for i in range(1, periods + 1):
-        period_label = f"Quarter {i}"  # Changed from Period to Quarter
-        
-        if i == 1:
-            current_cost = upfront_payment if upfront_payment > 0 else total_cost / periods
-        elif i == periods:
-            current_cost = completion_payment if completion_payment > 0 else total_cost / periods
-        else:
-            current_cost = distributed_cost if distributed_cost > 0 else total_cost / periods
-
-        cumulative_cost += current_cost
-        pct_completion = cumulative_cost / total_cost if total_cost else 0
-
-        revenue = contract_value * pct_completion
-        profit = expected_profit * pct_completion
-
-        results['quarterly_progress'].append({
-            'period': period_label,
-            'cumulative_cost': cumulative_cost,
-            'percentage_of_completion': pct_completion * 100,
-            'revenue': revenue,
-            'profit': profit,
-            'incremental_revenue': revenue - prev_revenue,
-            'incremental_profit': profit - prev_profit,
-            'quarterly_cost': current_cost
-        })
-
-        prev_revenue = revenue
-        prev_profit = profit
-
-    return results
+    return calculate_istisna_schedule(variables, frequency)
@@ -0,0 +1,285 @@
+"""
+Structure-aware chunking of AAOIFI standards documents.
+
+AAOIFI standards are organised in numbered paragraphs grouped under headings
+(Scope, Definitions, Recognition, ...), followed by appendices and
+illustrative examples. Fixed-size character splitting cuts through paragraph
+numbering, definitions and journal-entry illustrations, so this splitter
+first rebuilds that structure from the extracted page text and then packs
+whole paragraphs into chunks that never cross a section boundary. Every
+chunk is tagged with the standard and section it belongs to.
+"""
+
+import os
+import re
+from collections import Counter
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.schema import Document
+from .constants import (
+    STANDARD_TYPE_MURABAHA, STANDARD_TYPE_SALAM, STANDARD_TYPE_ISTISNA,
+    STANDARD_TYPE_IJARAH, STANDARD_TYPE_SUKUK, STANDARD_TYPE_MUSHARAKA, FAS_STANDARD_TYPES
+)
+
+# Bump when the chunking logic changes so indexes are rebuilt
+CHUNKER_VERSION = 2
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 50  # Only used when a single paragraph is larger than a chunk
+EXAMPLE_CHUNK_SIZE = 2000  # Illustrative examples are kept whole up to this size
+
+SECTION_BODY = "body"
+SECTION_DEFINITIONS = "definitions"
+SECTION_APPENDIX = "appendix"
+SECTION_EXAMPLE = "example"
+
+# Shari'ah standard numbers of the standards the service works with (FAS numbers: constants.FAS_STANDARD_TYPES)
+SS_STANDARD_TYPES = {
+    8: STANDARD_TYPE_MURABAHA,
+    9: STANDARD_TYPE_IJARAH,
+    10: STANDARD_TYPE_SALAM,
+    11: STANDARD_TYPE_ISTISNA,
+    12: STANDARD_TYPE_MUSHARAKA,
+    17: STANDARD_TYPE_SUKUK,
+}
+
+# Fallback when a document does not state its standard number
+STANDARD_NAME_KEYWORDS = (
+    (STANDARD_TYPE_IJARAH, ("ijarah", "ijara")),
+    (STANDARD_TYPE_MURABAHA, ("murabaha",)),
+    (STANDARD_TYPE_ISTISNA, ("istisna",)),
+    (STANDARD_TYPE_SALAM, ("salam",)),
+    (STANDARD_TYPE_SUKUK, ("sukuk",)),
+    (STANDARD_TYPE_MUSHARAKA, ("musharaka", "sharikah")),
+)
+
+STANDARD_PATTERNS = (
+    ("FAS", re.compile(r"\bFAS\s*(?:No\.?\s*)?\(?(\d{1,2})\)?", re.IGNORECASE)),
+    ("FAS", re.compile(r"\bFinancial\s+Accounting\s+Standard\s+(?:No\.?\s*)?\(?(\d{1,2})\)?", re.IGNORECASE)),
+    ("SS", re.compile(r"\bSS\s*(?:No\.?\s*)?\(?(\d{1,2})\)?")),
+    ("SS", re.compile(r"\bShari['’]?ah?\s+Standard\s+(?:No\.?\s*)?\(?(\d{1,2})\)?", re.IGNORECASE)),
+)
+
+# "12. An Islamic bank ...", "3/2/1 The ...", "2.3 (a) ..."
+PARAGRAPH_PATTERN = re.compile(r"^(\d{1,3}(?:[./]\d{1,3}){0,3})[.)]?\s+(?=[A-Za-z(\"'“])")
+PARAGRAPH_NUMBER_LINE = re.compile(r"^(\d{1,3}(?:[./]\d{1,3}){0,3})[.)]?$")
+APPENDIX_PATTERN = re.compile(r"^(?:Appendix|Annex(?:ure)?)\s*[(\[]?([A-Z0-9]{1,3})\b[)\]]?\s*[:.\-–]?\s*(.*)$", re.IGNORECASE)
+EXAMPLE_PATTERN = re.compile(r"^(?:Illustrative\s+examples?|Example|Illustration)\b\s*(\d{1,3}|[A-Z]\b)?\s*[:.\-–]?\s*(.*)$", re.IGNORECASE)
+# "Page 12", "12 of 30"; a bare "12" is only a page number on the first or last line of a page
+PAGE_NUMBER_PATTERN = re.compile(r"^(?:page\s+)?\d{1,4}(?:\s+of\s+\d{1,4})?$", re.IGNORECASE)
+
+KNOWN_HEADINGS = {
+    "preface", "introduction", "objective", "objectives", "objective of the standard", "scope",
+    "definitions", "statement of the standard", "recognition", "initial recognition",
+    "subsequent measurement", "measurement", "derecognition", "presentation", "disclosure",
+    "disclosures", "presentation and disclosure", "effective date", "transitional provisions",
+    "amendments to other standards", "basis for conclusions", "brief history of the preparation of the standard",
+    "adoption of the standard", "shari'ah rules and principles", "general principles",
+}
+HEADING_SMALL_WORDS = {"a", "an", "and", "as", "at", "by", "for", "from", "in", "of", "on", "or", "the", "to", "with"}
+
+def detect_document_standard(documents):
+    """
+    Work out which standard a document covers from its filename and first pages.
+
+    Args:
+        documents (list): The pages of one document
+
+    Returns:
+        tuple: (standard label such as "FAS 32" or None, standard type or None)
+    """
+    filename = os.path.basename(documents[0].metadata.get("source", "")) if documents else ""
+    head_text = "\n".join(doc.page_content for doc in documents[:3])
+
+    for text in (filename.replace("_", " "), head_text):
+        counts = Counter()
+        for prefix, pattern in STANDARD_PATTERNS:
+            for match in pattern.finditer(text):
+                counts[(prefix, int(match.group(1)))] += 1
+        if counts:
+            (prefix, number), _count = counts.most_common(1)[0]
+            known = FAS_STANDARD_TYPES if prefix == "FAS" else SS_STANDARD_TYPES
+            return f"{prefix} {number}", known.get(number) or _standard_type_from_text(filename, head_text)
+
+    return None, _standard_type_from_text(filename, head_text)
+
+def _standard_type_from_text(filename, head_text):
+    for text in (filename.lower(), head_text.lower()):
+        for standard_type, keywords in STANDARD_NAME_KEYWORDS:
+            if any(keyword in text for keyword in keywords):
+                return standard_type
+    return None
+
+def _repeated_lines(documents):
+    """Return lines repeated on most pages (running headers and footers)."""
+    if len(documents) < 3:
+        return set()
+    counts = Counter()
+    for doc in documents:
+        counts.update({line.strip() for line in doc.page_content.splitlines() if line.strip()})
+    threshold = max(3, len(documents) // 2)
+    return {line for line, count in counts.items() if count >= threshold}
+
+def _heading(line):
+    """
+    Classify a line as a section heading.
+
+    Returns:
+        tuple or None: (section title, section type)
+    """
+    match = APPENDIX_PATTERN.match(line)
+    if match:
+        title = f"Appendix {match.group(1).upper()}"
+        return (f"{title}: {match.group(2)}" if match.group(2) else title), SECTION_APPENDIX
+    match = EXAMPLE_PATTERN.match(line)
+    if match and len(line) <= 120:
+        title = "Example" + (f" {match.group(1)}" if match.group(1) else "")
+        return (f"{title}: {match.group(2)}" if match.group(2) else title), SECTION_EXAMPLE
+
+    text = re.sub(r"^\d{1,3}[.)]?\s+", "", line).rstrip(":").strip()
+    normalized = text.lower().replace("’", "'")
+    if normalized in KNOWN_HEADINGS:
+        return text, SECTION_DEFINITIONS if normalized == "definitions" else SECTION_BODY
+
+    # Short title-case lines without sentence punctuation
+    words = text.split()
+    if not 1 <= len(words) <= 8 or len(text) > 60 or text[-1] in ".,;" or not text[0].isupper():
+        return None
+    if sum(ch.isdigit() for ch in text) > 2:
+        return None
+    significant = [word for word in words if word.lower() not in HEADING_SMALL_WORDS]
+    if significant and all(word[0].isupper() for word in significant):
+        return text, SECTION_BODY
+    return None
+
+def _iter_units(documents, repeated_lines):
+    """
+    Rebuild the paragraph structure of a document.
+
+    Yields:
+        dict: "section", "section_type", "paragraph", "page" and "lines" per paragraph
+    """
+    unit = None
+    section, section_type = "Preamble", SECTION_BODY
+    pending_number = None
+
+    for doc in documents:
+        page = doc.metadata.get("page")
+        lines = [line.strip() for line in doc.page_content.splitlines()]
+        lines = [line for line in lines if line and line not in repeated_lines]
+        for index, line in enumerate(lines):
+            # Elsewhere a bare number is a paragraph number on a line of its own
+            if PAGE_NUMBER_PATTERN.match(line) and (not line.isdigit() or index in (0, len(lines) - 1)):
+                continue
+
+            # Paragraph numbers extracted on a line of their own
+            if section_type != SECTION_EXAMPLE and PARAGRAPH_NUMBER_LINE.match(line):
+                pending_number = line
+                continue
+            if pending_number:
+                line = f"{pending_number} {line}"
+                pending_number = None
+
+            # Inside examples only explicit markers end the section, so tables stay together
+            heading = None
+            if section_type != SECTION_EXAMPLE or APPENDIX_PATTERN.match(line) or EXAMPLE_PATTERN.match(line):
+                heading = _heading(line)
+            if heading:
+                if unit:
+                    yield unit
+                section, section_type = heading
+                unit = None
+                continue
+
+            match = PARAGRAPH_PATTERN.match(line)
+            if match or unit is None:
+                if unit:
+                    yield unit
+                unit = {
+                    "section": section,
+                    "section_type": section_type,
+                    "paragraph": match.group(1) if match else None,
+                    "page": page,
+                    "lines": []
+                }
+            unit["lines"].append(line)
+    if unit:
+        yield unit
+
+def _paragraph_range(units):
+    numbers = [unit["paragraph"] for unit in units if unit["paragraph"]]
+    if not numbers:
+        return None
+    return numbers[0] if len(numbers) == 1 else f"{numbers[0]}-{numbers[-1]}"
+
+def chunk_body(text):
+    """Return the text of a chunk without its standard/section header line."""
+    return text.split("\n", 1)[-1]
+
+def split_standard_document(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                            example_chunk_size=EXAMPLE_CHUNK_SIZE):
+    """
+    Split the pages of one standards document into structure-aware chunks.
+
+    Whole paragraphs are packed together up to ``chunk_size`` characters without
+    crossing a section; illustrative examples are kept whole up to
+    ``example_chunk_size``. Only paragraphs larger than a chunk are split further.
+
+    Args:
+        documents (list): The pages of one document, in order
+        chunk_size (int): Maximum chunk size for body text
+        chunk_overlap (int): Overlap used when a single paragraph must be split
+        example_chunk_size (int): Maximum chunk size inside illustrative examples
+
+    Returns:
+        list: Document chunks tagged with standard, standard_type, section,
+            section_type and paragraphs metadata
+    """
+    if not documents:
+        return []
+    standard, standard_type = detect_document_standard(documents)
+    base_metadata = {k: v for k, v in documents[0].metadata.items() if k not in ("page", "start_index")}
+    if standard:
+        base_metadata["standard"] = standard
+    if standard_type:
+        base_metadata["standard_type"] = standard_type
+
+    chunks = []
+    group = []
+    group_size = 0
+
+    def emit(units, text):
+        header = f"{standard} - {units[0]['section']}" if standard else units[0]["section"]
+        metadata = {
+            **base_metadata,
+            "section": units[0]["section"],
+            "section_type": units[0]["section_type"],
+            "chunk_index": len(chunks)
+        }
+        if units[0]["page"] is not None:
+            metadata["page"] = units[0]["page"]
+        paragraphs = _paragraph_range(units)
+        if paragraphs:
+            metadata["paragraphs"] = paragraphs
+        chunks.append(Document(page_content=f"{header}\n{text}", metadata=metadata))
+
+    def flush():
+        nonlocal group, group_size
+        if group:
+            emit(group, "\n".join("\n".join(unit["lines"]) for unit in group))
+        group, group_size = [], 0
+
+    for unit in _iter_units(documents, _repeated_lines(documents)):
+        limit = example_chunk_size if unit["section_type"] == SECTION_EXAMPLE else chunk_size
+        text = "\n".join(unit["lines"])
+        if group and (group[0]["section"] != unit["section"] or group_size + len(text) + 1 > limit):
+            flush()
+        if len(text) > limit:
+            # Oversized paragraph: fall back to character splitting inside it
+            splitter = RecursiveCharacterTextSplitter(chunk_size=limit, chunk_overlap=chunk_overlap)
+            for part in splitter.split_text(text):
+                emit([unit], part)
+            continue
+        group.append(unit)
+        group_size += len(text) + 1
+    flush()
+    return chunks
@@ -2,6 +2,8 @@
 Constants used throughout the Islamic Finance API.
 """
 
+import os
+
 # API and model configuration
 API_METHOD = "gemini"  # Options: "gemini" or "together"
 CHROMA_PATH = "chroma"
@@ -10,6 +12,60 @@ TOGETHER_MODEL = "deepseek-ai/DeepSeek-R1-Distill-Llama-70B-free"
 GEMINI_MODEL = "gemini-2.0-flash"
 DEFAULT_LLM_MODEL = "deepseek-ai/DeepSeek-R1-Distill-Llama-70B-free" if API_METHOD == "together" else GEMINI_MODEL
 
+# Retrieval-only search configuration
+SEARCH_DEFAULT_PAGE_SIZE = 5
+SEARCH_MAX_PAGE_SIZE = 50
+SEARCH_MAX_PAGE = 20
+SEARCH_CACHE_SIZE = 512  # Maximum number of cached search result pages
+SEARCH_CACHE_TTL_SECONDS = 600
+
+# Input limits: longer queries are rejected, and LLM responses are only
+# parsed up to MAX_RESPONSE_CHARS characters (the full text is still returned)
+MAX_QUERY_CHARS = int(os.getenv("MAX_QUERY_CHARS", "20000"))
+MAX_RESPONSE_CHARS = int(os.getenv("MAX_RESPONSE_CHARS", "100000"))
+
+# Usecase answer formats: "text" asks the LLM for the layout of the standard's
+# prompt and parses it, "json" asks for the JSON schema of utils.schema and
+# returns it validated. LLM_JSON_MODE also enables the provider's JSON mode
+# for "json" answers (disable it for models that do not support it)
+OUTPUT_FORMAT_TEXT = "text"
+OUTPUT_FORMAT_JSON = "json"
+DEFAULT_OUTPUT_FORMAT = os.getenv("USECASE_OUTPUT_FORMAT", OUTPUT_FORMAT_TEXT)
+LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "1") == "1"
+
+# Hybrid extraction for the Ijarah, Murabaha and Istisna'a calculators: when the
+# label maps find some of a scenario's numbers but not all the calculator
+# needs, a short JSON call asks the LLM for the missing ones only.
+# VARIABLE_EXTRACTION_MODEL defaults to the query's LLM model
+LLM_VARIABLE_EXTRACTION = os.getenv("LLM_VARIABLE_EXTRACTION", "1") == "1"
+VARIABLE_EXTRACTION_MODEL = os.getenv("VARIABLE_EXTRACTION_MODEL")
+VARIABLE_EXTRACTION_CACHE_SIZE = 256  # Exact-text cache of the values extracted by the LLM
+
+# Periods per year of the calculated schedules (see utils.schedules)
+SCHEDULE_FREQUENCIES = {"yearly": 1, "quarterly": 4, "monthly": 12}
+DEFAULT_SCHEDULE_FREQUENCY = "yearly"
+# Istisna'a percentage of completion is recognized quarterly unless another frequency is requested
+DEFAULT_ISTISNA_FREQUENCY = "quarterly"
+
+# Embedding backend: "torch" (sentence-transformers), or ONNX Runtime with a
+# model exported by export_onnx_model.py: "onnx", or "onnx-int8" for the
+# dynamically quantized export
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_MODELS_PATH = os.path.join("models", "onnx")
+
+# Shared embedding worker: concurrent requests arriving within EMBED_MAX_WAIT_MS
+# of each other are encoded together, up to EMBED_MAX_BATCH_SIZE texts
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+
+# Vector store backend: "chroma", or an in-memory index over the Chroma data:
+# "hnsw" (requires hnswlib), "ivf" (requires faiss-cpu) or "exact"
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+
 # Standard types
 STANDARD_TYPE_MURABAHA = "MURABAHA"
 STANDARD_TYPE_SALAM = "SALAM"
@@ -18,6 +74,18 @@ STANDARD_TYPE_IJARAH = "IJARAH"
 STANDARD_TYPE_SUKUK = "SUKUK"
 STANDARD_TYPE_MUSHARAKA = "MUSHARAKA"
 
+# AAOIFI FAS number of every standard type, one type per number; chunk tagging,
+# the keyword prior of the standard router and the search prefixes all read it
+FAS_STANDARD_TYPES = {
+    4: STANDARD_TYPE_MUSHARAKA,
+    7: STANDARD_TYPE_SALAM,
+    10: STANDARD_TYPE_ISTISNA,
+    28: STANDARD_TYPE_MURABAHA,
+    32: STANDARD_TYPE_IJARAH,
+    33: STANDARD_TYPE_SUKUK,
+}
+STANDARD_FAS_NUMBERS = {standard_type: number for number, standard_type in FAS_STANDARD_TYPES.items()}
+
 # Standards information
 STANDARDS_INFO = """
 FAS 4: Musharaka Financing
@@ -370,17 +438,29 @@ EXPLANATION
 [Provide concise explanation of the accounting treatment and its compliance with Islamic finance principles]
 """
 
-def get_prompt_for_standard(standard_type, include_examples=True):
+def get_prompt_for_standard(standard_type, include_examples=True, output_format=OUTPUT_FORMAT_TEXT):
     """
     Get the appropriate prompt template for the detected standard.
     
     Args:
         standard_type (str): The standard type to get prompt for
         include_examples (bool): Whether to include validated examples in the prompt
+        output_format (str): OUTPUT_FORMAT_TEXT for the standard's text layout, or
+            OUTPUT_FORMAT_JSON for the JSON schema of utils.schema, in which case the
+            layout only outlines the content and the (text) examples are left out
         
     Returns:
         str: The prompt template for the standard
     """
+    if output_format == OUTPUT_FORMAT_JSON:
+        # Import here to avoid circular import
+        from utils.schema import STRUCTURED_OUTPUT_INSTRUCTIONS
+        prompt_template = get_prompt_for_standard(standard_type, include_examples=False)
+        prompt_template = prompt_template.replace(
+            "FORMAT YOUR RESPONSE EXACTLY AS FOLLOWS:", "COVER THE FOLLOWING OUTLINE IN THE FIELDS OF YOUR JSON ANSWER:"
+        )
+        return prompt_template + STRUCTURED_OUTPUT_INSTRUCTIONS
+
     prompt_template = ""
     
     if standard_type == STANDARD_TYPE_MURABAHA:
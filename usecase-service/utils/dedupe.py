@@ -0,0 +1,231 @@
+"""
+Near-duplicate chunk detection for building the vector database.
+
+The standards corpus repeats a lot of text: superseded standards next to
+the standards replacing them (FAS 2 / FAS 28, FAS 8 / FAS 32), several
+editions of the same document and shared boilerplate. Every chunk gets a
+MinHash signature over its word shingles; an LSH index over the signatures
+finds candidate matches in constant time, and chunks whose estimated
+Jaccard similarity with an indexed chunk reaches ``DUPLICATE_THRESHOLD``
+are recorded as duplicates of that canonical chunk instead of being stored.
+Chunks are only compared within the same standard type (and between a
+superseded standard and its replacement), so boilerplate shared across
+standards does not drop a chunk from standard_type-filtered retrieval.
+The LSH index is saved next to the manifest so incremental builds dedupe
+against the chunks that are already indexed.
+"""
+
+import os
+import re
+import json
+import base64
+import hashlib
+from collections import Counter
+import numpy as np
+
+DEDUPE_INDEX_FILE = "dedupe_index.json"
+DEDUPE_REPORT_FILE = "dedupe_report.json"
+
+# Bump when signatures or matching change so indexes are rebuilt
+DEDUPE_VERSION = 2
+
+NUM_PERM = 64
+LSH_BANDS = 8  # 8 bands of 8 rows: pairs above ~0.77 similarity become candidates
+DUPLICATE_THRESHOLD = 0.8
+SHINGLE_SIZE = 3  # Words per shingle
+
+# Superseded standard -> standard replacing it; copies from the newer standard are kept
+SUPERSEDED_STANDARDS = {
+    "FAS 2": "FAS 28",
+    "FAS 8": "FAS 32",
+}
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(42)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_ROWS_PER_BAND = NUM_PERM // LSH_BANDS
+
+def _shingle_hashes(text):
+    """Return the 32-bit hashes of the word shingles of a text."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+
+def minhash_signature(text):
+    """
+    Compute the MinHash signature of a text.
+
+    Args:
+        text (str): The chunk text
+
+    Returns:
+        numpy.ndarray: NUM_PERM uint64 values
+    """
+    hashes = _shingle_hashes(text)
+    # (a * x + b) mod p for every permutation and shingle, then the minimum per permutation
+    permuted = (np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1)
+
+def signature_similarity(signature, other):
+    """Estimate the Jaccard similarity of two texts from their signatures."""
+    return float(np.mean(signature == other))
+
+def comparable(entry, standard, standard_type):
+    """Return True if a chunk of ``standard``/``standard_type`` may be a duplicate of an indexed entry."""
+    if entry["standard_type"] == standard_type:
+        return True
+    pair = {standard, entry["standard"]}
+    return any(pair == {old, new} for old, new in SUPERSEDED_STANDARDS.items())
+
+def outranks(standard, canonical_standard):
+    """Return True if a chunk from ``standard`` should replace a copy from ``canonical_standard``."""
+    return standard not in SUPERSEDED_STANDARDS and canonical_standard in SUPERSEDED_STANDARDS
+
+class DedupeIndex:
+    """LSH index over the MinHash signatures of the canonical chunks of an index version."""
+
+    def __init__(self):
+        self.entries = {}  # chunk id -> {"signature", "source", "standard", "standard_type"}
+        self.buckets = {}  # (band, band bytes) -> set of chunk ids
+
+    def _band_keys(self, signature):
+        for band in range(LSH_BANDS):
+            yield band, signature[band * _ROWS_PER_BAND:(band + 1) * _ROWS_PER_BAND].tobytes()
+
+    def add(self, chunk_id, signature, source, standard=None, standard_type=None):
+        self.remove(chunk_id)
+        self.entries[chunk_id] = {"signature": signature, "source": source, "standard": standard,
+                                  "standard_type": standard_type}
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, set()).add(chunk_id)
+
+    def remove(self, chunk_id):
+        entry = self.entries.pop(chunk_id, None)
+        if entry is None:
+            return
+        for key in self._band_keys(entry["signature"]):
+            bucket = self.buckets.get(key)
+            if bucket:
+                bucket.discard(chunk_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def retain(self, chunk_ids):
+        """Drop every entry whose chunk id is not in ``chunk_ids``."""
+        for chunk_id in [cid for cid in self.entries if cid not in chunk_ids]:
+            self.remove(chunk_id)
+
+    def find(self, signature, exclude=None, standard=None, standard_type=None):
+        """
+        Find the most similar comparable indexed chunk above the duplicate threshold.
+
+        Args:
+            signature (numpy.ndarray): MinHash signature of the new chunk
+            exclude (str): Chunk id to ignore (the chunk itself)
+            standard (str): Standard of the new chunk, e.g. "FAS 28"
+            standard_type (str): Standard type of the new chunk; only chunks of the
+                same type, or of the standard it supersedes or is superseded by, match
+
+        Returns:
+            tuple: (canonical chunk id or None, estimated similarity)
+        """
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        candidates.discard(exclude)
+        best_id, best_similarity = None, 0.0
+        for candidate in candidates:
+            if not comparable(self.entries[candidate], standard, standard_type):
+                continue
+            similarity = signature_similarity(signature, self.entries[candidate]["signature"])
+            if similarity > best_similarity:
+                best_id, best_similarity = candidate, similarity
+        if best_similarity >= DUPLICATE_THRESHOLD:
+            return best_id, best_similarity
+        return None, best_similarity
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def load(cls, index_path):
+        """Load the dedupe index stored alongside an index, or an empty one."""
+        index = cls()
+        try:
+            with open(os.path.join(index_path, DEDUPE_INDEX_FILE), "r") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return index
+        if data.get("num_perm") != NUM_PERM:
+            return index
+        for chunk_id, entry in data.get("chunks", {}).items():
+            signature = np.frombuffer(base64.b64decode(entry["signature"]), dtype=np.uint64)
+            index.add(chunk_id, signature, entry["source"], entry.get("standard"), entry.get("standard_type"))
+        return index
+
+    def save(self, index_path):
+        """Atomically write the dedupe index alongside an index."""
+        data = {
+            "num_perm": NUM_PERM,
+            "chunks": {
+                chunk_id: {
+                    "signature": base64.b64encode(entry["signature"].tobytes()).decode("ascii"),
+                    "source": entry["source"],
+                    "standard": entry["standard"],
+                    "standard_type": entry["standard_type"]
+                }
+                for chunk_id, entry in self.entries.items()
+            }
+        }
+        path = os.path.join(index_path, DEDUPE_INDEX_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(f"{path}.tmp", path)
+
+class DedupeReport:
+    """Collects duplicate counts per file and between sources during a build."""
+
+    def __init__(self):
+        self.files = {}
+        self.pairs = Counter()
+        self.replaced = 0
+
+    def add_file(self, path, chunks, duplicates):
+        self.files[path] = {"chunks": chunks, "duplicates": duplicates}
+
+    def add_duplicate(self, source, canonical_source):
+        self.pairs[(source, canonical_source)] += 1
+
+    def to_dict(self):
+        chunks = sum(stats["chunks"] for stats in self.files.values())
+        duplicates = sum(stats["duplicates"] for stats in self.files.values())
+        return {
+            "chunks": chunks,
+            "duplicates": duplicates,
+            "duplicate_rate": round(duplicates / chunks, 4) if chunks else 0.0,
+            "replaced_canonical": self.replaced,
+            "files": self.files,
+            "top_pairs": [
+                {"source": source, "canonical_source": canonical_source, "duplicates": count}
+                for (source, canonical_source), count in self.pairs.most_common(20)
+            ]
+        }
+
+    def save(self, index_path):
+        with open(os.path.join(index_path, DEDUPE_REPORT_FILE), "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def print_summary(self):
+        report = self.to_dict()
+        print(f"Dedupe: {report['duplicates']} of {report['chunks']} chunks are near-duplicates "
+              f"({report['duplicate_rate']:.1%}), {report['replaced_canonical']} superseded copies replaced")
+        for pair in report["top_pairs"][:5]:
+            print(f"  {pair['duplicates']:>5}  {os.path.basename(pair['source'])} -> "
+                  f"{os.path.basename(pair['canonical_source'])}")
@@ -0,0 +1,310 @@
+"""
+Batch embedding utilities for building the vector database.
+
+Chunks are embedded in fixed-size batches by a pool of worker processes,
+each holding its own copy of the model with a share of the CPU threads.
+Only a bounded number of batches is in flight at any time, so results can
+be streamed into the vector store while memory stays flat.
+
+Every embedding model of the service is created by load_embedding_model,
+which picks the PyTorch or ONNX Runtime backend (see EMBEDDING_BACKEND).
+In the service, one model per name is shared through an EmbeddingWorker:
+a thread that collects the texts of concurrent callers for a few
+milliseconds, encodes them as one batch and resolves each caller's future.
+"""
+
+import os
+import sys
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from .constants import EMBEDDING_BACKEND, EMBED_MAX_BATCH_SIZE, EMBED_MAX_WAIT_MS
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+DEFAULT_EMBED_BATCH_SIZE = 64
+
+# Batches submitted per worker before waiting for results
+MAX_IN_FLIGHT_PER_WORKER = 2
+
+# Model loaded once per worker process
+_worker_model = None
+
+# Shared embedding workers keyed by model name
+_embedding_workers = {}
+_embedding_workers_lock = threading.Lock()
+
+def default_embed_workers():
+    """Return a sensible number of embedding processes for this machine."""
+    return min(4, max(1, (os.cpu_count() or 1) // 2))
+
+def load_embedding_model(model_name, batch_size=DEFAULT_EMBED_BATCH_SIZE, backend=None, threads=None):
+    """
+    Create an embedding model that encodes in batches of ``batch_size``.
+
+    Args:
+        model_name (str): HuggingFace model name
+        batch_size (int): Encoder batch size
+        backend (str): One of EMBEDDING_BACKENDS (default: EMBEDDING_BACKEND)
+        threads (int): Optional intra-op thread limit
+
+    Returns:
+        HuggingFaceEmbeddings or OnnxEmbeddings: The embedding model
+
+    Raises:
+        ValueError: If the backend is unknown
+        FileNotFoundError: If an ONNX backend is requested but the model was not exported
+    """
+    backend = backend or EMBEDDING_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    if backend != "torch":
+        from .onnx_embedding import OnnxEmbeddings, onnx_model_dir
+        return OnnxEmbeddings(onnx_model_dir(model_name, quantized=backend == "onnx-int8"),
+                              batch_size=batch_size, threads=threads)
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        cache_folder="./models/",
+        encode_kwargs={"batch_size": batch_size}
+    )
+
+class EmbeddingWorker:
+    """
+    Encodes the texts of concurrent callers together on one thread.
+
+    Requests are queued; the thread takes the first waiting request, keeps
+    collecting requests for up to ``max_wait_ms`` or until ``max_batch_size``
+    texts are gathered, encodes them in one call and splits the vectors
+    between the callers' futures. The model is only ever used by that
+    thread. Exposes embed_documents / embed_query like the models it wraps.
+    """
+
+    def __init__(self, model, max_batch_size=EMBED_MAX_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self._queue = queue.Queue()
+        self._carry = None  # Request deferred from a full batch, encoded first next time
+        self._thread = threading.Thread(target=self._run, name="embedding-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        """
+        Queue texts for embedding.
+
+        Args:
+            texts (list): The texts
+
+        Returns:
+            Future: Resolves to one embedding vector per text
+        """
+        future = Future()
+        if not texts:
+            future.set_result([])
+        else:
+            self._queue.put((list(texts), future))
+        return future
+
+    def embed_documents(self, texts):
+        return self.submit(texts).result()
+
+    def embed_query(self, text):
+        return self.submit([text]).result()[0]
+
+    def stats(self):
+        """Return request, batch and text counts and the mean texts per batch."""
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0
+        }
+
+    def _collect(self):
+        """Block for a request, then gather the requests arriving within the wait window."""
+        batch = [self._carry or self._queue.get()]
+        self._carry = None
+        size = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                texts, future = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if size + len(texts) > self.max_batch_size:
+                self._carry = (texts, future)
+                break
+            batch.append((texts, future))
+            size += len(texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            batch = [(texts, future) for texts, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            texts = [text for request_texts, _future in batch for text in request_texts]
+            try:
+                vectors = self.model.embed_documents(texts)
+            except Exception as e:
+                for _texts, future in batch:
+                    future.set_exception(e)
+                continue
+            self.requests += len(batch)
+            self.batches += 1
+            self.texts += len(texts)
+            start = 0
+            for request_texts, future in batch:
+                future.set_result(vectors[start:start + len(request_texts)])
+                start += len(request_texts)
+
+def get_embedding_worker(model_name, batch_size=DEFAULT_EMBED_BATCH_SIZE):
+    """
+    Get the process-wide embedding worker of a model, loading the model on first use.
+
+    Args:
+        model_name (str): HuggingFace model name
+        batch_size (int): Encoder batch size used when the model is loaded
+
+    Returns:
+        EmbeddingWorker: The shared worker
+    """
+    with _embedding_workers_lock:
+        if model_name not in _embedding_workers:
+            _embedding_workers[model_name] = EmbeddingWorker(load_embedding_model(model_name, batch_size))
+        return _embedding_workers[model_name]
+
+def _init_worker(model_name, batch_size, threads):
+    """Load the model in a worker process, limiting its intra-op threads."""
+    global _worker_model
+    _worker_model = load_embedding_model(model_name, batch_size, threads=threads)
+
+def _embed_batch(texts):
+    """Embed one batch of texts in a worker process."""
+    return _worker_model.embed_documents(texts)
+
+def iter_batches(items, batch_size):
+    """Group an iterable into lists of at most ``batch_size`` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class ThroughputReporter:
+    """Prints embedded chunk counts, chunks/s and ETA as batches complete."""
+
+    def __init__(self, total=None, label="Embedded", interval=2.0):
+        self.total = total
+        # Set when the total is extrapolated from the files parsed so far (see estimate_total)
+        self.estimated = False
+        self.label = label
+        self.interval = interval
+        self.done = 0
+        self.start = time.perf_counter()
+        self.last_report = 0.0
+
+    def update(self, count):
+        self.done += count
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval or (self.total and not self.estimated and self.done >= self.total):
+            self.last_report = now
+            print(self.status(now))
+            sys.stdout.flush()
+
+    def estimate_total(self, queued, files_done, files_total):
+        """
+        Extrapolate the total when chunks are streamed before every file is parsed.
+
+        Args:
+            queued (int): Chunks queued for embedding from the files parsed so far
+            files_done (int): Files parsed so far
+            files_total (int): Files to parse
+        """
+        if files_done:
+            self.total = queued + round(queued / files_done * max(0, files_total - files_done))
+            self.estimated = files_done < files_total
+
+    def rate(self, now=None):
+        elapsed = (now or time.perf_counter()) - self.start
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def status(self, now=None):
+        rate = self.rate(now)
+        if self.total:
+            remaining = max(0, self.total - self.done)
+            eta = f"{remaining / rate:.0f}s" if rate > 0 else "unknown"
+            total = f"~{self.total}" if self.estimated else self.total
+            return f"{self.label} {self.done}/{total} chunks ({rate:.1f} chunks/s, ETA {eta})"
+        return f"{self.label} {self.done} chunks ({rate:.1f} chunks/s)"
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        return f"{self.label} {self.done} chunks in {elapsed:.1f}s ({self.rate():.1f} chunks/s)"
+
+def embed_batches(batches, model_name, workers=1, batch_size=DEFAULT_EMBED_BATCH_SIZE, model=None):
+    """
+    Embed batches of items across worker processes, yielding results in order.
+
+    Args:
+        batches (iterable): Lists of (text, payload) tuples; payloads are passed through
+        model_name (str): HuggingFace model name
+        workers (int): Number of worker processes; 1 embeds in this process
+        batch_size (int): Encoder batch size inside each worker
+        model: Optional already loaded model or EmbeddingWorker, reused when
+            embedding in this process
+
+    Yields:
+        tuple: (list of payloads, list of embedding vectors) per batch
+    """
+    if workers <= 1:
+        model = model or get_embedding_worker(model_name, batch_size)
+        if not isinstance(model, EmbeddingWorker):
+            for batch in batches:
+                yield [payload for _text, payload in batch], model.embed_documents([text for text, _payload in batch])
+            return
+        # The worker thread encodes the next batches while the caller writes this one
+        pending = deque()
+        for batch in batches:
+            pending.append(([payload for _text, payload in batch], model.submit([text for text, _payload in batch])))
+            if len(pending) >= MAX_IN_FLIGHT_PER_WORKER:
+                payloads, future = pending.popleft()
+                yield payloads, future.result()
+        while pending:
+            payloads, future = pending.popleft()
+            yield payloads, future.result()
+        return
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    max_in_flight = workers * MAX_IN_FLIGHT_PER_WORKER
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_name, batch_size, threads)) as executor:
+        for batch in batches:
+            pending.append((
+                [payload for _text, payload in batch],
+                executor.submit(_embed_batch, [text for text, _payload in batch])
+            ))
+            # Backpressure: wait for the oldest batch before submitting more
+            if len(pending) >= max_in_flight:
+                payloads, future = pending.popleft()
+                yield payloads, future.result()
+        while pending:
+            payloads, future = pending.popleft()
+            yield payloads, future.result()
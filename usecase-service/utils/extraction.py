@@ -3,14 +3,14 @@ Extraction utilities for the Islamic Finance API.
 """
 
 import re
-from .constants import (
-    STANDARD_TYPE_MURABAHA, STANDARD_TYPE_SALAM, STANDARD_TYPE_ISTISNA,
-    STANDARD_TYPE_IJARAH, STANDARD_TYPE_SUKUK, STANDARD_TYPE_MUSHARAKA
-)
+from .standard_router import keyword_hits, keyword_label
+from .numeric_tokens import compile_label_scanner, extract_fields
 
 def detect_standard_type(query_text):
     """
-    Detect which AAOIFI standard applies to the scenario.
+    Detect which AAOIFI standard applies to the scenario from its keywords.
+    The standard with the most distinct keyword matches wins; see
+    utils.standard_router for the embedding-based router.
     
     Args:
         query_text (str): The query text to analyze
@@ -18,49 +18,118 @@ def detect_standard_type(query_text):
     Returns:
         str: The detected standard type or None if no match
     """
-    query_lower = query_text.lower()
-    musharaka_keywords = [
-        'musharaka', 'musharakah', 'sharikah', 'partnership', 'joint venture',
-        'profit sharing', 'capital contribution', 'diminishing musharaka', 'aaoifi fas 4'
-    ]
-    if any(keyword in query_lower for keyword in musharaka_keywords):
-        return STANDARD_TYPE_MUSHARAKA
-    murabaha_keywords = [
-        'murabaha', 'murabahah', 'cost plus sale', 'cost-plus financing', 
-        'deferred payment sale', 'aaoifi fas 4'
-    ]
-    if any(keyword in query_lower for keyword in murabaha_keywords):
-        return STANDARD_TYPE_MURABAHA
-    salam_keywords = [
-        'salam', 'salaam', 'advance payment', 'future delivery', 
-        'parallel salam', 'aaoifi fas 7'
-    ]
-    if any(keyword in query_lower for keyword in salam_keywords):
-        return STANDARD_TYPE_SALAM
-    istisna_keywords = [
-        'istisna', "istisna'a", 'istisna`a', 'manufacturing contract', 
-        'construction contract', 'parallel istisna', 'aaoifi fas 10'
-    ]
-    if any(keyword in query_lower for keyword in istisna_keywords):
-        return STANDARD_TYPE_ISTISNA
-    ijarah_keywords = [
-        'ijarah', 'ijara', 'lease', 'leasing', 
-        'muntahia bittamleek', 'ijara wa iqtina', 
-        'right of use', 'rou', 'aaoifi fas 28'
-    ]
-    if any(keyword in query_lower for keyword in ijarah_keywords):
-        return STANDARD_TYPE_IJARAH
-    sukuk_keywords = [
-        'sukuk', 'investment certificates', 'islamic bonds', 
-        'asset-backed securities', 'aaoifi fas 32'
-    ]
-    if any(keyword in query_lower for keyword in sukuk_keywords):
-        return STANDARD_TYPE_SUKUK
-    return None
+    return keyword_label(keyword_hits(query_text))
+
+# Per-standard label maps of the single-pass numeric extractor (see utils.numeric_tokens).
+# Each field lists specs tried in order; labels match anywhere in a word, like the
+# patterns they replace, and a value must follow its label on the same line.
+_YEARS = re.compile(r"\s(?:year|yr)")
+_MONTHS_OR_YEARS = re.compile(r"\s*(?:month|year)")
+_DURATION = re.compile(r"\s*(?:year|yr|month)")
+_PERCENT = re.compile(r"\s*(?:%|percent)")
+
+IJARAH_FIELDS = {
+    'purchase_price': [{"labels": ['purchased', 'purchase price', 'cost', 'bought'], "amount": True}],
+    'import_tax': [{"labels": ['import tax', 'tax', 'duty'], "amount": True}],
+    'freight_charges': [{"labels": ['freight', 'shipping', 'transportation', 'delivery'], "amount": True}],
+    'yearly_rental': [{"labels": ['yearly rental', 'annual rent', 'rent per year', 'annual rental', 'per year'],
+                       "amount": True}],
+    'lease_term': [{"labels": ['lease term', 'term of', 'period of', 'duration'], "unit": _YEARS}],
+    'residual_value': [{"labels": ['residual value', (('expected',), ('value',)), 'value at end'], "amount": True}],
+    'purchase_option': [{"labels": ['purchase option', 'option to purchase', 'purchase price at end'],
+                         "amount": True}],
+}
+
+MURABAHA_FIELDS = {
+    'cost_price': [{"labels": ['cost price', 'purchase price', 'acquired for', 'bought for'], "amount": True}],
+    'selling_price': [{"labels": ['selling price', 'sold for', 'sale price', 'sells at'], "amount": True}],
+    'profit_rate': [{"labels": ['profit rate', 'markup', 'mark-up', 'margin'], "unit": _PERCENT}],
+    'installments': [{"labels": ['installment', 'instalment', 'payment'], "integer": True,
+                      "unit": re.compile(r"\s*(?:payment|installment|monthly|quarterly|annual)")}],
+    'down_payment': [{"labels": ['down payment', 'advance', 'initial payment'], "amount": True}],
+}
+
+ISTISNA_FIELDS = {
+    # Explicit "Price: $X" / "Cost: $X" / "$X upfront" / "$X on completion" take precedence
+    'contract_value': [
+        {"before": re.compile(r"price:? \$?$")},
+        {"labels": ['price', 'contract value', 'agreed price', 'contract amount'], "amount": True},
+    ],
+    'total_cost': [
+        {"before": re.compile(r"cost:? \$?$")},
+        {"labels": ['cost', 'total cost', 'estimated cost', (('contractor',), ('cost',))], "amount": True},
+    ],
+    'upfront_payment': [
+        {"unit": re.compile(r"\s*upfront")},
+        {"labels": ['upfront', 'advance', 'initial'], "amount": True},
+    ],
+    'completion_payment': [
+        {"unit": re.compile(r"\s*on completion")},
+        {"labels": ['completion', 'final'], "amount": True},
+    ],
+    # In months: "2 years" is 24
+    'delivery_period': [{"labels": ['delivery', 'completion', 'construction'], "unit": _MONTHS_OR_YEARS,
+                         "scale": {"year": 12}}],
+    'installments': [{"labels": ['installment', 'payment'], "integer": True,
+                      "unit": re.compile(r"\s*(?:quarterly|monthly|annual|installment)")}],
+}
+
+MUSHARAKA_FIELDS = {
+    'capital_contribution_bank': [{"labels": [(('bank', 'islamic bank', 'financial institution'),
+                                               ('capital', 'contributed', 'invested'))], "amount": True}],
+    'capital_contribution_partner': [{"labels": [(('client', 'partner', 'customer'),
+                                                  ('capital', 'contributed', 'invested'))], "amount": True}],
+    'profit_ratio_bank': [{"labels": [(('bank', 'islamic bank'), ('profit', 'share', 'ratio'))], "unit": _PERCENT}],
+    'profit_ratio_partner': [{"labels": [(('client', 'partner', 'customer'), ('profit', 'share', 'ratio'))],
+                              "unit": _PERCENT}],
+    'partnership_term': [{"labels": [(('partnership', 'contract', 'musharaka'), ('term', 'period', 'duration'))],
+                          "unit": _DURATION}],
+    'diminishing_rate': [{"labels": ['diminishing', 'decrease', 'reduce'], "unit": _PERCENT,
+                          "followed_by": ['per year', 'annually', 'each year']}],
+}
+
+# The variables each calculator needs, and what every variable of its label map
+# is, for the LLM that fills in those the label maps miss (see utils.llm.fill_missing_variables)
+IJARAH_REQUIRED = ('purchase_price', 'yearly_rental', 'lease_term')
+IJARAH_VARIABLES = {
+    'purchase_price': "purchase price of the leased asset",
+    'yearly_rental': "rental paid per year",
+    'lease_term': "lease term, in years",
+    'import_tax': "import tax paid on the asset",
+    'freight_charges': "freight or shipping charges paid on the asset",
+    'residual_value': "expected residual value of the asset at the end of the lease",
+    'purchase_option': "price at which the lessee may purchase the asset at the end of the lease",
+}
+
+MURABAHA_REQUIRED = ('cost_price',)
+MURABAHA_VARIABLES = {
+    'cost_price': "price at which the seller acquired the asset",
+    'selling_price': "price at which the asset is sold to the customer",
+    'profit_rate': "profit rate or markup, in percent",
+    'installments': "number of installments",
+    'down_payment': "down payment made by the customer",
+}
+
+ISTISNA_REQUIRED = ('contract_value', 'total_cost')
+ISTISNA_VARIABLES = {
+    'contract_value': "price of the Istisna'a contract agreed with the customer",
+    'total_cost': "total estimated cost of manufacturing or construction",
+    'upfront_payment': "payment made upfront",
+    'completion_payment': "payment made on completion",
+    'delivery_period': "delivery or construction period, in months",
+}
+
+_SCANNERS = {
+    id(field_map): compile_label_scanner(field_map)
+    for field_map in (IJARAH_FIELDS, MURABAHA_FIELDS, ISTISNA_FIELDS, MUSHARAKA_FIELDS)
+}
+
+def _extract(query_text, field_map):
+    return extract_fields(query_text, field_map, scanner=_SCANNERS[id(field_map)])
 
 def extract_ijarah_variables(query_text):
     """
-    Extract key financial variables from an Ijarah scenario text using regex.
+    Extract key financial variables from an Ijarah scenario text.
     
     Args:
         query_text (str): The query text to extract variables from
@@ -68,29 +137,11 @@ def extract_ijarah_variables(query_text):
     Returns:
         dict: Extracted variables
     """
-    patterns = {
-        'purchase_price': r'(?:purchased|purchase price|cost|bought).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)',
-        'import_tax': r'(?:import tax|tax|duty).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)',
-        'freight_charges': r'(?:freight|shipping|transportation|delivery).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)',
-        'yearly_rental': r'(?:yearly rental|annual rent|rent per year|annual rental|per year).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)',
-        'lease_term': r'(?:lease term|term of|period of|duration).*?([0-9,.]+)[\s](?:year|yr|yrs|years)',
-        'residual_value': r'(?:residual value|expected.*?value|value at end).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)',
-        'purchase_option': r'(?:purchase option|option to purchase|purchase price at end).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)'
-    }
-    extracted_values = {}
-    for key, pattern in patterns.items():
-        match = re.search(pattern, query_text, re.IGNORECASE)
-        if match:
-            value_str = match.group(1).replace(',', '')
-            try:
-                extracted_values[key] = float(value_str)
-            except ValueError:
-                pass
-    return extracted_values
+    return _extract(query_text, IJARAH_FIELDS)
 
 def extract_murabaha_variables(query_text):
     """
-    Extract key financial variables from a Murabaha scenario text using regex.
+    Extract key financial variables from a Murabaha scenario text.
     
     Args:
         query_text (str): The query text to extract variables from
@@ -98,27 +149,11 @@ def extract_murabaha_variables(query_text):
     Returns:
         dict: Extracted variables
     """
-    patterns = {
-        'cost_price': r'(?:cost price|purchase price|acquired for|bought for).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)',
-        'selling_price': r'(?:selling price|sold for|sale price|sells at).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)',
-        'profit_rate': r'(?:profit rate|markup|mark-up|margin).*?([0-9,.]+)[\s]*(?:%|percent)',
-        'installments': r'(?:installment|instalment|payment).+?([0-9]+)[\s]*(?:payment|installment|monthly|quarterly|annual)',
-        'down_payment': r'(?:down payment|advance|initial payment).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)'
-    }
-    extracted_values = {}
-    for key, pattern in patterns.items():
-        match = re.search(pattern, query_text, re.IGNORECASE)
-        if match:
-            value_str = match.group(1).replace(',', '')
-            try:
-                extracted_values[key] = float(value_str)
-            except ValueError:
-                pass
-    return extracted_values
+    return _extract(query_text, MURABAHA_FIELDS)
 
 def extract_istisna_variables(query_text):
     """
-    Extract key financial variables from an Istisna'a contract scenario text using regex.
+    Extract key financial variables from an Istisna'a contract scenario text.
     
     Args:
         query_text (str): The query text to extract variables from
@@ -126,51 +161,11 @@ def extract_istisna_variables(query_text):
     Returns:
         dict: Extracted variables
     """
-    patterns = {
-        'contract_value': r'(?:price|contract value|agreed price|contract amount).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)',
-        'total_cost': r'(?:cost|total cost|estimated cost|contractor.*?cost).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)',
-        'delivery_period': r'(?:delivery|completion|construction).*?([0-9,.]+)[\s]*(?:month|months|year|years)',
-        'installments': r'(?:installment|payment).*?([0-9]+)[\s]*(?:quarterly|monthly|annual|installment)',
-        'upfront_payment': r'(?:upfront|advance|initial).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)',
-        'completion_payment': r'(?:completion|final).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)'
-    }
-    
-    extracted_values = {}
-    
-    # Try specialized patterns first
-    contract_match = re.search(r'[Pp]rice:? \$?([0-9,.]+)', query_text)
-    if contract_match:
-        extracted_values['contract_value'] = float(contract_match.group(1).replace(',', ''))
-    
-    cost_match = re.search(r'[Cc]ost:? \$?([0-9,.]+)', query_text)
-    if cost_match:
-        extracted_values['total_cost'] = float(cost_match.group(1).replace(',', ''))
-        
-    # Look for specific payment patterns in parallel istisna'a scenarios
-    upfront_match = re.search(r'\$?([0-9,.]+)\s*upfront', query_text, re.IGNORECASE)
-    if upfront_match:
-        extracted_values['upfront_payment'] = float(upfront_match.group(1).replace(',', ''))
-        
-    completion_match = re.search(r'\$?([0-9,.]+)\s*on completion', query_text, re.IGNORECASE)
-    if completion_match:
-        extracted_values['completion_payment'] = float(completion_match.group(1).replace(',', ''))
-    
-    # Then try the general patterns
-    for key, pattern in patterns.items():
-        if key not in extracted_values:
-            match = re.search(pattern, query_text, re.IGNORECASE)
-            if match:
-                value_str = match.group(1).replace(',', '')
-                try:
-                    extracted_values[key] = float(value_str)
-                except ValueError:
-                    pass
-    
-    return extracted_values
+    return _extract(query_text, ISTISNA_FIELDS)
 
 def extract_musharaka_variables(query_text):
     """
-    Extract key financial variables from a Musharaka scenario text using regex.
+    Extract key financial variables from a Musharaka scenario text.
     
     Args:
         query_text (str): The query text to extract variables from
@@ -178,28 +173,10 @@ def extract_musharaka_variables(query_text):
     Returns:
         dict: Extracted variables
     """
-    patterns = {
-        'capital_contribution_bank': r'(?:bank|islamic bank|financial institution).*?(?:capital|contributed|invested).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)',
-        'capital_contribution_partner': r'(?:client|partner|customer).*?(?:capital|contributed|invested).*?(?:\$|USD|usd|SAR|sar|AED|aed|EUR|eur|GBP|gbp)[,\s]*([0-9,.]+)',
-        'profit_ratio_bank': r'(?:bank|islamic bank).*?(?:profit|share|ratio).*?([0-9,.]+)[\s]*(?:%|percent)',
-        'profit_ratio_partner': r'(?:client|partner|customer).*?(?:profit|share|ratio).*?([0-9,.]+)[\s]*(?:%|percent)',
-        'partnership_term': r'(?:partnership|contract|musharaka).*?(?:term|period|duration).*?([0-9,.]+)[\s]*(?:year|yr|yrs|years|month|months)',
-        'diminishing_rate': r'(?:diminishing|decrease|reduce).*?([0-9,.]+)[\s]*(?:%|percent).*?(?:per year|annually|each year)'
-    }
-    extracted_values = {}
-    for key, pattern in patterns.items():
-        match = re.search(pattern, query_text, re.IGNORECASE)
-        if match:
-            value_str = match.group(1).replace(',', '')
-            try:
-                extracted_values[key] = float(value_str)
-            except ValueError:
-                pass
+    extracted_values = _extract(query_text, MUSHARAKA_FIELDS)
     
     # Try to detect if it's a diminishing musharaka
-    if 'diminish' in query_text.lower() or 'decline' in query_text.lower() or 'gradually' in query_text.lower():
-        extracted_values['is_diminishing'] = True
-    else:
-        extracted_values['is_diminishing'] = False
+    query_lower = query_text.lower()
+    extracted_values['is_diminishing'] = any(word in query_lower for word in ('diminish', 'decline', 'gradually'))
         
     return extracted_values
@@ -2,6 +2,159 @@
 Formatting utilities for the Islamic Finance API.
 """
 
+# Titles and units of the periods of the calculated schedules
+_FREQUENCY_TITLES = {"yearly": "Annual", "quarterly": "Quarterly", "monthly": "Monthly"}
+_FREQUENCY_UNITS = {"yearly": "years", "quarterly": "quarters", "monthly": "months"}
+
+def _ijarah_periodic_amounts(calculations):
+    """Return the amortization, deferred cost allocation and rental of each period of an Ijarah."""
+    first = (calculations.get('schedule') or [{}])[0]
+    return first.get('amortization', 0), first.get('deferred_cost_allocation', 0), first.get('rental', 0)
+
+def _ijarah_sections(variables, calculations):
+    """
+    Build the lines of each section of an Ijarah response, without their headings.
+
+    Args:
+        variables (dict): The extracted variables
+        calculations (dict): The calculated values
+
+    Returns:
+        dict: The lines of the analysis, variables, calculations, journal_entries,
+              amortizable_amount_table, schedule and explanation sections
+    """
+    def format_currency(value):
+        return f"${value:,.2f}"
+
+    amortization, finance_cost, rental = _ijarah_periodic_amounts(calculations)
+    frequency = calculations.get('frequency', 'yearly')
+    schedule = calculations.get('schedule', [])
+    periods = f"{len(schedule)} {_FREQUENCY_UNITS[frequency]}"
+    transfer = calculations.get('terminal_transfer')
+
+    analysis = [
+        "**Transaction Type:** Ijarah Muntahia Bittamleek (Lease ending with ownership)",
+        "**Applicable Standard:** AAOIFI FAS 28",
+        "**Accounting Method:** Underlying Asset Cost Method",
+    ]
+
+    extracted_variables = [
+        f"**Purchase Price:** {format_currency(variables.get('purchase_price', 0))}",
+        f"**Import Tax:** {format_currency(variables.get('import_tax', 0))}",
+        f"**Freight Charges:** {format_currency(variables.get('freight_charges', 0))}",
+        f"**Lease Term:** {variables.get('lease_term', 0)} years",
+        f"**Yearly Rental:** {format_currency(variables.get('yearly_rental', 0))}",
+        f"**Residual Value:** {format_currency(variables.get('residual_value', 0))}",
+        f"**Purchase Option Price:** {format_currency(variables.get('purchase_option', 0))}",
+    ]
+
+    steps = []
+    # Step 1: Calculate ROU Asset
+    steps.append("**Step 1: Calculate ROU Asset**")
+    steps.append(f"Prime Cost = Purchase Price + Import Tax + Freight Charges")
+    steps.append(f"          = {format_currency(variables.get('purchase_price', 0))} + {format_currency(variables.get('import_tax', 0))} + {format_currency(variables.get('freight_charges', 0))}")
+    steps.append(f"          = {format_currency(calculations['prime_cost'])}")
+    steps.append("")
+
+    # Step 2: Calculate Deferred Ijarah Cost
+    steps.append("**Step 2: Calculate Deferred Ijarah Cost**")
+    steps.append(f"Total Rentals = Yearly Rental × Lease Term")
+    steps.append(f"              = {format_currency(variables.get('yearly_rental', 0))} × {variables.get('lease_term', 0)}")
+    steps.append(f"              = {format_currency(calculations['total_rentals'])}")
+    steps.append("")
+    steps.append(f"Less ROU Asset = Total Rentals - ROU Asset")
+    steps.append(f"               = {format_currency(calculations['total_rentals'])} - {format_currency(calculations['rou_asset'])}")
+    steps.append(f"               = {format_currency(calculations['deferred_cost'])}")
+    steps.append("")
+
+    # Step 3: Calculate Amortizable Amount
+    steps.append("**Step 3: Calculate Amortizable Amount**")
+    steps.append(f"ROU Cost = {format_currency(calculations['rou_asset'])}")
+    steps.append(f"Less Terminal Value Difference = Residual Value - Purchase Option Price")
+    steps.append(f"                               = {format_currency(variables.get('residual_value', 0))} - {format_currency(variables.get('purchase_option', 0))}")
+    steps.append(f"                               = {format_currency(calculations['terminal_value_diff'])}")
+    steps.append(f"Amortizable Amount = ROU Cost - Terminal Value Difference")
+    steps.append(f"                   = {format_currency(calculations['rou_asset'])} - {format_currency(calculations['terminal_value_diff'])}")
+    steps.append(f"                   = {format_currency(calculations['amortizable_amount'])}")
+
+    entries = []
+    # Initial Recognition Entry
+    entries.append("**Initial Recognition:**")
+    entries.append(f"**Dr.** Right of Use Asset (ROU)         {format_currency(calculations['rou_asset'])}")
+    entries.append(f"     (= Purchase Price {format_currency(variables.get('purchase_price', 0))} + Import Tax {format_currency(variables.get('import_tax', 0))} + Freight {format_currency(variables.get('freight_charges', 0))})")
+    entries.append(f"**Dr.** Deferred Ijarah Cost             {format_currency(calculations['deferred_cost'])}")
+    entries.append(f"     (= Total Rentals {format_currency(calculations['total_rentals'])} - ROU Asset {format_currency(calculations['rou_asset'])})")
+    entries.append(f"    **Cr.** Ijarah Liability             {format_currency(calculations['ijarah_liability'])}")
+    entries.append(f"         (= Total Rentals {format_currency(calculations['total_rentals'])})")
+    entries.append("")
+
+    # Amortization Entry (Each Period)
+    entries.append(f"**Periodic Amortization ({_FREQUENCY_TITLES[frequency]}):**")
+    entries.append(f"**Dr.** Amortization Expense             {format_currency(amortization)}")
+    entries.append(f"     (= Amortizable Amount {format_currency(calculations['amortizable_amount'])} ÷ Lease Term {periods})")
+    entries.append(f"    **Cr.** Accumulated Amortization      {format_currency(amortization)}")
+    entries.append("")
+
+    # Rental Payment Entry (Each Period): every rental pays down the liability
+    entries.append(f"**Periodic Rental Payment ({_FREQUENCY_TITLES[frequency]}):**")
+    entries.append(f"**Dr.** Ijarah Liability                {format_currency(rental)}")
+    entries.append(f"    **Cr.** Cash/Bank                     {format_currency(rental)}")
+    entries.append("")
+
+    # Deferred Ijarah Cost Allocation (Each Period)
+    entries.append(f"**Periodic Deferred Ijarah Cost Allocation ({_FREQUENCY_TITLES[frequency]}):**")
+    entries.append(f"**Dr.** Finance Cost                    {format_currency(finance_cost)}")
+    entries.append(f"     (= Deferred Cost {format_currency(calculations['deferred_cost'])} ÷ Lease Term {periods})")
+    entries.append(f"    **Cr.** Deferred Ijarah Cost          {format_currency(finance_cost)}")
+
+    # Terminal Transfer Entry: the purchase option is exercised at the end of the lease
+    if transfer:
+        entries.append("")
+        entries.append("**Terminal Transfer (Purchase Option Exercised):**")
+        entries.append(f"**Dr.** Property, Plant and Equipment   {format_currency(transfer['transfer_amount'])}")
+        entries.append(f"**Dr.** Accumulated Amortization        {format_currency(transfer['accumulated_amortization'])}")
+        entries.append(f"    **Cr.** Right of Use Asset (ROU)      {format_currency(transfer['rou_asset'])}")
+        entries.append(f"    **Cr.** Cash/Bank                     {format_currency(transfer['purchase_option'])}")
+
+    schedule_table = [
+        "| Period | Rental | ROU Amortization | Deferred Cost Allocation | ROU Carrying Amount | Deferred Ijarah Cost | Ijarah Liability |",
+        "|--------|--------|------------------|--------------------------|---------------------|----------------------|------------------|",
+    ]
+    for row in schedule:
+        schedule_table.append(
+            f"| {row['period']} | {format_currency(row['rental'])} | {format_currency(row['amortization'])} | "
+            f"{format_currency(row['deferred_cost_allocation'])} | {format_currency(row['rou_carrying_amount'])} | "
+            f"{format_currency(row['deferred_cost_balance'])} | {format_currency(row['liability_balance'])} |"
+        )
+
+    amortizable_table = [
+        "Description                                               Amount",
+        "---|---",
+        f"Cost of ROU                                          {format_currency(calculations['rou_asset'])}",
+        f"Less: Terminal value difference                      {format_currency(calculations['terminal_value_diff'])}",
+        f"       (Residual {format_currency(variables.get('residual_value', 0))} − Purchase {format_currency(variables.get('purchase_option', 0))})    {format_currency(calculations['terminal_value_diff'])}",
+        f"Amortizable Amount                                   {format_currency(calculations['amortizable_amount'])}",
+    ]
+
+    explanation = [
+        "This accounting treatment recognizes:",
+        f"1. The right to use the asset based on its cost minus terminal value ({format_currency(calculations['rou_asset'])})",
+        f"2. The financing cost component ({format_currency(calculations['deferred_cost'])}) to be amortized over the lease term",
+        f"3. The total liability for future lease payments ({format_currency(calculations['ijarah_liability'])})",
+        "",
+        f"The amortizable amount of {format_currency(calculations['amortizable_amount'])} reflects the ROU asset adjusted for the value that will remain after ownership transfer. We deduct {format_currency(calculations['terminal_value_diff'])} since the Lessee is expected to gain ownership, and this value will remain in the books after the lease ends.",
+    ]
+
+    return {
+        "analysis": analysis,
+        "variables": extracted_variables,
+        "calculations": steps,
+        "journal_entries": entries,
+        "amortizable_amount_table": amortizable_table,
+        "schedule": schedule_table,
+        "explanation": explanation,
+    }
+
 def format_ijarah_response(variables, calculations):
     """
     Generate a formatted response for Ijarah scenario based on calculations.
@@ -13,116 +166,32 @@ def format_ijarah_response(variables, calculations):
     Returns:
         str: Formatted response
     """
-    def format_currency(value):
-        return f"${value:,.2f}"
-    
+    sections = _ijarah_sections(variables, calculations)
+
     # Build response using a list approach to avoid string formatting issues
-    response_parts = []
-    
-    # Header
-    response_parts.append("## ANALYSIS OF IJARAH MBT SCENARIO")
+    response_parts = ["## ANALYSIS OF IJARAH MBT SCENARIO", ""]
+    response_parts.extend(sections["analysis"])
     response_parts.append("")
-    response_parts.append("**Transaction Type:** Ijarah Muntahia Bittamleek (Lease ending with ownership)")
-    response_parts.append("**Applicable Standard:** AAOIFI FAS 28")
-    response_parts.append("**Accounting Method:** Underlying Asset Cost Method")
-    response_parts.append("")
-    
-    # Extracted Variables
     response_parts.append("### EXTRACTED VARIABLES")
-    response_parts.append(f"**Purchase Price:** {format_currency(variables.get('purchase_price', 0))}")
-    response_parts.append(f"**Import Tax:** {format_currency(variables.get('import_tax', 0))}")
-    response_parts.append(f"**Freight Charges:** {format_currency(variables.get('freight_charges', 0))}")
-    response_parts.append(f"**Lease Term:** {variables.get('lease_term', 0)} years")
-    response_parts.append(f"**Yearly Rental:** {format_currency(variables.get('yearly_rental', 0))}")
-    response_parts.append(f"**Residual Value:** {format_currency(variables.get('residual_value', 0))}")
-    response_parts.append(f"**Purchase Option Price:** {format_currency(variables.get('purchase_option', 0))}")
+    response_parts.extend(sections["variables"])
     response_parts.append("")
-    
-    # Calculations
     response_parts.append("### CALCULATIONS")
     response_parts.append("")
-    
-    # Step 1: Calculate ROU Asset
-    response_parts.append("**Step 1: Calculate ROU Asset**")
-    response_parts.append(f"Prime Cost = Purchase Price + Import Tax + Freight Charges")
-    response_parts.append(f"          = {format_currency(variables.get('purchase_price', 0))} + {format_currency(variables.get('import_tax', 0))} + {format_currency(variables.get('freight_charges', 0))}")
-    response_parts.append(f"          = {format_currency(calculations['prime_cost'])}")
-    response_parts.append("")
-    
-    # Step 2: Calculate Deferred Ijarah Cost
-    response_parts.append("**Step 2: Calculate Deferred Ijarah Cost**")
-    response_parts.append(f"Total Rentals = Yearly Rental × Lease Term")
-    response_parts.append(f"              = {format_currency(variables.get('yearly_rental', 0))} × {variables.get('lease_term', 0)}")
-    response_parts.append(f"              = {format_currency(calculations['total_rentals'])}")
-    response_parts.append("")
-    response_parts.append(f"Less ROU Asset = Total Rentals - ROU Asset")
-    response_parts.append(f"               = {format_currency(calculations['total_rentals'])} - {format_currency(calculations['rou_asset'])}")
-    response_parts.append(f"               = {format_currency(calculations['deferred_cost'])}")
-    response_parts.append("")
-    
-    # Step 3: Calculate Amortizable Amount
-    response_parts.append("**Step 3: Calculate Amortizable Amount**")
-    response_parts.append(f"ROU Cost = {format_currency(calculations['rou_asset'])}")
-    response_parts.append(f"Less Terminal Value Difference = Residual Value - Purchase Option Price")
-    response_parts.append(f"                               = {format_currency(variables.get('residual_value', 0))} - {format_currency(variables.get('purchase_option', 0))}")
-    response_parts.append(f"                               = {format_currency(calculations['terminal_value_diff'])}")
-    response_parts.append(f"Amortizable Amount = ROU Cost - Terminal Value Difference")
-    response_parts.append(f"                   = {format_currency(calculations['rou_asset'])} - {format_currency(calculations['terminal_value_diff'])}")
-    response_parts.append(f"                   = {format_currency(calculations['amortizable_amount'])}")
+    response_parts.extend(sections["calculations"])
     response_parts.append("")
-    
-    # Journal Entry with Detailed Calculations
     response_parts.append("### JOURNAL ENTRIES WITH CALCULATIONS")
     response_parts.append("")
-    
-    # Initial Recognition Entry
-    response_parts.append("**Initial Recognition:**")
-    response_parts.append(f"**Dr.** Right of Use Asset (ROU)         {format_currency(calculations['rou_asset'])}")
-    response_parts.append(f"     (= Purchase Price {format_currency(variables.get('purchase_price', 0))} + Import Tax {format_currency(variables.get('import_tax', 0))} + Freight {format_currency(variables.get('freight_charges', 0))})")
-    response_parts.append(f"**Dr.** Deferred Ijarah Cost             {format_currency(calculations['deferred_cost'])}")
-    response_parts.append(f"     (= Total Rentals {format_currency(calculations['total_rentals'])} - ROU Asset {format_currency(calculations['rou_asset'])})")
-    response_parts.append(f"    **Cr.** Ijarah Liability             {format_currency(calculations['ijarah_liability'])}")
-    response_parts.append(f"         (= Total Rentals {format_currency(calculations['total_rentals'])})")
-    response_parts.append("")
-    
-    # Amortization Entry (First Period)
-    yearly_amortization = calculations['amortizable_amount'] / variables.get('lease_term', 1)
-    response_parts.append("**Periodic Amortization (Annual):**")
-    response_parts.append(f"**Dr.** Amortization Expense             {format_currency(yearly_amortization)}")
-    response_parts.append(f"     (= Amortizable Amount {format_currency(calculations['amortizable_amount'])} ÷ Lease Term {variables.get('lease_term', 0)} years)")
-    response_parts.append(f"    **Cr.** Accumulated Amortization      {format_currency(yearly_amortization)}")
-    response_parts.append("")
-    
-    # Rental Payment Entry (First Period)
-    yearly_rental = variables.get('yearly_rental', 0)
-    yearly_finance_cost = calculations['deferred_cost'] / variables.get('lease_term', 1)
-    yearly_liability_reduction = yearly_rental - yearly_finance_cost
-    
-    response_parts.append("**Periodic Rental Payment (Annual):**")
-    response_parts.append(f"**Dr.** Ijarah Liability                {format_currency(yearly_liability_reduction)}")
-    response_parts.append(f"**Dr.** Finance Cost                    {format_currency(yearly_finance_cost)}")
-    response_parts.append(f"     (= Deferred Cost {format_currency(calculations['deferred_cost'])} ÷ Lease Term {variables.get('lease_term', 0)} years)")
-    response_parts.append(f"    **Cr.** Cash/Bank                     {format_currency(yearly_rental)}")
+    response_parts.extend(sections["journal_entries"])
     response_parts.append("")
-    
-    # Amortizable Amount Calculation
     response_parts.append("### AMORTIZABLE AMOUNT CALCULATION")
-    response_parts.append("Description                                               Amount")
-    response_parts.append("---|---")
-    response_parts.append(f"Cost of ROU                                          {format_currency(calculations['rou_asset'])}")
-    response_parts.append(f"Less: Terminal value difference                      {format_currency(calculations['terminal_value_diff'])}")
-    response_parts.append(f"       (Residual {format_currency(variables.get('residual_value', 0))} − Purchase {format_currency(variables.get('purchase_option', 0))})    {format_currency(calculations['terminal_value_diff'])}")
-    response_parts.append(f"Amortizable Amount                                   {format_currency(calculations['amortizable_amount'])}")
+    response_parts.extend(sections["amortizable_amount_table"])
     response_parts.append("")
-    
-    # Explanation
+    if calculations.get('schedule'):
+        response_parts.append("### IJARAH SCHEDULE")
+        response_parts.extend(sections["schedule"])
+        response_parts.append("")
     response_parts.append("### EXPLANATION")
-    response_parts.append("This accounting treatment recognizes:")
-    response_parts.append(f"1. The right to use the asset based on its cost minus terminal value ({format_currency(calculations['rou_asset'])})")
-    response_parts.append(f"2. The financing cost component ({format_currency(calculations['deferred_cost'])}) to be amortized over the lease term")
-    response_parts.append(f"3. The total liability for future lease payments ({format_currency(calculations['ijarah_liability'])})")
-    response_parts.append("")
-    response_parts.append(f"The amortizable amount of {format_currency(calculations['amortizable_amount'])} reflects the ROU asset adjusted for the value that will remain after ownership transfer. We deduct {format_currency(calculations['terminal_value_diff'])} since the Lessee is expected to gain ownership, and this value will remain in the books after the lease ends.")
+    response_parts.extend(sections["explanation"])
     
     # Join all parts with newlines
     response = "\n".join(response_parts)
@@ -133,7 +202,31 @@ def format_ijarah_response(variables, calculations):
     print("\n==== END IJARAH RESPONSE ====\n")
     
     return response
-    return response
+
+def _murabaha_amounts(variables, calculations):
+    """Return the remaining amount, the profit recognized on the down payment and the profit per installment of a Murabaha."""
+    remaining_amount = calculations.get('selling_price', 0) - variables.get('down_payment', 0)
+    profit_recognized = 0
+    if variables.get('down_payment', 0) > 0 and calculations.get('selling_price', 0):
+        profit_proportion = variables.get('down_payment', 0) / calculations.get('selling_price', 0)
+        profit_recognized = calculations.get('profit', 0) * profit_proportion
+    profit_per_installment = calculations.get('profit', 0) / variables.get('installments', 1)
+    return remaining_amount, profit_recognized, profit_per_installment
+
+def _murabaha_explanation(variables, calculations):
+    """Build the lines of the explanation of a Murabaha response."""
+    def format_currency(value):
+        return f"${value:,.2f}"
+
+    return [
+        "This accounting treatment:",
+        f"1. Initially recognizes the asset at its acquisition cost ({format_currency(variables.get('cost_price', 0))})",
+        f"2. Upon sale, recognizes the full receivable amount ({format_currency(calculations.get('selling_price', 0))})",
+        f"3. Recognizes the deferred profit ({format_currency(calculations.get('profit', 0))}) to be amortized over the installment period",
+        f"4. Each installment payment will be {format_currency(calculations.get('installment_amount', 0))} and will include both principal recovery and profit recognition",
+        "",
+        "This accounting treatment follows AAOIFI FAS 4 guidelines for Murabaha financing.",
+    ]
 
 def format_murabaha_response(variables, calculations):
     """
@@ -149,6 +242,8 @@ def format_murabaha_response(variables, calculations):
     def format_currency(value):
         return f"${value:,.2f}"
     
+    remaining_amount, profit_recognized, profit_per_installment = _murabaha_amounts(variables, calculations)
+
     # Build response using a list approach to avoid string formatting issues
     response_parts = []
     
@@ -191,7 +286,6 @@ def format_murabaha_response(variables, calculations):
     response_parts.append("**Step 3: Installment Calculation**")
     response_parts.append(f"Remaining Amount = Selling Price - Down Payment")
     response_parts.append(f"                 = {format_currency(calculations.get('selling_price', 0))} - {format_currency(variables.get('down_payment', 0))}")
-    remaining_amount = calculations.get('selling_price', 0) - variables.get('down_payment', 0)
     response_parts.append(f"                 = {format_currency(remaining_amount)}")
     response_parts.append("")
     
@@ -220,8 +314,6 @@ def format_murabaha_response(variables, calculations):
     # Down Payment Entry (if applicable)
     if variables.get('down_payment', 0) > 0:
         response_parts.append("**At Down Payment Receipt:**")
-        profit_proportion = variables.get('down_payment', 0) / calculations.get('selling_price', 0)
-        profit_recognized = calculations.get('profit', 0) * profit_proportion
         response_parts.append(f"**Dr.** Cash/Bank                       {format_currency(variables.get('down_payment', 0))}")
         response_parts.append(f"    **Cr.** Murabaha Receivables        {format_currency(variables.get('down_payment', 0))}")
         response_parts.append("")
@@ -235,20 +327,13 @@ def format_murabaha_response(variables, calculations):
     response_parts.append(f"    **Cr.** Murabaha Receivables        {format_currency(calculations.get('installment_amount', 0))}")
     response_parts.append("")
     
-    profit_per_installment = calculations.get('profit', 0) / variables.get('installments', 1)
     response_parts.append(f"**Dr.** Deferred Murabaha Profit        {format_currency(profit_per_installment)}")
     response_parts.append(f"    **Cr.** Profit Income               {format_currency(profit_per_installment)}")
     response_parts.append("")
     
     # Explanation
     response_parts.append("### EXPLANATION")
-    response_parts.append("This accounting treatment:")
-    response_parts.append(f"1. Initially recognizes the asset at its acquisition cost ({format_currency(variables.get('cost_price', 0))})")
-    response_parts.append(f"2. Upon sale, recognizes the full receivable amount ({format_currency(calculations.get('selling_price', 0))})")
-    response_parts.append(f"3. Recognizes the deferred profit ({format_currency(calculations.get('profit', 0))}) to be amortized over the installment period")
-    response_parts.append(f"4. Each installment payment will be {format_currency(calculations.get('installment_amount', 0))} and will include both principal recovery and profit recognition")
-    response_parts.append("")
-    response_parts.append("This accounting treatment follows AAOIFI FAS 4 guidelines for Murabaha financing.")
+    response_parts.extend(_murabaha_explanation(variables, calculations))
     
     # Join all parts with newlines
     response = "\n".join(response_parts)
@@ -260,6 +345,64 @@ def format_murabaha_response(variables, calculations):
     
     return response
 
+def _istisna_payable_account(is_parallel):
+    """Return the account credited with the costs of an Istisna'a: the manufacturer's, in a parallel Istisna'a."""
+    return "Parallel Istisna'a Payable – Contractor" if is_parallel else "Bank / Payables"
+
+def _istisna_explanation(calculations):
+    """Build the lines of the explanation of an Istisna'a response."""
+    def format_currency(value):
+        return f"${value:,.2f}"
+    
+    def format_percentage(value):
+        return f"{value:.1f}%"
+    
+    quarterly_progress = calculations.get('quarterly_progress', [])
+    explanation = []
+    explanation.append("This accounting treatment follows the percentage-of-completion method as required by AAOIFI FAS 10 for Istisna'a contracts.")
+    explanation.append("")
+    
+    # Add contract analysis if available
+    if 'contract_value' in calculations and 'total_cost' in calculations:
+        explanation.append("**1. Contract Analysis:**")
+        for key, value in calculations.items():
+            if key in ['contract_value', 'total_cost', 'expected_profit', 'profit_margin']:
+                display_key = key.replace('_', ' ').title()
+                if key in ['contract_value', 'total_cost', 'expected_profit']:
+                    formatted_value = format_currency(value)
+                elif key == 'profit_margin':
+                    formatted_value = format_percentage(value)
+                else:
+                    formatted_value = str(value)
+                explanation.append(f"- {display_key}: {formatted_value}")
+        explanation.append("")
+    
+    # Add quarterly recognition if available
+    if len(quarterly_progress) >= 4:
+        explanation.append("**2. Quarterly Recognition:**")
+        for i, q in enumerate(quarterly_progress[:4]):
+            period = q.get('period', f"Q{i+1}")
+            percentage = q.get('percentage_of_completion', 0)
+            revenue = q.get('revenue', 0)
+            explanation.append(f"- {period}: {format_percentage(percentage)} completion, recognizing {format_currency(revenue)} revenue")
+        explanation.append("")
+    
+    # Add accounting principles
+    explanation.append("**3. Accounting Principles:**")
+    explanation.append("- Costs are recorded in Work-in-Progress as incurred")
+    explanation.append("- Revenue is recognized proportionally based on percentage completion")
+    explanation.append("- Profit is recognized in the same proportion as revenue")
+    explanation.append("- Percentage completion is calculated as: Cumulative Cost ÷ Total Estimated Cost")
+    explanation.append("")
+    
+    # Add final recognition if available
+    if 'contract_value' in calculations and 'expected_profit' in calculations and 'total_cost' in calculations:
+        explanation.append("**4. Final Recognition:**")
+        explanation.append(f"- At project completion, the full contract value of {format_currency(calculations['contract_value'])} is recognized")
+        explanation.append(f"- Total profit of {format_currency(calculations['expected_profit'])} is realized")
+        explanation.append(f"- All costs of {format_currency(calculations['total_cost'])} are recorded in the Work-in-Progress account")
+    return explanation
+
 def format_istisna_response(variables, calculations):
     """
     Generate a formatted response for Istisna'a scenario based on calculations.
@@ -365,57 +508,26 @@ def format_istisna_response(variables, calculations):
             response.append("")
             response.append("*Cost Incurred:*")
             response.append(f"**Dr.** Work-in-Progress – Istisna'a     {format_currency(quarterly_cost)}")
-            response.append(f"    **Cr.** Bank / Payables              {format_currency(quarterly_cost)}")
+            response.append(f"    **Cr.** {_istisna_payable_account(is_parallel)}              {format_currency(quarterly_cost)}")
             response.append("")
             response.append("*Revenue and Profit Recognition:*")
             response.append(f"**Dr.** Istisna'a Receivable – Client    {format_currency(incremental_revenue)}")
             response.append(f"    **Cr.** Istisna'a Revenue            {format_currency(incremental_revenue)}")
+            if q.get('billed', 0):
+                response.append("")
+                response.append("*Billing Received from Client:*")
+                response.append(f"**Dr.** Bank                             {format_currency(q['billed'])}")
+                response.append(f"    **Cr.** Istisna'a Receivable – Client {format_currency(q['billed'])}")
+            if is_parallel and q.get('contractor_payment', 0):
+                response.append("")
+                response.append("*Payment to Contractor:*")
+                response.append(f"**Dr.** {_istisna_payable_account(is_parallel)} {format_currency(q['contractor_payment'])}")
+                response.append(f"    **Cr.** Bank                         {format_currency(q['contractor_payment'])}")
     response.append("")
     
     # Explanation section
     response.append("### EXPLANATION")
-    response.append("This accounting treatment follows the percentage-of-completion method as required by AAOIFI FAS 10 for Istisna'a contracts.")
-    response.append("")
-    
-    # Add contract analysis if available
-    if 'contract_value' in calculations and 'total_cost' in calculations:
-        response.append("**1. Contract Analysis:**")
-        for key, value in calculations.items():
-            if key in ['contract_value', 'total_cost', 'expected_profit', 'profit_margin']:
-                display_key = key.replace('_', ' ').title()
-                if key in ['contract_value', 'total_cost', 'expected_profit']:
-                    formatted_value = format_currency(value)
-                elif key == 'profit_margin':
-                    formatted_value = format_percentage(value)
-                else:
-                    formatted_value = str(value)
-                response.append(f"- {display_key}: {formatted_value}")
-        response.append("")
-    
-    # Add quarterly recognition if available
-    if len(quarterly_progress) >= 4:
-        response.append("**2. Quarterly Recognition:**")
-        for i, q in enumerate(quarterly_progress[:4]):
-            period = q.get('period', f"Q{i+1}")
-            percentage = q.get('percentage_of_completion', 0)
-            revenue = q.get('revenue', 0)
-            response.append(f"- {period}: {format_percentage(percentage)} completion, recognizing {format_currency(revenue)} revenue")
-        response.append("")
-    
-    # Add accounting principles
-    response.append("**3. Accounting Principles:**")
-    response.append("- Costs are recorded in Work-in-Progress as incurred")
-    response.append("- Revenue is recognized proportionally based on percentage completion")
-    response.append("- Profit is recognized in the same proportion as revenue")
-    response.append("- Percentage completion is calculated as: Cumulative Cost ÷ Total Estimated Cost")
-    response.append("")
-    
-    # Add final recognition if available
-    if 'contract_value' in calculations and 'expected_profit' in calculations and 'total_cost' in calculations:
-        response.append("**4. Final Recognition:**")
-        response.append(f"- At project completion, the full contract value of {format_currency(calculations['contract_value'])} is recognized")
-        response.append(f"- Total profit of {format_currency(calculations['expected_profit'])} is realized")
-        response.append(f"- All costs of {format_currency(calculations['total_cost'])} are recorded in the Work-in-Progress account")
+    response.extend(_istisna_explanation(calculations))
     
     # Join all lines with newlines to create the final response
     result = '\n'.join(response)
@@ -426,3 +538,275 @@ def format_istisna_response(variables, calculations):
     print("\n==== END ISTISNA'A RESPONSE ====\n")
     
     return result
+
+def _amount(value):
+    return f"{value:,.2f}"
+
+def _entry(description, debits, credits):
+    """Build a journal entry of a structured answer from (account, amount) pairs."""
+    return {
+        "description": description,
+        "debits": [{"account": account, "amount": amount} for account, amount in debits],
+        "credits": [{"account": account, "amount": amount} for account, amount in credits],
+    }
+
+def structure_ijarah_response(variables, calculations):
+    """
+    Build the structured answer of an Ijarah scenario from its calculations.
+
+    The answer follows utils.schema.USECASE_RESPONSE_SCHEMA and also holds the
+    amortizable amount table, the schedule (as the ledger summary) and the
+    text sections shown by the frontend, so nothing has to be parsed back out
+    of format_ijarah_response.
+
+    Args:
+        variables (dict): The extracted variables
+        calculations (dict): The calculated values
+
+    Returns:
+        dict: The structured answer
+    """
+    sections = _ijarah_sections(variables, calculations)
+    amortization, finance_cost, rental = _ijarah_periodic_amounts(calculations)
+    frequency_title = _FREQUENCY_TITLES[calculations.get('frequency', 'yearly')]
+    purchase_price = float(variables.get('purchase_price', 0))
+    import_tax = float(variables.get('import_tax', 0))
+    freight_charges = float(variables.get('freight_charges', 0))
+    yearly_rental = float(variables.get('yearly_rental', 0))
+    lease_term = variables.get('lease_term', 0)
+    residual_value = float(variables.get('residual_value', 0))
+    purchase_option = float(variables.get('purchase_option', 0))
+
+    journal_entries = [
+        _entry("Initial Recognition",
+               [("Right of Use Asset (ROU)", calculations['rou_asset']),
+                ("Deferred Ijarah Cost", calculations['deferred_cost'])],
+               [("Ijarah Liability", calculations['ijarah_liability'])]),
+        _entry(f"Periodic Amortization ({frequency_title})",
+               [("Amortization Expense", amortization)], [("Accumulated Amortization", amortization)]),
+        _entry(f"Periodic Rental Payment ({frequency_title})",
+               [("Ijarah Liability", rental)], [("Cash/Bank", rental)]),
+        _entry(f"Periodic Deferred Ijarah Cost Allocation ({frequency_title})",
+               [("Finance Cost", finance_cost)], [("Deferred Ijarah Cost", finance_cost)]),
+    ]
+    transfer = calculations.get('terminal_transfer')
+    if transfer:
+        journal_entries.append(_entry(
+            "Terminal Transfer (Purchase Option Exercised)",
+            [("Property, Plant and Equipment", transfer['transfer_amount']),
+             ("Accumulated Amortization", transfer['accumulated_amortization'])],
+            [("Right of Use Asset (ROU)", transfer['rou_asset']), ("Cash/Bank", transfer['purchase_option'])]
+        ))
+
+    # The schedule, in the ledger summary table the frontend shows
+    ledger_summary = [
+        {
+            "Period": row['period'],
+            "Rental": row['rental'],
+            "ROU Amortization": row['amortization'],
+            "Deferred Cost Allocation": row['deferred_cost_allocation'],
+            "ROU Carrying Amount": row['rou_carrying_amount'],
+            "Deferred Ijarah Cost": row['deferred_cost_balance'],
+            "Ijarah Liability": row['liability_balance'],
+        }
+        for row in calculations.get('schedule', [])
+    ]
+
+    return {
+        "analysis": {
+            "transaction_type": "Ijarah Muntahia Bittamleek (Lease ending with ownership)",
+            "applicable_standard": "AAOIFI FAS 28",
+            "accounting_method": "Underlying Asset Cost Method",
+        },
+        "variables": [
+            {"name": "Purchase Price", "value": purchase_price, "unit": "USD"},
+            {"name": "Import Tax", "value": import_tax, "unit": "USD"},
+            {"name": "Freight Charges", "value": freight_charges, "unit": "USD"},
+            {"name": "Lease Term", "value": float(lease_term), "unit": "years"},
+            {"name": "Yearly Rental", "value": yearly_rental, "unit": "USD"},
+            {"name": "Residual Value", "value": residual_value, "unit": "USD"},
+            {"name": "Purchase Option Price", "value": purchase_option, "unit": "USD"},
+        ],
+        "calculations": [
+            {"label": "Prime Cost", "value": calculations['prime_cost'],
+             "formula": f"{_amount(purchase_price)} + {_amount(import_tax)} + {_amount(freight_charges)}"},
+            {"label": "ROU Asset", "value": calculations['rou_asset'],
+             "formula": f"{_amount(calculations['prime_cost'])} - {_amount(purchase_option)}"},
+            {"label": "Total Rentals", "value": calculations['total_rentals'],
+             "formula": f"{_amount(yearly_rental)} × {lease_term}"},
+            {"label": "Deferred Ijarah Cost", "value": calculations['deferred_cost'],
+             "formula": f"{_amount(calculations['total_rentals'])} - {_amount(calculations['rou_asset'])}"},
+            {"label": "Terminal Value Difference", "value": calculations['terminal_value_diff'],
+             "formula": f"{_amount(residual_value)} - {_amount(purchase_option)}"},
+            {"label": "Amortizable Amount", "value": calculations['amortizable_amount'],
+             "formula": f"{_amount(calculations['rou_asset'])} - {_amount(calculations['terminal_value_diff'])}"},
+        ],
+        "journal_entries": journal_entries,
+        "explanation": "\n".join(sections["explanation"]),
+        "amortizable_amount_table": [
+            {"description": "Cost of ROU", "amount": calculations['rou_asset']},
+            {"description": "Less: Terminal value difference", "amount": calculations['terminal_value_diff']},
+            {"description": "Amortizable Amount", "amount": calculations['amortizable_amount']},
+        ],
+        "ledger_summary": ledger_summary,
+        "sections": {
+            name: "\n".join(sections[name])
+            for name in ("analysis", "variables", "calculations", "journal_entries", "explanation")
+        },
+    }
+
+def structure_murabaha_response(variables, calculations):
+    """
+    Build the structured answer of a Murabaha scenario from its calculations.
+
+    The answer follows utils.schema.USECASE_RESPONSE_SCHEMA.
+
+    Args:
+        variables (dict): The extracted variables
+        calculations (dict): The calculated values
+
+    Returns:
+        dict: The structured answer
+    """
+    remaining_amount, profit_recognized, profit_per_installment = _murabaha_amounts(variables, calculations)
+    cost_price = float(variables.get('cost_price', 0))
+    selling_price = calculations.get('selling_price', 0)
+    profit = calculations.get('profit', 0)
+    down_payment = float(variables.get('down_payment', 0))
+    installments = int(variables.get('installments', 1))
+    installment_amount = calculations.get('installment_amount', 0)
+
+    journal_entries = [
+        _entry("At Asset Acquisition", [("Murabaha Asset", cost_price)], [("Cash/Bank", cost_price)]),
+        _entry("At Sale to Customer", [("Murabaha Receivables", selling_price)],
+               [("Murabaha Asset", cost_price), ("Deferred Murabaha Profit", profit)]),
+    ]
+    if down_payment > 0:
+        journal_entries.append(_entry("At Down Payment Receipt", [("Cash/Bank", down_payment)],
+                                      [("Murabaha Receivables", down_payment)]))
+        journal_entries.append(_entry("Profit Recognized on the Down Payment",
+                                      [("Deferred Murabaha Profit", profit_recognized)],
+                                      [("Profit Income", profit_recognized)]))
+    journal_entries.append(_entry("At Each Installment Receipt", [("Cash/Bank", installment_amount)],
+                                  [("Murabaha Receivables", installment_amount)]))
+    journal_entries.append(_entry("Profit Recognized on Each Installment",
+                                  [("Deferred Murabaha Profit", profit_per_installment)],
+                                  [("Profit Income", profit_per_installment)]))
+
+    return {
+        "analysis": {
+            "transaction_type": "Murabaha to the Purchase Orderer",
+            "applicable_standard": "AAOIFI FAS 4",
+            "accounting_method": "Cost Plus Profit Method",
+        },
+        "variables": [
+            {"name": "Cost Price", "value": cost_price, "unit": "USD"},
+            {"name": "Selling Price", "value": selling_price, "unit": "USD"},
+            {"name": "Profit Rate", "value": float(variables.get('profit_rate', 0)), "unit": "%"},
+            {"name": "Installments", "value": float(installments)},
+            {"name": "Down Payment", "value": down_payment, "unit": "USD"},
+        ],
+        "calculations": [
+            {"label": "Profit", "value": profit, "formula": f"{_amount(selling_price)} - {_amount(cost_price)}"},
+            {"label": "Remaining Amount", "value": remaining_amount,
+             "formula": f"{_amount(selling_price)} - {_amount(down_payment)}"},
+            {"label": "Installment Amount", "value": installment_amount,
+             "formula": f"{_amount(remaining_amount)} ÷ {installments}"},
+        ],
+        "journal_entries": journal_entries,
+        "explanation": "\n".join(_murabaha_explanation(variables, calculations)),
+    }
+
+def structure_istisna_response(variables, calculations):
+    """
+    Build the structured answer of an Istisna'a scenario from its calculations.
+
+    The answer follows utils.schema.USECASE_RESPONSE_SCHEMA and also holds the
+    ledger summary of the percentage of completion entries.
+
+    Args:
+        variables (dict): The extracted variables
+        calculations (dict): The calculated values
+
+    Returns:
+        dict: The structured answer
+    """
+    description = variables.get('description', '').lower()
+    is_parallel = 'parallel' in description or 'parallel istisna' in description
+
+    extracted_variables = []
+    for key, value in variables.items():
+        if key != 'description' and isinstance(value, (int, float)):
+            if 'price' in key or 'cost' in key or 'value' in key or 'payment' in key:
+                unit = "USD"
+            elif 'percentage' in key or 'rate' in key or 'margin' in key:
+                unit = "%"
+            else:
+                unit = None
+            variable = {"name": key.replace('_', ' ').title(), "value": float(value)}
+            if unit:
+                variable["unit"] = unit
+            extracted_variables.append(variable)
+
+    result_calculations = [
+        {"label": "Contract Value", "value": calculations['contract_value']},
+        {"label": "Total Cost", "value": calculations['total_cost']},
+        {"label": "Expected Profit", "value": calculations['expected_profit'],
+         "formula": f"{_amount(calculations['contract_value'])} - {_amount(calculations['total_cost'])}"},
+        {"label": "Profit Margin", "value": calculations['profit_margin']},
+    ]
+    journal_entries = []
+    ledger_summary = []
+    # Quarters are "Q1", "Q2", ...; months "M1" and years "Y1"
+    prefix = {"yearly": "Y", "monthly": "M"}.get(calculations.get('frequency'), "Q")
+    for number, q in enumerate(calculations.get('quarterly_progress', []), 1):
+        period = q.get('period', f"Quarter {number}")
+        result_calculations.append({"label": f"{prefix}{number} Cost", "value": q.get('cumulative_cost', 0)})
+        result_calculations.append({"label": f"{prefix}{number} Completion",
+                                    "value": q.get('percentage_of_completion', 0)})
+        result_calculations.append({"label": f"{prefix}{number} Profit", "value": q.get('profit', 0)})
+
+        completion = f"{period} - {q.get('percentage_of_completion', 0):.1f}% Completion"
+        journal_entries.append(_entry(f"{completion}: Cost Incurred",
+                                      [("Work-in-Progress – Istisna'a", q.get('quarterly_cost', 0))],
+                                      [(_istisna_payable_account(is_parallel), q.get('quarterly_cost', 0))]))
+        journal_entries.append(_entry(f"{completion}: Revenue and Profit Recognition",
+                                      [("Istisna'a Receivable – Client", q.get('incremental_revenue', 0))],
+                                      [("Istisna'a Revenue", q.get('incremental_revenue', 0))]))
+        if q.get('billed', 0):
+            journal_entries.append(_entry(f"{period}: Billing Received from Client",
+                                          [("Bank", q['billed'])],
+                                          [("Istisna'a Receivable – Client", q['billed'])]))
+        if is_parallel and q.get('contractor_payment', 0):
+            journal_entries.append(_entry(f"{period}: Payment to Contractor",
+                                          [(_istisna_payable_account(is_parallel), q['contractor_payment'])],
+                                          [("Bank", q['contractor_payment'])]))
+        ledger_summary.append({
+            "Quarter": f"{prefix}{number}",
+            "Work-in-Progress": q.get('quarterly_cost', 0),
+            "Receivable": q.get('incremental_revenue', 0),
+            "Revenue": q.get('incremental_revenue', 0),
+            "Cost of Sales": q.get('quarterly_cost', 0),
+            "Profit": q.get('incremental_profit', 0),
+            "Bank/Payables": q.get('quarterly_cost', 0),
+            "Cash Received": q.get('billed', 0),
+        })
+    if ledger_summary:
+        totals = {"Quarter": "Total"}
+        for column in ("Work-in-Progress", "Receivable", "Revenue", "Cost of Sales", "Profit", "Bank/Payables",
+                       "Cash Received"):
+            totals[column] = sum(row[column] for row in ledger_summary)
+        ledger_summary.append(totals)
+
+    return {
+        "analysis": {
+            "transaction_type": f"{'Parallel ' if is_parallel else ''}Istisna'a Contract",
+            "applicable_standard": "AAOIFI FAS 10",
+            "accounting_method": "Percentage of Completion Method",
+        },
+        "variables": extracted_variables,
+        "calculations": result_calculations,
+        "journal_entries": journal_entries,
+        "explanation": "\n".join(_istisna_explanation(calculations)),
+        "ledger_summary": ledger_summary,
+    }
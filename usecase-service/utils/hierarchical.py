@@ -0,0 +1,242 @@
+"""
+Hierarchical retrieval over the standards corpus.
+
+At build time the chunk vectors of every standard, and of every section of
+a standard, are averaged into normalized centroid vectors stored next to the
+index. A query is first compared with the standard centroids, which gives
+a probability per standard and a confidence signal for routing. It is then
+compared with the section centroids of the most likely standards, and the
+chunk search only runs inside the best matching sections.
+"""
+
+import os
+import json
+import base64
+import threading
+import numpy as np
+from .vector_store import search_by_vector
+
+CENTROIDS_FILE = "centroids.json"
+
+# Number of standards and sections whose chunks are searched
+MAX_STANDARDS = 2
+MAX_SECTIONS = 4
+
+# Softmax temperature applied to centroid cosine similarities
+ROUTING_TEMPERATURE = 0.05
+
+# Centroids of served index versions, keyed by version directory
+_centroids_cache = {}
+_centroids_lock = threading.Lock()
+
+def chunk_group(metadata):
+    """
+    Return the metadata field and value identifying the standard a chunk belongs to.
+    Chunks of documents without a detected standard are grouped by file.
+    """
+    if metadata.get("standard"):
+        return "standard", metadata["standard"]
+    return "filename", metadata.get("filename") or metadata.get("source")
+
+def _encode(vector):
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+def _decode(data):
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+def _normalized_mean(vectors):
+    mean = np.mean(vectors, axis=0)
+    norm = np.linalg.norm(mean)
+    return mean / norm if norm > 0 else mean
+
+def build_centroids(db, index_path):
+    """
+    Compute the standard and section centroids of an index and save them alongside it.
+
+    Args:
+        db (Chroma): The index's Chroma store
+        index_path (str): Directory of the index version
+
+    Returns:
+        dict: Number of standard and section centroids written
+    """
+    data = db._collection.get(include=["embeddings", "metadatas"])
+    if data["embeddings"] is None or not len(data["embeddings"]):
+        return {"standards": 0, "sections": 0}
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1)
+
+    standards, sections = {}, {}
+    for position, metadata in enumerate(data["metadatas"]):
+        metadata = metadata or {}
+        group = chunk_group(metadata)
+        standards.setdefault(group, {"standard_type": metadata.get("standard_type"), "positions": []})
+        standards[group]["positions"].append(position)
+        if metadata.get("section"):
+            sections.setdefault((group, metadata["section"]), []).append(position)
+
+    centroids = {
+        "standards": [
+            {"field": field, "value": value, "standard_type": entry["standard_type"],
+             "chunks": len(entry["positions"]), "vector": _encode(_normalized_mean(vectors[entry["positions"]]))}
+            for (field, value), entry in standards.items()
+        ],
+        "sections": [
+            {"field": field, "value": value, "section": section,
+             "chunks": len(positions), "vector": _encode(_normalized_mean(vectors[positions]))}
+            for ((field, value), section), positions in sections.items()
+        ]
+    }
+    path = os.path.join(index_path, CENTROIDS_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(centroids, f)
+    os.replace(f"{path}.tmp", path)
+    return {"standards": len(centroids["standards"]), "sections": len(centroids["sections"])}
+
+def load_centroids(index_path):
+    """
+    Load the centroids of an index version.
+
+    Args:
+        index_path (str): Directory of the index version
+
+    Returns:
+        dict or None: "standards" and "sections" entries with their vectors
+            stacked in "standard_matrix" and "section_matrix", or None if the
+            index has no centroids
+    """
+    with _centroids_lock:
+        if index_path in _centroids_cache:
+            return _centroids_cache[index_path]
+    try:
+        with open(os.path.join(index_path, CENTROIDS_FILE), "r") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        data = None
+    centroids = None
+    if data and data.get("standards"):
+        standard_entries = data["standards"]
+        section_entries = data.get("sections", [])
+        centroids = {
+            "standards": standard_entries,
+            "sections": section_entries,
+            "standard_matrix": np.stack([_decode(entry["vector"]) for entry in standard_entries]),
+            "section_matrix": (np.stack([_decode(entry["vector"]) for entry in section_entries])
+                               if section_entries else None)
+        }
+    with _centroids_lock:
+        _centroids_cache[index_path] = centroids
+    return centroids
+
+def _softmax(similarities):
+    scaled = (similarities - similarities.max()) / ROUTING_TEMPERATURE
+    weights = np.exp(scaled)
+    return weights / weights.sum()
+
+def route_query(query_vector, centroids, standard_type=None, max_standards=MAX_STANDARDS, max_sections=MAX_SECTIONS):
+    """
+    Choose the standards and sections a query should be searched in.
+
+    Args:
+        query_vector (list): The query embedding
+        centroids (dict): Centroids from load_centroids
+        standard_type (str): Optional standard type restricting the candidate standards
+        max_standards (int): Number of standards to search
+        max_sections (int): Number of sections to search
+
+    Returns:
+        dict: "standards" (all standards ranked, with similarity and probability),
+            "sections" (the chosen sections), "confidence" (probability of the top
+            standard) and "margin" (its lead over the second)
+    """
+    vector = np.asarray(query_vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    vector = vector / norm if norm > 0 else vector
+
+    similarities = centroids["standard_matrix"] @ vector
+    probabilities = _softmax(similarities)
+    order = np.argsort(-similarities)
+    ranked = [
+        {
+            "field": centroids["standards"][i]["field"],
+            "value": centroids["standards"][i]["value"],
+            "standard_type": centroids["standards"][i]["standard_type"],
+            "similarity": round(float(similarities[i]), 4),
+            "probability": round(float(probabilities[i]), 4)
+        }
+        for i in order
+    ]
+    candidates = [entry for entry in ranked if not standard_type or entry["standard_type"] == standard_type]
+    if not candidates:
+        candidates = ranked
+    chosen = {(entry["field"], entry["value"]) for entry in candidates[:max_standards]}
+
+    sections = []
+    if centroids["section_matrix"] is not None:
+        section_similarities = centroids["section_matrix"] @ vector
+        for i in np.argsort(-section_similarities):
+            entry = centroids["sections"][i]
+            if (entry["field"], entry["value"]) in chosen:
+                sections.append({
+                    "field": entry["field"],
+                    "value": entry["value"],
+                    "section": entry["section"],
+                    "chunks": entry["chunks"],
+                    "similarity": round(float(section_similarities[i]), 4)
+                })
+                if len(sections) >= max_sections:
+                    break
+
+    top = candidates[0]["probability"]
+    runner_up = candidates[1]["probability"] if len(candidates) > 1 else 0.0
+    return {
+        "standards": ranked,
+        "searched_standards": [{"field": field, "value": value} for field, value in sorted(chosen)],
+        "sections": sections,
+        "confidence": top,
+        "margin": round(top - runner_up, 4)
+    }
+
+def _and(conditions):
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+def _or(conditions):
+    return conditions[0] if len(conditions) == 1 else {"$or": conditions}
+
+def routing_filter(routing, folder=None):
+    """Build the metadata filter restricting a chunk search to the routed sections."""
+    if routing["sections"]:
+        scope = _or([_and([{entry["field"]: entry["value"]}, {"section": entry["section"]}])
+                     for entry in routing["sections"]])
+    else:
+        scope = _or([{entry["field"]: entry["value"]} for entry in routing["searched_standards"]])
+    return _and([scope, {"folder": folder}]) if folder else scope
+
+def hierarchical_search(db, query_vector, k, centroids, standard_type=None, folder=None):
+    """
+    Search the chunks of the sections a query is routed to.
+
+    Falls back to searching the chosen standards, then the whole index, when
+    the routed sections hold fewer than ``k`` matching chunks.
+
+    Args:
+        db: The vector store (any backend of utils.vector_store)
+        query_vector (list): The query embedding
+        k (int): Number of results
+        centroids (dict): Centroids from load_centroids
+        standard_type (str): Optional standard type restricting the search
+        folder (str): Optional folder metadata filter
+
+    Returns:
+        tuple: (list of (Document, relevance score), routing dict)
+    """
+    routing = route_query(query_vector, centroids, standard_type=standard_type)
+    results = search_by_vector(db, query_vector, k=k, filter=routing_filter(routing, folder))
+    if len(results) < k:
+        routing["sections"] = []
+        results = search_by_vector(db, query_vector, k=k, filter=routing_filter(routing, folder))
+    if len(results) < k:
+        routing["searched_standards"] = []
+        results = search_by_vector(db, query_vector, k=k, filter={"folder": folder} if folder else None)
+    return results, routing
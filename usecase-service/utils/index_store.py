@@ -0,0 +1,323 @@
+"""
+Versioned vector index storage for the Islamic Finance API.
+
+Each build of the Chroma database is written to its own directory under
+``<index_root>/versions/`` and promoted by atomically replacing the
+``<index_root>/CURRENT`` pointer file. Readers resolve the pointer on every
+request, so a rebuild never touches the directory that is being served and
+the previous version stays on disk for rollback. A version that is still
+being built carries a build state file, so an interrupted build can be
+resumed instead of restarted.
+
+Several indexes can be served side by side (for example a MiniLM index next
+to the default mpnet one): the default index lives in ``<index_root>`` and
+every other named index in ``<index_root>/indexes/<name>/`` with its own
+versions and pointer. Each manifest records the embedding fingerprint
+(model name, dimension and normalization) the index was built with.
+"""
+
+import os
+import re
+import json
+import shutil
+import threading
+from datetime import datetime
+from .constants import CHROMA_PATH
+
+POINTER_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+MANIFEST_FILE = "index_manifest.json"
+BUILD_STATE_FILE = "build_state.json"  # Present only while a version is being built
+LEGACY_DB_FILE = "chroma.sqlite3"
+INDEXES_DIR = "indexes"
+DEFAULT_INDEX_NAME = "default"
+
+# Number of versions kept on disk after a promotion (current + previous)
+KEEP_VERSIONS = 2
+
+# Parsed pointer, reused while the pointer file's mtime is unchanged
+_pointer_cache = {}
+_pointer_lock = threading.Lock()
+
+# Embedding fingerprints of index versions, keyed by version directory
+_fingerprint_cache = {}
+
+def index_root_path(index_name=None, index_root=CHROMA_PATH):
+    """
+    Return the root directory of a named index.
+
+    Args:
+        index_name (str): Index name; None or "default" for the default index
+        index_root (str): Root directory of the default index
+
+    Returns:
+        str: Root directory of the index
+
+    Raises:
+        ValueError: If the name is not a valid index name
+    """
+    if not index_name or index_name == DEFAULT_INDEX_NAME:
+        return index_root
+    if not re.fullmatch(r"[A-Za-z0-9][A-Za-z0-9_.-]*", index_name):
+        raise ValueError(f"Invalid index name: {index_name!r}")
+    return os.path.join(index_root, INDEXES_DIR, index_name)
+
+def list_index_names(index_root=CHROMA_PATH):
+    """Return the names of all indexes that have a servable version."""
+    names = [DEFAULT_INDEX_NAME] if resolve_index_path(index_root) else []
+    indexes_root = os.path.join(index_root, INDEXES_DIR)
+    if os.path.isdir(indexes_root):
+        for name in sorted(os.listdir(indexes_root)):
+            if resolve_index_path(os.path.join(indexes_root, name)):
+                names.append(name)
+    return names
+
+def read_pointer(index_root=CHROMA_PATH):
+    """
+    Read the pointer to the currently promoted index version.
+
+    Args:
+        index_root (str): Root directory of the index
+
+    Returns:
+        dict or None: Pointer with "version", "previous" and "promoted_at", or None if absent
+    """
+    pointer_path = os.path.join(index_root, POINTER_FILE)
+    try:
+        mtime = os.stat(pointer_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _pointer_lock:
+        cached = _pointer_cache.get(pointer_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    try:
+        with open(pointer_path, "r") as f:
+            pointer = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    with _pointer_lock:
+        _pointer_cache[pointer_path] = (mtime, pointer)
+    return pointer
+
+def version_path(version, index_root=CHROMA_PATH):
+    """Return the directory holding an index version."""
+    return os.path.join(index_root, VERSIONS_DIR, version)
+
+def resolve_index_path(index_root=CHROMA_PATH):
+    """
+    Resolve the directory of the index that should currently be served.
+
+    Falls back to an unversioned database stored directly in ``index_root``
+    (as written by older versions of create_database.py).
+
+    Args:
+        index_root (str): Root directory of the index
+
+    Returns:
+        str or None: Path of the served index, or None if no index exists
+    """
+    pointer = read_pointer(index_root)
+    if pointer and pointer.get("version"):
+        path = version_path(pointer["version"], index_root)
+        if os.path.isdir(path):
+            return path
+    if os.path.exists(os.path.join(index_root, LEGACY_DB_FILE)):
+        return index_root
+    return None
+
+def list_versions(index_root=CHROMA_PATH):
+    """Return the version names found on disk, oldest first."""
+    versions_root = os.path.join(index_root, VERSIONS_DIR)
+    if not os.path.isdir(versions_root):
+        return []
+    return sorted(name for name in os.listdir(versions_root)
+                  if os.path.isdir(os.path.join(versions_root, name)))
+
+def create_version(index_root=CHROMA_PATH, base_path=None):
+    """
+    Create a new, unpromoted version directory.
+
+    Args:
+        index_root (str): Root directory of the index
+        base_path (str): Optional existing index to copy as the starting point
+
+    Returns:
+        tuple: (version name, version directory)
+    """
+    version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = version_path(version, index_root)
+    if base_path:
+        shutil.copytree(base_path, path, ignore=shutil.ignore_patterns(VERSIONS_DIR, POINTER_FILE, INDEXES_DIR))
+    else:
+        os.makedirs(path)
+    return version, path
+
+def write_pointer(pointer, index_root=CHROMA_PATH):
+    """Atomically replace the pointer file."""
+    pointer_path = os.path.join(index_root, POINTER_FILE)
+    tmp_path = f"{pointer_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(pointer, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, pointer_path)
+
+def promote_version(version, index_root=CHROMA_PATH):
+    """
+    Make a version the served index, keeping the current one as rollback target.
+
+    Args:
+        version (str): The version to promote
+        index_root (str): Root directory of the index
+
+    Returns:
+        dict: The new pointer
+    """
+    current = read_pointer(index_root)
+    pointer = {
+        "version": version,
+        "previous": current.get("version") if current else None,
+        "promoted_at": datetime.now().isoformat()
+    }
+    write_pointer(pointer, index_root)
+    return pointer
+
+def rollback_version(index_root=CHROMA_PATH):
+    """
+    Swap the served index back to the previous version.
+
+    Args:
+        index_root (str): Root directory of the index
+
+    Returns:
+        dict: The new pointer
+
+    Raises:
+        ValueError: If there is no previous version to roll back to
+    """
+    current = read_pointer(index_root)
+    if not current or not current.get("previous"):
+        raise ValueError("No previous index version to roll back to.")
+    if not os.path.isdir(version_path(current["previous"], index_root)):
+        raise ValueError(f"Previous index version {current['previous']} no longer exists.")
+    pointer = {
+        "version": current["previous"],
+        "previous": current["version"],
+        "promoted_at": datetime.now().isoformat()
+    }
+    write_pointer(pointer, index_root)
+    return pointer
+
+def prune_versions(index_root=CHROMA_PATH, keep=KEEP_VERSIONS):
+    """
+    Delete old versions, never touching the current or previous one.
+
+    Args:
+        index_root (str): Root directory of the index
+        keep (int): Number of most recent versions to keep
+
+    Returns:
+        list: Names of the deleted versions
+    """
+    pointer = read_pointer(index_root) or {}
+    protected = {pointer.get("version"), pointer.get("previous")}
+    versions = list_versions(index_root)
+    removable = [v for v in versions[:-keep] if v not in protected] if keep > 0 else []
+    for version in removable:
+        shutil.rmtree(version_path(version, index_root), ignore_errors=True)
+    return removable
+
+def write_build_state(index_path, state):
+    """Mark a version directory as being built."""
+    tmp_path = os.path.join(index_path, f"{BUILD_STATE_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, os.path.join(index_path, BUILD_STATE_FILE))
+
+def read_build_state(index_path):
+    """Return the build state of a version, or None if the build has finished."""
+    try:
+        with open(os.path.join(index_path, BUILD_STATE_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def finish_build(index_path):
+    """Clear the build state of a version once it is complete."""
+    try:
+        os.remove(os.path.join(index_path, BUILD_STATE_FILE))
+    except FileNotFoundError:
+        pass
+
+def find_resumable_version(base_version, embedding_model, index_root=CHROMA_PATH):
+    """
+    Find the most recent unfinished build started from the same base.
+
+    Args:
+        base_version (str): Version the build started from (None for a fresh build)
+        embedding_model (str): Embedding model of the build
+        index_root (str): Root directory of the index
+
+    Returns:
+        tuple or None: (version name, version directory)
+    """
+    served = (read_pointer(index_root) or {}).get("version")
+    for version in reversed(list_versions(index_root)):
+        if version == served:
+            continue
+        path = version_path(version, index_root)
+        state = read_build_state(path)
+        if (state and state.get("base_version") == base_version
+                and state.get("embedding_model") == embedding_model):
+            return version, path
+    return None
+
+def load_manifest(index_path):
+    """Load the manifest stored alongside an index, or None if missing."""
+    if not index_path:
+        return None
+    manifest_path = os.path.join(index_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def read_fingerprint(index_path):
+    """
+    Return the embedding fingerprint an index version was built with.
+
+    Args:
+        index_path (str): Directory of the index version
+
+    Returns:
+        dict or None: "model", "dimension" and "normalized" (the last two may be
+            None for indexes built before they were recorded), or None if unknown
+    """
+    if index_path in _fingerprint_cache:
+        return _fingerprint_cache[index_path]
+    manifest = load_manifest(index_path)
+    fingerprint = None
+    if manifest and manifest.get("embedding_model"):
+        embedding = manifest.get("embedding") or {}
+        fingerprint = {
+            "model": embedding.get("model", manifest["embedding_model"]),
+            "dimension": embedding.get("dimension"),
+            "normalized": embedding.get("normalized")
+        }
+    # Promoted versions never change, but versions still being built do
+    if read_build_state(index_path) is None:
+        _fingerprint_cache[index_path] = fingerprint
+    return fingerprint
+
+def save_manifest(index_path, manifest):
+    """Atomically write the manifest stored alongside an index."""
+    os.makedirs(index_path, exist_ok=True)
+    manifest_path = os.path.join(index_path, MANIFEST_FILE)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
@@ -0,0 +1,155 @@
+"""
+Chat model construction for the Islamic Finance API.
+"""
+
+import os
+import logging
+from functools import lru_cache
+from langchain_together import ChatTogether
+from langchain_google_genai import ChatGoogleGenerativeAI
+from .constants import (
+    API_METHOD, TOGETHER_MODEL, GEMINI_MODEL, LLM_JSON_MODE,
+    LLM_VARIABLE_EXTRACTION, VARIABLE_EXTRACTION_MODEL, VARIABLE_EXTRACTION_CACHE_SIZE
+)
+from .schema import USECASE_RESPONSE_SCHEMA, load_structured_response, load_variable_values
+
+logger = logging.getLogger("islamic_finance_api")
+
+def create_llm(llm_model=None, temperature=0.3, json_schema=None):
+    """
+    Create the chat model of the configured LLM API (Gemini or Together AI).
+
+    Args:
+        llm_model (str, optional): The model name; defaults to the API's default model
+        temperature (float): The sampling temperature
+        json_schema (dict, optional): Request a JSON answer following this JSON schema.
+            The provider's JSON mode is enabled when LLM_JSON_MODE is set; the prompt
+            must describe the schema either way, as not every model enforces it
+
+    Returns:
+        BaseChatModel: The LangChain chat model
+    """
+    if llm_model is None:
+        llm_model = TOGETHER_MODEL if API_METHOD == "together" else GEMINI_MODEL
+    json_mode = json_schema is not None and LLM_JSON_MODE
+
+    if API_METHOD == "together":
+        # Together's OpenAI-compatible JSON mode constrains decoding to the schema
+        model_kwargs = {"response_format": {"type": "json_object", "schema": json_schema}} if json_mode else {}
+        return ChatTogether(
+            model=llm_model,
+            temperature=temperature,
+            together_api_key=os.getenv("TOGETHER_API_KEY"),
+            model_kwargs=model_kwargs
+        )
+    # Use Gemini
+    if json_mode:
+        return ChatGoogleGenerativeAI(
+            model=llm_model,
+            temperature=temperature,
+            google_api_key=os.getenv("GOOGLE_API_KEY"),
+            response_mime_type="application/json"
+        )
+    return ChatGoogleGenerativeAI(
+        model=llm_model,
+        temperature=temperature,
+        google_api_key=os.getenv("GOOGLE_API_KEY")
+    )
+
+def invoke_llm(llm, prompt):
+    """Invoke a chat model and return the text of its answer."""
+    response = llm.invoke(prompt)
+    return response.content if hasattr(response, "content") else str(response)
+
+def generate_structured_response(prompt, llm_model=None, temperature=0.3, retries=1):
+    """
+    Ask the LLM for a structured answer, retrying with the validation error when it is invalid.
+
+    Args:
+        prompt (str): The formatted prompt, ending with STRUCTURED_OUTPUT_INSTRUCTIONS
+        llm_model (str, optional): The model name
+        temperature (float): The sampling temperature
+        retries (int): Further attempts after an invalid answer
+
+    Returns:
+        tuple: (the LLM's output, the validated answer)
+
+    Raises:
+        ValueError: If no attempt returned a valid answer
+    """
+    llm = create_llm(llm_model, temperature, json_schema=USECASE_RESPONSE_SCHEMA)
+    attempt_prompt = prompt
+    for attempt in range(retries + 1):
+        response_text = invoke_llm(llm, attempt_prompt)
+        try:
+            return response_text, load_structured_response(response_text)
+        except ValueError as e:
+            if attempt == retries:
+                raise
+            logger.warning(f"Retrying an invalid structured response: {str(e)}")
+            attempt_prompt = (f"{prompt}\n\nYOUR PREVIOUS ANSWER WAS INVALID ({str(e)}). "
+                              "ANSWER AGAIN WITH ONLY THE JSON OBJECT.")
+
+VARIABLE_EXTRACTION_PROMPT = """Extract the following variables from the Islamic finance scenario below.
+
+ANSWER WITH A SINGLE JSON OBJECT HOLDING ONE PROPERTY PER VARIABLE: its value as a plain number (amounts without currency symbols or thousands separators, rates in percent, terms in the unit given), or null when the scenario does not state it. Do not calculate or assume any value.
+
+VARIABLES:
+{variables}
+
+SCENARIO:
+{scenario}
+"""
+
+def _variable_extraction_schema(fields):
+    """JSON schema of the variable values; null must stay allowed, or a constrained model invents a value."""
+    return {
+        "type": "object",
+        "properties": {
+            name: {"type": ["number", "null"], "description": description} for name, description in fields
+        },
+    }
+
+@lru_cache(maxsize=VARIABLE_EXTRACTION_CACHE_SIZE)
+def _extract_variable_values(query_text, fields, llm_model):
+    prompt = VARIABLE_EXTRACTION_PROMPT.format(
+        variables="\n".join(f"- {name}: {description}" for name, description in fields),
+        scenario=query_text
+    )
+    json_schema = _variable_extraction_schema(fields)
+    response_text = invoke_llm(create_llm(llm_model, temperature=0, json_schema=json_schema), prompt)
+    return tuple(load_variable_values(response_text, [name for name, _description in fields]).items())
+
+def fill_missing_variables(query_text, variables, descriptions, required, llm_model=None):
+    """
+    Ask the LLM for the calculator variables that the label maps did not extract.
+
+    Only partial extractions are completed: when no variable was found the
+    scenario is not a numeric one, and when all the required variables were
+    found the calculator already has what it needs. Only the missing
+    variables are requested, so the call is short; its values are cached by
+    the exact text of the query.
+
+    Args:
+        query_text (str): The scenario
+        variables (dict): The variables extracted by the label maps
+        descriptions (dict): What each variable of the calculator is, by name
+        required: The names of the variables the calculator needs
+        llm_model (str, optional): The model name; VARIABLE_EXTRACTION_MODEL takes precedence
+
+    Returns:
+        dict: The variables, with those the LLM found added. When the call
+              fails the variables are returned as they were
+    """
+    if not LLM_VARIABLE_EXTRACTION or not variables or all(name in variables for name in required):
+        return variables
+    fields = tuple((name, description) for name, description in descriptions.items() if name not in variables)
+    try:
+        values = dict(_extract_variable_values(query_text, fields, VARIABLE_EXTRACTION_MODEL or llm_model))
+    except Exception as e:
+        logger.warning(f"LLM variable extraction failed: {str(e)}")
+        return variables
+    # Amounts, rates and terms are never negative
+    values = {name: value for name, value in values.items() if value >= 0}
+    logger.debug(f"Variables extracted by the LLM: {values}")
+    return {**variables, **values}
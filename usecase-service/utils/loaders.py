@@ -0,0 +1,153 @@
+"""
+Document loading utilities for building the vector database.
+
+PDF and DOCX files are parsed in a process pool. The extracted page text of
+every file is cached on disk under its content hash, so re-runs (including
+rebuilds with a different embedding model) never parse an unchanged file
+twice.
+"""
+
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from langchain.schema import Document
+
+PARSED_TEXT_CACHE_DIR = ".parsed_cache"
+
+# Files submitted per worker before waiting for parsed results to be consumed
+MAX_IN_FLIGHT_PER_WORKER = 2
+
+# Bump when the extraction logic changes so stale cache entries are ignored
+PARSER_VERSION = 1
+
+def parsed_cache_path(file_hash, cache_dir=PARSED_TEXT_CACHE_DIR):
+    """Return the cache file holding the parsed pages of a file."""
+    return os.path.join(cache_dir, f"{file_hash}.v{PARSER_VERSION}.json")
+
+def parse_file(file_path, file_hash, cache_dir=PARSED_TEXT_CACHE_DIR):
+    """
+    Extract the pages of a PDF or DOCX file, using the parsed-text cache when possible.
+    Runs in a worker process, so it only returns plain data.
+
+    Args:
+        file_path (str): Path of the document
+        file_hash (str): Content hash of the document
+        cache_dir (str): Directory of the parsed-text cache
+
+    Returns:
+        dict: "pages" (list of {"text", "metadata"}) and per-file "stats"
+    """
+    start = time.perf_counter()
+    cache_file = parsed_cache_path(file_hash, cache_dir)
+    cache_hit = False
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            pages = json.load(f)
+        cache_hit = True
+    except (OSError, json.JSONDecodeError):
+        if file_path.lower().endswith(".pdf"):
+            from langchain_community.document_loaders import PyPDFLoader
+            loader = PyPDFLoader(file_path)
+        else:
+            from langchain_community.document_loaders import Docx2txtLoader
+            loader = Docx2txtLoader(file_path)
+        pages = [
+            {"text": doc.page_content, "metadata": {k: v for k, v in doc.metadata.items() if k != "source"}}
+            for doc in loader.load()
+        ]
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(pages, f)
+        os.replace(tmp_file, cache_file)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "pages": pages,
+        "stats": {
+            "file": file_path,
+            "pages": len(pages),
+            "chars": sum(len(page["text"]) for page in pages),
+            "bytes": os.path.getsize(file_path),
+            "seconds": elapsed,
+            "cache_hit": cache_hit
+        }
+    }
+
+def file_metadata(file_path, data_path):
+    """Return the folder/source/filename metadata attached to every page of a file."""
+    rel_path = os.path.relpath(os.path.dirname(file_path), data_path)
+    if rel_path == ".":  # File is directly in data_path
+        rel_path = "root"
+    return {
+        "folder": rel_path,
+        "source": file_path,
+        "filename": os.path.basename(file_path)
+    }
+
+def iter_loaded_files(data_path, file_hashes, workers=None, cache_dir=PARSED_TEXT_CACHE_DIR):
+    """
+    Parse files in a process pool and yield them as they complete.
+    New files are only submitted as results are consumed.
+
+    Args:
+        data_path (str): Root data directory, used for folder metadata
+        file_hashes (dict): File path -> content hash of the files to load
+        workers (int): Number of worker processes (default: CPU count)
+        cache_dir (str): Directory of the parsed-text cache
+
+    Yields:
+        tuple: (file path, list of Document pages, stats dict); pages is empty on error
+    """
+    if not file_hashes:
+        return
+    workers = max(1, min(workers or os.cpu_count() or 1, len(file_hashes)))
+    queue = iter(file_hashes.items())
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+
+        def submit_next():
+            for path, file_hash in queue:
+                futures[executor.submit(parse_file, path, file_hash, cache_dir)] = path
+                return
+
+        # Only a bounded number of parsed files waits for the consumer
+        for _ in range(workers * MAX_IN_FLIGHT_PER_WORKER):
+            submit_next()
+        while futures:
+            done, _pending = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = futures.pop(future)
+                try:
+                    parsed = future.result()
+                except Exception as e:
+                    submit_next()
+                    yield path, [], {"file": path, "error": str(e)}
+                    continue
+                submit_next()
+                metadata = file_metadata(path, data_path)
+                documents = [
+                    Document(page_content=page["text"], metadata={**page["metadata"], **metadata})
+                    for page in parsed["pages"]
+                ]
+                yield path, documents, parsed["stats"]
+
+def print_load_stats(all_stats, wall_seconds):
+    """Print per-file and overall parsing throughput."""
+    print(f"{'File':<48} {'Pages':>6} {'Chars':>10} {'Time(s)':>8} {'Pages/s':>8}  Cache")
+    for stats in sorted(all_stats, key=lambda s: s["file"]):
+        name = os.path.basename(stats["file"])[:48]
+        if "error" in stats:
+            print(f"{name:<48} error: {stats['error']}")
+            continue
+        rate = stats["pages"] / stats["seconds"] if stats["seconds"] > 0 else 0
+        print(f"{name:<48} {stats['pages']:>6} {stats['chars']:>10} {stats['seconds']:>8.2f} "
+              f"{rate:>8.1f}  {'hit' if stats['cache_hit'] else 'miss'}")
+    loaded = [s for s in all_stats if "error" not in s]
+    total_pages = sum(s["pages"] for s in loaded)
+    total_mb = sum(s["bytes"] for s in loaded) / (1024 * 1024)
+    hits = sum(1 for s in loaded if s["cache_hit"])
+    rate = total_pages / wall_seconds if wall_seconds > 0 else 0
+    print(f"Parsed {len(loaded)} files ({total_pages} pages, {total_mb:.1f} MB) in {wall_seconds:.2f}s: "
+          f"{rate:.1f} pages/s, {hits} cache hits, {len(all_stats) - len(loaded)} errors")
@@ -0,0 +1,295 @@
+"""
+Single-pass numeric extraction for scenario texts.
+
+The text is walked once to find every number, with its position, the
+currency written in front of it and the text following it (units such
+as "%", "years" or "monthly"). A second scan over the lowercased text
+records where every label phrase of a standard occurs. Fields are then
+assigned from a per-standard label map: a field takes the first number
+of the right kind following one of its labels on the same line, as the
+former ``label.*?CURRENCY amount`` regexes did, but without rescanning
+the text for every field. All patterns are compiled at import and
+none can backtrack past a run of whitespace, so extraction time grows
+linearly with the text.
+"""
+
+import re
+from bisect import bisect_left
+from collections import namedtuple
+
+CURRENCIES = ("$", "usd", "sar", "aed", "eur", "gbp")
+
+# Numbers as written in scenarios (450,000 / 1.5 / 2,000,000.00), with the currency written before them
+# (the leading lookahead lets the engine skip other characters without trying the currency alternation)
+_NUMBER = re.compile(r"(?=[$usaeg0-9])(?:(\$|usd|sar|aed|eur|gbp)[,\s]*)?([0-9][0-9,.]*)")
+
+# Text following a number kept for unit matching (after the whitespace that follows it)
+_SUFFIX_WINDOW = 16
+_SPACES = re.compile(r"\s*")
+_NEWLINE = re.compile(r"\n")
+
+# Text preceding a number kept for prefix rules such as "Price: $"
+_PREFIX_WINDOW = 24
+
+NumericToken = namedtuple(
+    "NumericToken", ["value", "text", "start", "end", "currency", "currency_start", "prefix", "suffix"]
+)
+
+def parse_number(text):
+    """Parse a number written with thousands separators; None if it is malformed (e.g. "1.2.3")."""
+    try:
+        return float(text.replace(",", ""))
+    except ValueError:
+        return None
+
+def tokenize_numbers(text, lower=None):
+    """
+    Find every number in a text with the context needed to assign it to a field.
+
+    Args:
+        text (str): The scenario text
+        lower (str): ``text.lower()`` if the caller already has it
+
+    Returns:
+        list: NumericToken tuples in text order. ``currency`` is the currency
+            written before the number (or None) and ``currency_start`` where it
+            starts; ``prefix`` and ``suffix`` are the lowercased text just before
+            the number and just after it (the whitespace after it included, so
+            unit patterns decide how much of it they allow).
+    """
+    lower = text.lower() if lower is None else lower
+    tokens = []
+    for match in _NUMBER.finditer(lower):
+        number = match.group(2)
+        start, end = match.span(2)
+        suffix_start = _SPACES.match(lower, end).end()
+        tokens.append(NumericToken(
+            value=parse_number(number),
+            text=number,
+            start=start,
+            end=end,
+            currency=match.group(1),
+            currency_start=match.start(1) if match.group(1) else None,
+            prefix=lower[start - _PREFIX_WINDOW if start > _PREFIX_WINDOW else 0:start],
+            suffix=lower[end:suffix_start + _SUFFIX_WINDOW]
+        ))
+    return tokens
+
+def _label_phrases(field_map):
+    """Collect every label phrase used by a field map."""
+    phrases = set()
+    for specs in field_map.values():
+        for spec in specs:
+            for label in spec.get("labels", ()):
+                if isinstance(label, str):
+                    phrases.add(label)
+                else:
+                    for group in label:
+                        phrases.update(group)
+            phrases.update(spec.get("followed_by", ()))
+    return phrases
+
+def compile_label_scanner(field_map):
+    """
+    Compile the label scanner of a field map.
+
+    The scanner is a lookahead over the alternation of every label phrase,
+    so overlapping phrases ("purchase price" inside "purchase price at
+    end") are all found in one pass.
+
+    Args:
+        field_map (dict): Field name -> list of field specs (see extract_fields)
+
+    Returns:
+        tuple: (compiled pattern, phrase -> the phrases it starts with, itself included)
+    """
+    phrases = sorted(_label_phrases(field_map), key=len, reverse=True)
+    if not phrases:
+        return None, {}
+    pattern = re.compile("(?=(" + "|".join(re.escape(phrase) for phrase in phrases) + "))")
+    prefixes = {phrase: [other for other in phrases if phrase.startswith(other)] for phrase in phrases}
+    return pattern, prefixes
+
+def scan_labels(lower_text, scanner):
+    """
+    Find every occurrence of every label phrase.
+
+    Args:
+        lower_text (str): The lowercased text
+        scanner (tuple): Result of compile_label_scanner
+
+    Returns:
+        dict: Phrase -> list of (start, end) occurrences in text order
+    """
+    pattern, prefixes = scanner
+    occurrences = {}
+    if pattern is None:
+        return occurrences
+    for match in pattern.finditer(lower_text):
+        start = match.start()
+        # The lookahead reports the longest phrase at a position; the phrases it starts with start there too
+        for phrase in prefixes[match.group(1)]:
+            occurrences.setdefault(phrase, []).append((start, start + len(phrase)))
+    return occurrences
+
+def _first_after(occurrences, phrases, position, limit):
+    """Earliest occurrence of any of the phrases starting in [position, limit)."""
+    best = None
+    for phrase in phrases:
+        spans = occurrences.get(phrase)
+        if not spans:
+            continue
+        index = bisect_left(spans, (position, -1))
+        if index < len(spans) and spans[index][0] < limit and (best is None or spans[index] < best):
+            best = spans[index]
+    return best
+
+def _label_candidates(labels, occurrences, line_end):
+    """
+    Return the spans of every label occurrence, leftmost first, ties in label order.
+
+    A label is a phrase, or a sequence of phrase groups that must occur in
+    order on one line ("expected ... value").
+    """
+    candidates = []
+    for order, label in enumerate(labels):
+        if isinstance(label, str):
+            candidates.extend((start, order, end) for start, end in occurrences.get(label, ()))
+            continue
+        for phrase in label[0]:
+            for start, end in occurrences.get(phrase, ()):
+                limit = line_end(start)
+                for group in label[1:]:
+                    found = _first_after(occurrences, group, end, limit)
+                    if found is None:
+                        break
+                    end = found[1]
+                else:
+                    candidates.append((start, order, end))
+    candidates.sort()
+    return [(start, end) for start, _order, end in candidates]
+
+def _token_matches(token, spec):
+    if spec.get("amount") and token.currency is None:
+        return False
+    if spec.get("integer") and "." in token.text.rstrip("."):
+        return False
+    if "unit" in spec and not spec["unit"].match(token.suffix):
+        return False
+    if "before" in spec and not spec["before"].search(token.prefix):
+        return False
+    return True
+
+def _next_match(spec, tokens, following, index):
+    """
+    Index of the first token from ``index`` on that matches a spec (len(tokens) if none).
+
+    ``following`` caches the answer for every token already walked over, so
+    the label candidates of a spec share one walk over the tokens instead of
+    each rescanning the rest of its line.
+    """
+    walked = []
+    while index < len(tokens) and following[index] is None:
+        if _token_matches(tokens[index], spec):
+            following[index] = index
+            break
+        walked.append(index)
+        index += 1
+    found = following[index] if index < len(tokens) else len(tokens)
+    for position in walked:
+        following[position] = found
+    return found
+
+def _first_token(spec, tokens, starts, following, position, limit):
+    """
+    First token matching a spec whose anchor lies in [position, limit).
+
+    The anchor is the currency for amounts and the number otherwise;
+    ``starts`` holds both (currency anchors, number starts) in text order,
+    and ``following`` is the spec's cache for _next_match.
+    """
+    anchors, numbers = starts
+    anchors = anchors if spec.get("amount") else numbers
+    index = bisect_left(anchors, position)
+    if index == len(tokens) or anchors[index] >= limit:
+        return None
+    index = _next_match(spec, tokens, following, index)
+    if index < len(tokens) and anchors[index] < limit:
+        return tokens[index]
+    return None
+
+def _find_value(spec, tokens, starts, occurrences, line_end):
+    """
+    Return the token a single field spec assigns, None if it does not apply.
+
+    Like the ``label.*?value`` regexes this replaces, a label only pairs with
+    a value on its own line, and when the first label has none the next
+    occurrence is tried.
+    """
+    following = [None] * len(tokens)
+    if not spec.get("labels"):
+        return _first_token(spec, tokens, starts, following, 0, float("inf"))
+    for position, label_end in _label_candidates(spec["labels"], occurrences, line_end):
+        limit = line_end(position)
+        token = _first_token(spec, tokens, starts, following, label_end, limit)
+        if token is None:
+            continue
+        if spec.get("followed_by") and _first_after(occurrences, spec["followed_by"], token.end, limit) is None:
+            # Later values on the line are not followed by it either
+            continue
+        return token
+    return None
+
+def _unit_scale(spec, token):
+    """Factor of the unit written after a token, from the spec's ``scale`` (1 without one)."""
+    if "scale" not in spec:
+        return 1
+    unit = spec["unit"].match(token.suffix).group(0).strip()
+    return next((factor for word, factor in spec["scale"].items() if unit.startswith(word)), 1)
+
+def extract_fields(text, field_map, scanner=None, tokens=None):
+    """
+    Assign the numbers of a text to the fields of a label map.
+
+    Each field has a list of specs tried in order until one assigns a value.
+    A spec may contain:
+        labels: phrases (or sequences of phrase groups) the number must follow
+        amount: True if the number must be preceded by a currency
+        integer: True if the number must be a whole number (counts)
+        unit: compiled pattern the text after the number must start with
+        before: compiled pattern the text just before the number must end with
+        followed_by: phrases that must occur somewhere after the number
+        scale: unit word -> factor the number is multiplied by when the unit
+            text starts with that word (e.g. {"year": 12} for months)
+
+    Args:
+        text (str): The scenario text
+        field_map (dict): Field name -> list of specs
+        scanner (tuple): Precompiled label scanner of the map (compiled if omitted)
+        tokens (list): Tokens of the text from tokenize_numbers, to share between maps
+
+    Returns:
+        dict: Field name -> float for every field found
+    """
+    scanner = scanner or compile_label_scanner(field_map)
+    lower = text.lower()
+    tokens = tokenize_numbers(text, lower) if tokens is None else tokens
+    starts = ([token.currency_start if token.currency else token.start for token in tokens],
+              [token.start for token in tokens])
+    occurrences = scan_labels(lower, scanner)
+    newlines = [match.start() for match in _NEWLINE.finditer(text)]
+
+    def line_end(position):
+        index = bisect_left(newlines, position)
+        return newlines[index] if index < len(newlines) else len(text)
+
+    values = {}
+    for field, specs in field_map.items():
+        for spec in specs:
+            token = _find_value(spec, tokens, starts, occurrences, line_end)
+            if token is not None:
+                # A malformed number ends the search for the field, as a failed float() did
+                if token.value is not None:
+                    values[field] = token.value * _unit_scale(spec, token)
+                break
+    return values
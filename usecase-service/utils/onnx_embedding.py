@@ -0,0 +1,110 @@
+"""
+ONNX Runtime embedding backend for the Islamic Finance API.
+
+Runs a sentence-transformer exported by export_onnx_model.py (optionally
+int8-quantized) with ONNX Runtime and the Rust ``tokenizers`` library, so
+embedding needs neither PyTorch nor sentence-transformers at runtime. The
+export records the model's pooling mode, normalization and maximum
+sequence length, and this module reproduces them.
+"""
+
+import os
+import json
+import numpy as np
+from .constants import ONNX_MODELS_PATH
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_TOKENIZER_FILE = "tokenizer.json"
+ONNX_CONFIG_FILE = "onnx_config.json"
+
+def onnx_model_dir(model_name, quantized=False, models_path=None):
+    """
+    Return the directory an exported model is stored in.
+
+    Args:
+        model_name (str): HuggingFace model name
+        quantized (bool): Whether the int8-quantized export is wanted
+        models_path (str): Root directory of ONNX exports (default: ONNX_MODELS_PATH)
+
+    Returns:
+        str: The model directory
+    """
+    name = model_name.replace("/", "__") + ("-int8" if quantized else "")
+    return os.path.join(models_path or ONNX_MODELS_PATH, name)
+
+class OnnxEmbeddings:
+    """Sentence embeddings computed with ONNX Runtime; a drop-in for HuggingFaceEmbeddings."""
+
+    def __init__(self, model_dir, batch_size=32, threads=None):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise ImportError("The onnx embedding backend requires onnxruntime and tokenizers "
+                              "(pip install onnxruntime tokenizers)")
+        config_path = os.path.join(model_dir, ONNX_CONFIG_FILE)
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(f"No ONNX model found at {model_dir}. Please run export_onnx_model.py first.")
+        with open(config_path, "r") as f:
+            self.config = json.load(f)
+        self.batch_size = batch_size
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, ONNX_TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILE), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def _embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+
+        pooling = self.config["pooling"]
+        if pooling == "cls":
+            vectors = hidden[:, 0]
+        elif pooling == "max":
+            vectors = np.where(mask[:, :, None] > 0, hidden, -1e9).max(axis=1)
+        else:
+            weights = mask[:, :, None].astype(hidden.dtype)
+            vectors = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self.config["normalize"]:
+            vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+    def embed_documents(self, texts):
+        """
+        Embed a list of texts.
+
+        Texts are batched by length so little time is spent on padding.
+
+        Args:
+            texts (list): The texts
+
+        Returns:
+            list: One embedding vector (list of floats) per text
+        """
+        texts = [text.replace("\n", " ") for text in texts]
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            positions = order[start:start + self.batch_size]
+            for position, vector in zip(positions, self._embed_batch([texts[i] for i in positions])):
+                vectors[position] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        """Embed a single query."""
+        return self.embed_documents([text])[0]
@@ -1,8 +1,159 @@
 """
 Parsing utilities for the Islamic Finance API.
+
+A response is tokenized once (tokenize_response): a single pass records
+where every section heading, table header, calculation label and ledger
+row label starts, and the fields are then matched in place at those
+landmarks instead of each pattern searching the whole response again.
+The matching uses linear-time scans (see utils.text_scan): every pattern
+below either has a bounded amount of backtracking per position or is only
+tried once per line, and responses longer than MAX_RESPONSE_CHARS are
+only parsed up to that length.
 """
 
 import re
+from bisect import bisect_left
+from .constants import MAX_RESPONSE_CHARS
+from .text_scan import (
+    _line_end, cap_text, find_between, find_ledger_entries, first_per_line, matches_at, search_chain_at,
+    search_per_line
+)
+
+# Where the anchors of the patterns below can start, as (family, beginnings,
+# ignore case): each family lists the common beginnings of the anchors that
+# name it, and families never start at the same position
+_LANDMARK_FAMILIES = [
+    ("analysis", ["ANALYSIS", "Initial Recognition"], False),
+    ("extracted", ["EXTRACTED VARIABLES"], False),
+    ("calculations", ["CALCULATIONS"], False),
+    ("journal", ["JOURNAL", "Journal"], False),
+    ("determine", ["Determine"], False),
+    ("explanation", ["EXPLANATION"], False),
+    ("poc_table", ["Quarter"], False),
+    # Calculation labels and ledger rows match in any case
+    ("prime_cost", [r"prime cost", r"purchase \+"], True),
+    ("less", ["less"], True),
+    ("total_rentals", ["total rentals"], True),
+    ("deferred", ["deferred ijarah cost"], True),
+    ("terminal", ["terminal value difference"], True),
+    ("amortizable", ["amortizable amount"], True),
+    ("profit", ["profit"], True),
+    ("quarter", ["q[1-4]"], True),
+    ("payment", [r"payment [1-4]"], True),
+]
+
+def _landmark_pattern(families):
+    """
+    One regex finding every landmark, and the family of each of its groups.
+
+    Each branch consumes the literal first letter of a beginning and checks
+    the rest with a lookahead, so the regex engine can skip to candidate
+    letters and landmarks starting inside another one are still found
+    ("Terminal value difference" inside "Less Terminal Value Difference").
+    An empty group after each branch tells which one matched.
+    """
+    branches, names = [], []
+    for name, beginnings, ignore_case in families:
+        for beginning in beginnings:
+            first, rest = beginning[0], beginning[1:]
+            for letter in sorted({first.lower(), first.upper()} if ignore_case else {first}):
+                branches.append(letter + "(?=" + (f"(?i:{rest})" if ignore_case else rest) + ")()")
+                names.append(name)
+    return re.compile("|".join(branches)), names
+
+_LANDMARKS, _LANDMARK_GROUPS = _landmark_pattern(_LANDMARK_FAMILIES)
+
+_EXPLANATION = re.compile(r"EXPLANATION[\s\-]*\n(.*?)(?:\n\n|\n[A-Z]|\Z)", re.DOTALL)
+_ANALYSIS_HEADING = re.compile(r"Initial Recognition|ANALYSIS")
+_DASH_RUN = re.compile(r"[\s\-]*")
+# The analysis ends at the first "Determine", "Journal", "JOURNAL" or "CALCULATIONS"
+_ANALYSIS_END_FAMILIES = ("determine", "journal", "calculations")
+
+# Calculation lines, as (landmark family, label, rest of the pattern,
+# process_func). A label ends where its lazy gap starts, including the
+# whitespace before the gap. The lookarounds only let a gap hand over to a
+# number at its first digit and to a whitespace run at its first character,
+# which is where the patterns without them matched, so a long run is not
+# re-read from every position inside it.
+_NUMBER = r"([0-9,.]+)"
+_DIFFERENCE = rf"=[\s]*{_NUMBER}[\s]*[-−][\s]*{_NUMBER}[\s]*=[\s]*{_NUMBER}"
+_CALCULATION_PATTERNS = [
+    # Pattern for ROU asset calculation
+    ("prime_cost", r"(?:Prime cost|Purchase \+ Import tax \+ Freight|Prime Cost)[:\s]",
+     rf".*?(?<![0-9,.]){_NUMBER}[\s]*\+[\s]*{_NUMBER}[\s]*\+[\s]*{_NUMBER}[\s]*=[\s]*{_NUMBER}",
+     lambda m: {"label": "Prime Cost", "value": float(m.group(4).replace(',', ''))}),
+    ("less", r"(?:Less: Terminal value|Less Terminal value)", rf".*?{_DIFFERENCE}(?:\s*\(ROU\))?",
+     lambda m: {"label": "ROU Asset", "value": float(m.group(3).replace(',', ''))}),
+    ("total_rentals", r"Total rentals over",
+     r"[\s]*([0-9]+)[\s]*years?[\s]*=[\s]*([0-9,.]+)[\s]*[×x][\s]*([0-9]+)[\s]*=[\s]*([0-9,.]+)",
+     lambda m: {"label": "Total Rentals", "value": float(m.group(4).replace(',', ''))}),
+    ("total_rentals", r"Total Rentals[\s]*=[\s]*",
+     rf"(?!\s).*?Rental[\s]*[×x][\s]*Lease Term[\s]*=[\s]*{_NUMBER}[\s]*[×x][\s]*{_NUMBER}[\s]*=[\s]*{_NUMBER}",
+     lambda m: {"label": "Total Rentals", "value": float(m.group(3).replace(',', ''))}),
+    ("deferred", r"Deferred Ijarah Cost", rf"[\s]*{_DIFFERENCE}",
+     lambda m: {"label": "Deferred Ijarah Cost", "value": float(m.group(3).replace(',', ''))}),
+    ("less", r"Less ROU Asset[\s]*=[\s]*", None,
+     lambda m: {"label": "Deferred Ijarah Cost", "value": float(m.group(3).replace(',', ''))}),
+    ("terminal", r"Terminal value difference[\s]*", rf"(?!\s)[\(\[]?.*?[\)\]]?(?:(?<!\s)\s+)?{_DIFFERENCE}",
+     lambda m: {"label": "Terminal Value Difference", "value": float(m.group(3).replace(',', ''))}),
+    ("less", r"Less Terminal Value Difference[\s]*=[\s]*", None,
+     lambda m: {"label": "Terminal Value Difference", "value": float(m.group(3).replace(',', ''))}),
+    ("amortizable", r"Amortizable Amount", rf"[\s]*{_DIFFERENCE}",
+     lambda m: {"label": "Amortizable Amount", "value": float(m.group(3).replace(',', ''))}),
+    # Pattern for Istisna'a profit calculation
+    ("profit", r"Profit", r"[\s]*=[\s]*\$?([0-9,.]+)[\s]*[-−][\s]*\$?([0-9,.]+)[\s]*=[\s]*\$?([0-9,.]+)",
+     lambda m: {"label": "Profit", "value": float(m.group(3).replace(',', ''))}),
+]
+# Labels followed by a lazy gap are only tried once per line; the others match at a fixed position
+_LAZY_LABELS = {0, 1, 3, 6}
+_CALCULATIONS = [
+    (family,
+     re.compile(label, re.IGNORECASE),
+     re.compile(label + rest, re.IGNORECASE) if rest is not None else None,
+     index in _LAZY_LABELS,
+     process_func)
+    for index, (family, label, rest, process_func) in enumerate(_CALCULATION_PATTERNS)
+]
+# "= A - B = C" after a "label = ... - ..." prefix (the original "label=.*?-[\s]*.*?=...")
+_SUBTRACTION = re.compile(rf"=[\s]*{_NUMBER}[\s]*-[\s]*{_NUMBER}[\s]*=[\s]*{_NUMBER}")
+_WHITESPACE = re.compile(r"\s*")
+
+_POC_HEADING = re.compile(r"Quarter[\s\t]*Cumulative Cost[\s\t]*%[\s\t]*Completion")
+_POC_TABLE = re.compile(_POC_HEADING.pattern + r".*?\n(.*?)(?:\n\n|\Z)", re.DOTALL)
+_POC_ROW = re.compile(r"Q([1-4])[\s\t]*\$?([0-9,.]+)[\s\t]*([0-9,.]+)%?[\s\t]*\$?([0-9,.]+)")
+_DOLLAR_AMOUNT = re.compile(r"\$([0-9,.]+)")
+_QUARTER = re.compile(r"Q([1-4])", re.IGNORECASE)
+_PAYMENT = re.compile(r"Payment ([1-4])", re.IGNORECASE)
+_COST = re.compile(r"Cost", re.IGNORECASE)
+_REVENUE = re.compile(r"Revenue", re.IGNORECASE)
+_PROFIT = re.compile(r"Profit", re.IGNORECASE)
+_PAYMENT_ACCOUNT = re.compile(r"(?:Bank|Cash)", re.IGNORECASE)
+
+_AMORTIZABLE_HEADING = re.compile(r"AMORTIZABLE AMOUNT CALCULATION\s*\n")
+_TABLE_END = re.compile(r"\n\n|\n[A-Z]|\Z")
+
+# The header of a section ends at the first run of whitespace or dashes
+# that contains a newline; the lookbehinds start those runs at their first
+# character so a long run is not re-read from every position inside it
+_HEADER_END = r".*?(?:(?<!\s)(?=\s)|(?<!-)(?=-))\s*(?:\n|-+\n)"
+# (name, landmark family, heading, pattern); a section with a heading is only
+# matched at the first occurrence of its heading
+_IJARAH_SECTIONS = [
+    ("analysis", "analysis", None,
+     re.compile(r"(?:## )?ANALYSIS OF IJARAH MBT SCENARIO\s*(?:\n|-+\n)(.*?)(?:\n(?:EXTRACTED|###)|\Z)", re.DOTALL)),
+    ("variables", "extracted", None,
+     re.compile(r"(?:### )?EXTRACTED VARIABLES\s*(?:\n|-+\n)(.*?)(?:\n(?:CALCULATIONS|###)|\Z)", re.DOTALL)),
+    ("calculations", "calculations", None,
+     re.compile(r"(?:### )?CALCULATIONS\s*(?:\n|-+\n)(.*?)(?:\n(?:JOURNAL|###)|\Z)", re.DOTALL)),
+    ("journal_entries", "journal", re.compile(r"(?:### )?JOURNAL ENTR(?:Y|IES)"),
+     re.compile(r"(?:### )?JOURNAL ENTR(?:Y|IES)" + _HEADER_END + r"(.*?)(?:\n(?:EXPLANATION|###)|\Z)", re.DOTALL)),
+    ("explanation", "explanation", None,
+     re.compile(r"(?:### )?EXPLANATION\s*(?:\n|-+\n)(.*?)(?:\n###|\Z)", re.DOTALL)),
+]
+_JOURNAL_HEADING = re.compile(r"JOURNAL ENTR(?:Y|IES)")
+_JOURNAL_SECTION = re.compile(
+    _JOURNAL_HEADING.pattern + _HEADER_END + r"(.*?)(?:\n\n|\nEXPLANATION|\n[A-Z]|\Z)", re.DOTALL
+)
 
 def extract_thinking_process(response_text):
     """
@@ -14,11 +165,101 @@ def extract_thinking_process(response_text):
     Returns:
         str or None: The extracted thinking process if available, None otherwise
     """
-    thinking_match = re.search(r"<think>(.*?)</think>", response_text, re.DOTALL)
-    if thinking_match:
-        return thinking_match.group(1).strip()
+    thinking = find_between(response_text, "<think>", "</think>")
+    if thinking is not None:
+        return thinking.strip()
     return None
 
+def tokenize_response(response_text):
+    """
+    Locate the section headings, table headers and labels of a response in one pass.
+
+    Args:
+        response_text (str): The response text to tokenize
+
+    Returns:
+        dict: Landmark family (see _LANDMARK_FAMILIES) -> list of start offsets in text order
+    """
+    landmarks = {name: [] for name, _, _ in _LANDMARK_FAMILIES}
+    for match in _LANDMARKS.finditer(response_text):
+        landmarks[_LANDMARK_GROUPS[match.lastindex - 1]].append(match.start())
+    return landmarks
+
+def _find_analysis_explanation(text, landmarks):
+    """
+    The text between an "Initial Recognition"/"ANALYSIS" heading line and the next
+    "Determine"/"Journal"/"CALCULATIONS", as the pattern
+    ``(?:Initial Recognition|ANALYSIS)[\s\-]*.*?\n(.*?)(?:Determine|Journal|JOURNAL|CALCULATIONS)``
+    (DOTALL) found it, without retrying every later line when no end marker follows.
+    """
+    heading = next(matches_at(_ANALYSIS_HEADING, text, landmarks["analysis"]), None)
+    if heading is None:
+        return None
+    ends = sorted(start for family in _ANALYSIS_END_FAMILIES for start in landmarks[family])
+    run_end = _DASH_RUN.match(text, heading.end()).end()
+    # The end marker may sit on the heading line itself: the body then starts at
+    # the last newline of the whitespace after the heading
+    for newline in (text.find("\n", run_end), text.rfind("\n", heading.end(), run_end)):
+        if newline != -1:
+            index = bisect_left(ends, newline + 1)
+            if index < len(ends):
+                return text[newline + 1:ends[index]]
+    return None
+
+def _find_subtraction(text, labels):
+    """
+    Find "label = ... - ... = A - B = C", as the pattern
+    ``label[\s]*=[\s]*.*?-[\s]*.*?=[\s]*A[\s]*-[\s]*B[\s]*=[\s]*C`` did, in linear time.
+
+    The lazy gaps stay on one line, except that a "-" ending its line lets
+    the second gap continue on the next line with text. Only the first "-"
+    after the label can start a match on the label's line, as the gap after
+    it reaches every later one.
+
+    Args:
+        text (str): The text to search
+        labels (iterable): The matches of ``label[\s]*=[\s]*`` in text order
+    """
+    for found in first_per_line(text, labels):
+        line_end = _line_end(text, found.end())
+        dash = text.find("-", found.end(), line_end)
+        if dash != -1:
+            ranges = [(dash + 1, line_end)]
+            if text[dash:line_end].rstrip()[-1] == "-" and line_end < len(text):
+                continued = _WHITESPACE.match(text, line_end).end()
+                ranges.append((continued, _line_end(text, continued)))
+            for start, end in ranges:
+                equals = text.find("=", start, end)
+                while equals != -1:
+                    match = _SUBTRACTION.match(text, equals)
+                    if match:
+                        return match
+                    equals = text.find("=", equals + 1, end)
+    return None
+
+def _find_amortizable_table(text, landmarks):
+    """
+    The table body below the AMORTIZABLE AMOUNT CALCULATION heading: the text after
+    the third line break following it, as ``heading\s*\n.*?\n.*?\n(.*?)`` (DOTALL) matched it.
+    """
+    heading = next(matches_at(_AMORTIZABLE_HEADING, text, landmarks["amortizable"]), None)
+    if heading is None:
+        return None
+    # The line break ending the heading; blank lines right after it count towards the three
+    breaks = [index for index in range(heading.start(), heading.end()) if text[index] == "\n"]
+    position = heading.end()
+    for _ in range(2):
+        newline = text.find("\n", position)
+        if newline == -1:
+            break
+        breaks.append(newline)
+        position = newline + 1
+    if len(breaks) < 3:
+        # Later headings have even fewer line breaks after them
+        return None
+    end = _TABLE_END.search(text, breaks[-1] + 1)
+    return text[breaks[-1] + 1:end.start()]
+
 def parse_financial_data(response_text, query_text):
     """
     Parse structured financial data from the response text.
@@ -38,69 +279,49 @@ def parse_financial_data(response_text, query_text):
         "amortizable_amount_table": [],
         "full_response": response_text  # Store the complete formatted response
     }
+    # Only the first MAX_RESPONSE_CHARS characters are parsed
+    response_text = cap_text(response_text, MAX_RESPONSE_CHARS)
+    landmarks = tokenize_response(response_text)
     
     # Extract explanation
-    explanation_match = re.search(r"EXPLANATION[\s\-]*\n(.*?)(?:\n\n|\n[A-Z]|\Z)", response_text, re.DOTALL)
-    if not explanation_match:
-        explanation_match = re.search(r"(?:Initial Recognition|ANALYSIS)[\s\-]*.*?\n(.*?)(?:Determine|Journal|JOURNAL|CALCULATIONS)", response_text, re.DOTALL)
-    
+    explanation_match = next(matches_at(_EXPLANATION, response_text, landmarks["explanation"]), None)
     if explanation_match:
-        result["explanation"] = explanation_match.group(1).strip()
+        explanation = explanation_match.group(1)
+    else:
+        explanation = _find_analysis_explanation(response_text, landmarks)
+    
+    if explanation is not None:
+        result["explanation"] = explanation.strip()
     else:
         # If no specific explanation section, use first paragraph
         paragraphs = response_text.split("\n\n")
         if paragraphs:
             result["explanation"] = paragraphs[0].strip()
     
-    # Extract calculations
-    calculation_patterns = [
-        # Pattern for ROU asset calculation
-        (r"(?:Prime cost|Purchase \+ Import tax \+ Freight|Prime Cost)[:\s].*?([0-9,.]+)[\s]*\+[\s]*([0-9,.]+)[\s]*\+[\s]*([0-9,.]+)[\s]*=[\s]*([0-9,.]+)", 
-         lambda m: {"label": "Prime Cost", "value": float(m.group(4).replace(',', ''))}),
-        (r"(?:Less: Terminal value|Less Terminal value).*?=[\s]*([0-9,.]+)[\s]*[-−][\s]*([0-9,.]+)[\s]*=[\s]*([0-9,.]+)(?:\s*\(ROU\))?", 
-         lambda m: {"label": "ROU Asset", "value": float(m.group(3).replace(',', ''))}),
-        (r"Total rentals over[\s]*([0-9]+)[\s]*years?[\s]*=[\s]*([0-9,.]+)[\s]*[×x][\s]*([0-9]+)[\s]*=[\s]*([0-9,.]+)", 
-         lambda m: {"label": "Total Rentals", "value": float(m.group(4).replace(',', ''))}),
-        (r"Total Rentals[\s]*=[\s]*.*?Rental[\s]*[×x][\s]*Lease Term[\s]*=[\s]*([0-9,.]+)[\s]*[×x][\s]*([0-9,.]+)[\s]*=[\s]*([0-9,.]+)",
-         lambda m: {"label": "Total Rentals", "value": float(m.group(3).replace(',', ''))}),
-        (r"Deferred Ijarah Cost[\s]*=[\s]*([0-9,.]+)[\s]*[-−][\s]*([0-9,.]+)[\s]*=[\s]*([0-9,.]+)", 
-         lambda m: {"label": "Deferred Ijarah Cost", "value": float(m.group(3).replace(',', ''))}),
-        (r"Less ROU Asset[\s]*=[\s]*.*?-[\s]*.*?=[\s]*([0-9,.]+)[\s]*-[\s]*([0-9,.]+)[\s]*=[\s]*([0-9,.]+)",
-         lambda m: {"label": "Deferred Ijarah Cost", "value": float(m.group(3).replace(',', ''))}),
-        (r"Terminal value difference[\s]*[\(\[]?.*?[\)\]]?[\s]*=[\s]*([0-9,.]+)[\s]*[-−][\s]*([0-9,.]+)[\s]*=[\s]*([0-9,.]+)", 
-         lambda m: {"label": "Terminal Value Difference", "value": float(m.group(3).replace(',', ''))}),
-        (r"Less Terminal Value Difference[\s]*=[\s]*.*?-[\s]*.*?=[\s]*([0-9,.]+)[\s]*-[\s]*([0-9,.]+)[\s]*=[\s]*([0-9,.]+)",
-         lambda m: {"label": "Terminal Value Difference", "value": float(m.group(3).replace(',', ''))}),
-        (r"Amortizable Amount[\s]*=[\s]*([0-9,.]+)[\s]*[-−][\s]*([0-9,.]+)[\s]*=[\s]*([0-9,.]+)", 
-         lambda m: {"label": "Amortizable Amount", "value": float(m.group(3).replace(',', ''))}),
-        # Pattern for Istisna'a profit calculation
-        (r"Profit[\s]*=[\s]*\$?([0-9,.]+)[\s]*[-−][\s]*\$?([0-9,.]+)[\s]*=[\s]*\$?([0-9,.]+)", 
-         lambda m: {"label": "Profit", "value": float(m.group(3).replace(',', ''))}),
-    ]
-    
-    for pattern, process_func in calculation_patterns:
-        matches = re.findall(pattern, response_text, re.IGNORECASE)
-        if matches:
-            if isinstance(matches[0], tuple):
-                result["calculations"].append(process_func(re.search(pattern, response_text, re.IGNORECASE)))
-            else:
-                for match in matches:
-                    if isinstance(match, str):
-                        # Handle single group matches differently
-                        continue
-                    result["calculations"].append(process_func(re.search(pattern, response_text, re.IGNORECASE)))
+    # Extract calculations (the first match of each pattern)
+    for family, label, pattern, lazy, process_func in _CALCULATIONS:
+        labels = matches_at(label, response_text, landmarks[family])
+        if pattern is None:
+            match = _find_subtraction(response_text, labels)
+        elif lazy:
+            match = search_per_line(pattern, response_text, labels)
+        else:
+            match = next(matches_at(pattern, response_text, (found.start() for found in labels)), None)
+        if match:
+            result["calculations"].append(process_func(match))
     
     # Extract percentage of completion data for Istisna'a contracts
     if "istisna" in query_text.lower() and "percentage" in query_text.lower():
         try:
             # Find the table with percentage of completion data
-            poc_table_match = re.search(r"Quarter[\s\t]*Cumulative Cost[\s\t]*%[\s\t]*Completion.*?\n(.*?)(?:\n\n|\Z)", response_text, re.DOTALL)
+            poc_heading = next(matches_at(_POC_HEADING, response_text, landmarks["poc_table"]), None)
+            poc_table_match = poc_heading and _POC_TABLE.match(response_text, poc_heading.start())
             if poc_table_match:
                 table_rows = poc_table_match.group(1).strip().split('\n')
                 for row in table_rows:
                     try:
                         # Extract quarter, cost, completion percentage, and profit
-                        match = re.search(r"Q([1-4])[\s\t]*\$?([0-9,.]+)[\s\t]*([0-9,.]+)%?[\s\t]*\$?([0-9,.]+)", row.replace(' ', ''))
+                        match = _POC_ROW.search(row.replace(' ', ''))
                         if match:
                             quarter = match.group(1)
                             cost = float(match.group(2).replace(',', ''))
@@ -114,11 +335,20 @@ def parse_financial_data(response_text, query_text):
                         # Skip rows that don't match the expected format
                         continue
         
+            # The quarter and payment labels of the ledger rows, by number
+            quarter_labels = {}
+            for found in matches_at(_QUARTER, response_text, landmarks["quarter"]):
+                quarter_labels.setdefault(f"Q{found.group(1)}", []).append(found)
+            payment_labels = {}
+            for found in matches_at(_PAYMENT, response_text, landmarks["payment"]):
+                payment_labels.setdefault(int(found.group(1)), []).append(found)
+
             # Extract quarterly accounting entries and build ledger summary
             quarters = ["Q1", "Q2", "Q3", "Q4"]
             ledger_data = []
             
             for q in quarters:
+                quarter_label = quarter_labels.get(q, [])
                 try:
                     work_in_progress = 0
                     receivable = 0
@@ -128,20 +358,20 @@ def parse_financial_data(response_text, query_text):
                     bank_payable = 0
                     
                     # Find cost entries
-                    cost_match = re.search(rf"{q}.*?Cost.*?\$([0-9,.]+)", response_text, re.IGNORECASE)
+                    cost_match = search_chain_at(response_text, quarter_label, [_COST], _DOLLAR_AMOUNT)
                     if cost_match:
                         work_in_progress = float(cost_match.group(1).replace(',', ''))
                         cost_of_sales = work_in_progress
                         bank_payable = work_in_progress
                     
                     # Find revenue entries
-                    revenue_match = re.search(rf"{q}.*?Revenue.*?\$([0-9,.]+)", response_text, re.IGNORECASE)
+                    revenue_match = search_chain_at(response_text, quarter_label, [_REVENUE], _DOLLAR_AMOUNT)
                     if revenue_match:
                         revenue = float(revenue_match.group(1).replace(',', ''))
                         receivable = revenue
                     
                     # Find profit entries
-                    profit_match = re.search(rf"{q}.*?Profit.*?\$([0-9,.]+)", response_text, re.IGNORECASE)
+                    profit_match = search_chain_at(response_text, quarter_label, [_PROFIT], _DOLLAR_AMOUNT)
                     if profit_match:
                         profit = float(profit_match.group(1).replace(',', ''))
                     
@@ -163,7 +393,9 @@ def parse_financial_data(response_text, query_text):
             payment_entries = []
             for i in range(1, 5):
                 try:
-                    payment_match = re.search(rf"Payment {i}.*?(?:Bank|Cash).*?\$([0-9,.]+)", response_text, re.IGNORECASE)
+                    payment_match = search_chain_at(
+                        response_text, payment_labels.get(i, []), [_PAYMENT_ACCOUNT], _DOLLAR_AMOUNT
+                    )
                     if payment_match:
                         amount = float(payment_match.group(1).replace(',', ''))
                         payment_entries.append({
@@ -211,9 +443,9 @@ def parse_financial_data(response_text, query_text):
     # Extract amortizable amount calculation table for Ijarah
     if "ijarah" in query_text.lower() or "lease" in query_text.lower():
         try:
-            amortizable_table_match = re.search(r"AMORTIZABLE AMOUNT CALCULATION\s*\n.*?\n.*?\n(.*?)(?:\n\n|\n[A-Z]|\Z)", response_text, re.DOTALL)
-            if amortizable_table_match:
-                table_rows = amortizable_table_match.group(1).strip().split('\n')
+            amortizable_table = _find_amortizable_table(response_text, landmarks)
+            if amortizable_table is not None:
+                table_rows = amortizable_table.strip().split('\n')
                 for row in table_rows:
                     # Extract description and amount
                     parts = row.split()
@@ -242,30 +474,14 @@ def parse_financial_data(response_text, query_text):
         # Extract sections for structured display
         sections = {}
         
-        # Extract Analysis section - matching both formats
-        analysis_match = re.search(r"(?:## )?ANALYSIS OF IJARAH MBT SCENARIO\s*(?:\n|-+\n)(.*?)(?:\n(?:EXTRACTED|###)|\Z)", response_text, re.DOTALL)
-        if analysis_match:
-            sections["analysis"] = analysis_match.group(1).strip()
-        
-        # Extract Variables section - matching both formats
-        variables_match = re.search(r"(?:### )?EXTRACTED VARIABLES\s*(?:\n|-+\n)(.*?)(?:\n(?:CALCULATIONS|###)|\Z)", response_text, re.DOTALL)
-        if variables_match:
-            sections["variables"] = variables_match.group(1).strip()
-        
-        # Extract Calculations section
-        calculations_match = re.search(r"(?:### )?CALCULATIONS\s*(?:\n|-+\n)(.*?)(?:\n(?:JOURNAL|###)|\Z)", response_text, re.DOTALL)
-        if calculations_match:
-            sections["calculations"] = calculations_match.group(1).strip()
-        
-        # Extract Journal Entries section
-        journal_match = re.search(r"(?:### )?JOURNAL ENTR(?:Y|IES)(?:.*?)\s*(?:\n|-+\n)(.*?)(?:\n(?:EXPLANATION|###)|\Z)", response_text, re.DOTALL)
-        if journal_match:
-            sections["journal_entries"] = journal_match.group(1).strip()
-        
-        # Extract Explanation section
-        explanation_match = re.search(r"(?:### )?EXPLANATION\s*(?:\n|-+\n)(.*?)(?:\n###|\Z)", response_text, re.DOTALL)
-        if explanation_match:
-            sections["explanation"] = explanation_match.group(1).strip()
+        for name, family, heading, pattern in _IJARAH_SECTIONS:
+            starts = landmarks[family]
+            if heading:
+                first = next(matches_at(heading, response_text, starts), None)
+                starts = [first.start()] if first else []
+            match = next(matches_at(pattern, response_text, starts), None)
+            if match:
+                sections[name] = match.group(1).strip()
         
         # Add all sections to the result
         if sections:
@@ -273,12 +489,13 @@ def parse_financial_data(response_text, query_text):
     
     # Extract journal entries
     try:
-        journal_section_match = re.search(r"JOURNAL ENTR(?:Y|IES)(?:.*?)\s*(?:\n|-+\n)(.*?)(?:\n\n|\nEXPLANATION|\n[A-Z]|\Z)", response_text, re.DOTALL)
+        journal_heading = next(matches_at(_JOURNAL_HEADING, response_text, landmarks["journal"]), None)
+        journal_section_match = journal_heading and _JOURNAL_SECTION.match(response_text, journal_heading.start())
         if journal_section_match:
             journal_text = journal_section_match.group(1)
             # Pattern to match both formats: Dr. Right of Use Asset (ROU) 492,000 or Dr. Right of Use Asset (ROU) USD 492,000
-            dr_entries = re.findall(r"Dr\.?\s+(.*?)(?:\s+(?:USD|$)?)?\s+([0-9,.]+)", journal_text, re.IGNORECASE)
-            cr_entries = re.findall(r"Cr\.?\s+(.*?)(?:\s+(?:USD|$)?)?\s+([0-9,.]+)", journal_text, re.IGNORECASE)
+            dr_entries = find_ledger_entries(journal_text, "Dr")
+            cr_entries = find_ledger_entries(journal_text, "Cr")
             
             for account, amount_str in dr_entries:
                 try:
@@ -304,8 +521,8 @@ def parse_financial_data(response_text, query_text):
         
         # If there are no journal entries found through the Journal Entry section, look for entries throughout the text
         if not result["journal_entries"]:
-            all_dr_entries = re.findall(r"Dr\.?\s+(.*?)(?:\s+(?:USD|$)?)?\s+([0-9,.]+)", response_text, re.IGNORECASE)
-            all_cr_entries = re.findall(r"Cr\.?\s+(.*?)(?:\s+(?:USD|$)?)?\s+([0-9,.]+)", response_text, re.IGNORECASE)
+            all_dr_entries = find_ledger_entries(response_text, "Dr")
+            all_cr_entries = find_ledger_entries(response_text, "Cr")
             
             for account, amount_str in all_dr_entries:
                 try:
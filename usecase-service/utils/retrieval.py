@@ -0,0 +1,421 @@
+"""
+Retrieval utilities for the Islamic Finance API.
+Keeps the embedding models and the vector store warm between requests and
+provides a cached, retrieval-only search over the AAOIFI standards corpus.
+The served index version is re-resolved on every request, so a promoted
+rebuild is picked up without restarting the service. Queries are always
+embedded with the model recorded in the index's fingerprint; requesting a
+different model selects the index built with it, or fails.
+"""
+
+import math
+import time
+import threading
+from collections import OrderedDict
+from .constants import (
+    CHROMA_PATH, DEFAULT_EMBEDDING_MODEL, VECTOR_STORE_BACKEND,
+    STANDARD_TYPE_MURABAHA, STANDARD_TYPE_SALAM, STANDARD_TYPE_ISTISNA,
+    STANDARD_TYPE_IJARAH, STANDARD_TYPE_SUKUK, STANDARD_TYPE_MUSHARAKA,
+    SEARCH_DEFAULT_PAGE_SIZE, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_SECONDS, STANDARD_FAS_NUMBERS
+)
+from .index_store import (
+    DEFAULT_INDEX_NAME, index_root_path, list_index_names, resolve_index_path, read_fingerprint
+)
+from .vector_store import open_vector_store
+from .embedding import get_embedding_worker
+from .hierarchical import load_centroids, hierarchical_search
+from .standard_router import get_router, route_standard
+
+# Terms prepended to the query to steer similarity search towards a standard
+STANDARD_SEARCH_TERMS = {
+    STANDARD_TYPE_MURABAHA: "murabaha financing",
+    STANDARD_TYPE_SALAM: "salam contract",
+    STANDARD_TYPE_ISTISNA: "istisna contract",
+    STANDARD_TYPE_IJARAH: "ijarah lease",
+    STANDARD_TYPE_SUKUK: "sukuk investment",
+    STANDARD_TYPE_MUSHARAKA: "musharaka partnership",
+}
+STANDARD_SEARCH_PREFIXES = {
+    standard_type: f"{terms} AAOIFI FAS {STANDARD_FAS_NUMBERS[standard_type]}"
+    for standard_type, terms in STANDARD_SEARCH_TERMS.items()
+}
+
+# Vector stores keyed by (index name, backend) -> (index path, store)
+_vector_stores = {}
+_store_lock = threading.Lock()
+
+# Search results cache: key -> (timestamp, payload)
+_search_cache = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+class EmbeddingModelMismatchError(ValueError):
+    """Raised when queries would be embedded differently from the index being searched."""
+
+def get_embedding_function(embedding_model=DEFAULT_EMBEDDING_MODEL):
+    """
+    Get the embedding function for a model: the process-wide micro-batching
+    worker shared with the semantic cache.
+
+    Args:
+        embedding_model (str): HuggingFace model name
+
+    Returns:
+        EmbeddingWorker: The embedding function (see utils.embedding)
+    """
+    return get_embedding_worker(embedding_model)
+
+def list_indexes():
+    """
+    List the served indexes and the embedding fingerprints they were built with.
+
+    Returns:
+        list: One dict per index with "name", "path" and "fingerprint"
+    """
+    indexes = []
+    for name in list_index_names(CHROMA_PATH):
+        index_path = resolve_index_path(index_root_path(name, CHROMA_PATH))
+        indexes.append({"name": name, "path": index_path, "fingerprint": read_fingerprint(index_path)})
+    return indexes
+
+def resolve_index(embedding_model=None, index_name=None):
+    """
+    Find the index to search and the embedding model its queries must use.
+    Without an index name, a requested model selects the index built with it.
+
+    Args:
+        embedding_model (str): Optional HuggingFace model name requested by the client
+        index_name (str): Optional index name (default: the default index)
+
+    Returns:
+        tuple: (index name, index version path, embedding model)
+
+    Raises:
+        FileNotFoundError: If the index has not been created yet
+        EmbeddingModelMismatchError: If the index was built with another model
+    """
+    if index_name is None and embedding_model:
+        for index in list_indexes():
+            if index["fingerprint"] and index["fingerprint"]["model"] == embedding_model:
+                index_name = index["name"]
+                break
+    index_name = index_name or DEFAULT_INDEX_NAME
+    index_root = index_root_path(index_name, CHROMA_PATH)
+    index_path = resolve_index_path(index_root)
+    if index_path is None:
+        raise FileNotFoundError(f"Index {index_name!r} not found at {index_root}. Please run create_database.py first.")
+
+    fingerprint = read_fingerprint(index_path)
+    if fingerprint is None:
+        # Unversioned databases do not record their model
+        return index_name, index_path, embedding_model or DEFAULT_EMBEDDING_MODEL
+    if embedding_model and embedding_model != fingerprint["model"]:
+        available = ", ".join(
+            f"{index['name']} ({index['fingerprint']['model']})" for index in list_indexes() if index["fingerprint"]
+        )
+        raise EmbeddingModelMismatchError(
+            f"Index {index_name!r} was built with {fingerprint['model']}, not {embedding_model}. "
+            f"Available indexes: {available}"
+        )
+    return index_name, index_path, fingerprint["model"]
+
+def check_embedding_fingerprint(embedding_function, fingerprint, index_name):
+    """
+    Verify that an embedding function produces vectors like the ones stored in an index.
+
+    Raises:
+        EmbeddingModelMismatchError: If the dimension or normalization differs
+    """
+    if not fingerprint or fingerprint.get("dimension") is None:
+        return
+    vector = embedding_function.embed_query("embedding fingerprint check")
+    if len(vector) != fingerprint["dimension"]:
+        raise EmbeddingModelMismatchError(
+            f"Index {index_name!r} stores {fingerprint['dimension']}-dimensional vectors, "
+            f"but {fingerprint['model']} produced {len(vector)} dimensions"
+        )
+    if fingerprint.get("normalized") is not None:
+        normalized = abs(math.sqrt(sum(value * value for value in vector)) - 1.0) < 1e-3
+        if normalized != fingerprint["normalized"]:
+            raise EmbeddingModelMismatchError(
+                f"Index {index_name!r} was built with {'normalized' if fingerprint['normalized'] else 'unnormalized'} "
+                f"embeddings, but the query embeddings are {'normalized' if normalized else 'unnormalized'}"
+            )
+
+def get_vector_store(embedding_model=None, backend=VECTOR_STORE_BACKEND, index_name=None):
+    """
+    Get or open the vector store of an index, with the embedder it was built with.
+    Reopens the store when a new index version has been promoted.
+
+    Args:
+        embedding_model (str): Optional HuggingFace model name; must match the index
+        backend (str): Vector store backend (see utils.vector_store)
+        index_name (str): Optional index name (see resolve_index)
+
+    Returns:
+        The opened vector store
+
+    Raises:
+        FileNotFoundError: If the database has not been created yet
+        EmbeddingModelMismatchError: If the index was built with another model
+    """
+    index_name, index_path, embedding_model = resolve_index(embedding_model, index_name)
+    embedding_function = get_embedding_function(embedding_model)
+    key = (index_name, backend)
+    with _store_lock:
+        loaded = _vector_stores.get(key)
+        if loaded is None or loaded[0] != index_path:
+            check_embedding_fingerprint(embedding_function, read_fingerprint(index_path), index_name)
+            if loaded is not None:
+                # Results cached against the old version are no longer valid
+                clear_search_cache()
+            _vector_stores[key] = (index_path, open_vector_store(index_path, embedding_function, backend))
+        return _vector_stores[key][1]
+
+def build_search_query(query_text, standard_type=None):
+    """
+    Prefix the query with standard-specific terms to focus similarity search.
+
+    Args:
+        query_text (str): The user query
+        standard_type (str): The detected or requested standard type
+
+    Returns:
+        str: The query to embed
+    """
+    prefix = STANDARD_SEARCH_PREFIXES.get(standard_type)
+    if prefix:
+        return f"{prefix} {query_text}"
+    return query_text
+
+def build_search_filter(standard_type=None, folder=None):
+    """
+    Build a Chroma metadata filter from the optional search restrictions.
+
+    Args:
+        standard_type (str): Standard type tagged on chunks by the structure-aware splitter
+        folder (str): Folder metadata as stored by create_database.py
+
+    Returns:
+        dict or None: The filter
+    """
+    conditions = []
+    if standard_type:
+        conditions.append({"standard_type": standard_type})
+    if folder:
+        conditions.append({"folder": folder})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+def similarity_search(db, query_text, k, standard_type=None, folder=None):
+    """
+    Run a similarity search restricted to a standard's chunks.
+
+    Chunks are filtered on their ``standard_type`` metadata. Indexes built
+    before chunks were tagged return nothing for that filter, so the search
+    then falls back to steering the query with standard-specific terms,
+    which does not restrict the results to the standard.
+
+    Args:
+        db (Chroma): The vector store
+        query_text (str): The search text
+        k (int): Number of results
+        standard_type (str): Optional standard type to restrict the search to
+        folder (str): Optional folder metadata filter
+
+    Returns:
+        tuple: (list of (Document, relevance score), the standard restriction
+               applied: "metadata" for the filter, "prefix" for the steered
+               unfiltered search, None without a standard type)
+    """
+    if not standard_type:
+        return db.similarity_search_with_relevance_scores(
+            query_text, k=k, filter=build_search_filter(folder=folder)
+        ), None
+    results = db.similarity_search_with_relevance_scores(
+        query_text, k=k, filter=build_search_filter(standard_type, folder)
+    )
+    if results:
+        return results, "metadata"
+    return db.similarity_search_with_relevance_scores(
+        build_search_query(query_text, standard_type), k=k, filter=build_search_filter(folder=folder)
+    ), "prefix"
+
+def embed_query(query_text, embedding_model=None, index_name=None):
+    """
+    Embed a query with the model of the index it will be searched in.
+
+    Args:
+        query_text (str): The query text
+        embedding_model (str): Optional HuggingFace model name; must match the index
+        index_name (str): Optional index name (see resolve_index)
+
+    Returns:
+        list: The query embedding
+    """
+    _index_name, _index_path, embedding_model = resolve_index(embedding_model, index_name)
+    return get_embedding_function(embedding_model).embed_query(query_text)
+
+def route_standard_type(query_text, query_vector=None, embedding_model=None, index_name=None):
+    """
+    Score every standard type for a query against the centroids of an index.
+
+    Args:
+        query_text (str): The query text
+        query_vector (list): Optional query embedding from embed_query; without
+            it only the keyword prior is used
+        embedding_model (str): Optional HuggingFace model name; must match the index
+        index_name (str): Optional index name (see resolve_index)
+
+    Returns:
+        dict: The routing decision (see utils.standard_router.route_standard)
+    """
+    if query_vector is None:
+        return route_standard(query_text)
+    _index_name, index_path, embedding_model = resolve_index(embedding_model, index_name)
+    router = get_router(index_path, get_embedding_function(embedding_model))
+    return route_standard(query_text, query_vector, router)
+
+def retrieve_context(query_text, k, standard_type=None, folder=None, embedding_model=None, index_name=None,
+                     query_vector=None):
+    """
+    Retrieve the chunks to answer a query with.
+
+    Indexes with standard and section centroids are searched hierarchically:
+    the query is embedded once, routed to the most likely standards and
+    sections, and only their chunks are searched. Older indexes fall back to
+    a flat similarity search.
+
+    Args:
+        query_text (str): The search text
+        k (int): Number of results
+        standard_type (str): Optional standard type to restrict the search to
+        folder (str): Optional folder metadata filter
+        embedding_model (str): Optional HuggingFace model name; must match the index
+        index_name (str): Optional index name (see resolve_index)
+        query_vector (list): Optional query embedding from embed_query
+
+    Returns:
+        tuple: (list of (Document, relevance score), routing dict or None)
+    """
+    index_name, index_path, embedding_model = resolve_index(embedding_model, index_name)
+    db = get_vector_store(embedding_model, index_name=index_name)
+    centroids = load_centroids(index_path)
+    if centroids is None:
+        results, _standard_filter = similarity_search(db, query_text, k, standard_type=standard_type, folder=folder)
+        return results, None
+    if query_vector is None:
+        query_vector = get_embedding_function(embedding_model).embed_query(query_text)
+    return hierarchical_search(db, query_vector, k, centroids, standard_type=standard_type, folder=folder)
+
+def search_chunks(query_text, standard_type=None, page=1, page_size=SEARCH_DEFAULT_PAGE_SIZE,
+                  folder=None, embedding_model=None, index_name=None, use_cache=True):
+    """
+    Retrieve the most relevant chunks for a query without calling an LLM.
+
+    Args:
+        query_text (str): The search text
+        standard_type (str): Optional standard type to restrict the search to
+        page (int): 1-based page number
+        page_size (int): Number of results per page
+        folder (str): Optional folder metadata filter (as stored by create_database.py)
+        embedding_model (str): Optional HuggingFace model name; must match the index
+        index_name (str): Optional index name (see resolve_index)
+        use_cache (bool): Whether to serve and store results in the search cache
+
+    Returns:
+        dict: The page of results with source metadata and relevance scores, and
+              "filter", how the standard type restricted them (see similarity_search)
+    """
+    # Keyed on the served index version so a promoted rebuild never serves stale pages
+    index_name, index_version, embedding_model = resolve_index(embedding_model, index_name)
+    cache_key = (index_version, query_text.strip().lower(), standard_type, page, page_size, folder)
+    if use_cache:
+        cached = get_cached_search(cache_key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+    db = get_vector_store(embedding_model, index_name=index_name)
+
+    # Fetch one extra result to know whether another page exists
+    offset = (page - 1) * page_size
+    results, standard_filter = similarity_search(db, query_text, offset + page_size + 1,
+                                                 standard_type=standard_type, folder=folder)
+    page_results = results[offset:offset + page_size]
+
+    payload = {
+        "query": query_text,
+        "standard_type": standard_type,
+        # "metadata" when results are restricted to the standard, "prefix" when only steered towards it
+        "filter": standard_filter,
+        "folder": folder,
+        "index": index_name,
+        "embedding_model": embedding_model,
+        "page": page,
+        "page_size": page_size,
+        "has_more": len(results) > offset + page_size,
+        "results": [
+            {
+                "content": doc.page_content,
+                "source": doc.metadata.get("source"),
+                "filename": doc.metadata.get("filename"),
+                "folder": doc.metadata.get("folder"),
+                "page": doc.metadata.get("page"),
+                "standard": doc.metadata.get("standard"),
+                "section": doc.metadata.get("section"),
+                "paragraphs": doc.metadata.get("paragraphs"),
+                "score": round(float(score), 4)
+            }
+            for doc, score in page_results
+        ]
+    }
+    if use_cache:
+        cache_search(cache_key, payload)
+    return {**payload, "cached": False}
+
+def get_cached_search(cache_key):
+    """
+    Get a cached search payload if it has not expired.
+
+    Args:
+        cache_key (tuple): The normalized search parameters
+
+    Returns:
+        dict or None: The cached payload
+    """
+    with _search_cache_lock:
+        entry = _search_cache.get(cache_key)
+        if entry is None:
+            return None
+        timestamp, payload = entry
+        if time.time() - timestamp > SEARCH_CACHE_TTL_SECONDS:
+            del _search_cache[cache_key]
+            return None
+        _search_cache.move_to_end(cache_key)
+        return payload
+
+def cache_search(cache_key, payload):
+    """
+    Store a search payload, evicting the least recently used entries.
+
+    Args:
+        cache_key (tuple): The normalized search parameters
+        payload (dict): The search results
+    """
+    with _search_cache_lock:
+        _search_cache[cache_key] = (time.time(), payload)
+        _search_cache.move_to_end(cache_key)
+        while len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+
+def clear_search_cache():
+    """
+    Clear all cached search results.
+
+    Returns:
+        int: Number of entries cleared
+    """
+    with _search_cache_lock:
+        cleared = len(_search_cache)
+        _search_cache.clear()
+        return cleared
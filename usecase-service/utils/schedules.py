@@ -0,0 +1,338 @@
+"""
+Vectorized accounting schedules for the Islamic Finance API.
+
+ijarah_schedules computes the Ijarah Muntahia Bittamleek schedules of any
+number of contracts at once: every input is broadcast to one array of
+contracts, and every schedule is a (contracts, periods) matrix padded with
+zeros after the end of shorter leases. calculate_ijarah_schedule runs it
+on the variables of one scenario, as extract_ijarah_variables returns them.
+
+The amounts follow AAOIFI FAS 28 under the underlying asset cost method:
+the ROU asset is amortized and the deferred Ijarah cost allocated straight
+line over the lease term, every rental pays down the Ijarah liability, and
+at the end of the lease the ROU asset is transferred to the lessee's own
+assets when the purchase option is exercised.
+
+istisna_schedules does the same for the percentage of completion method of
+AAOIFI FAS 10, over the cost curves of a book of Istisna'a contracts, and
+calculate_istisna_schedule runs it on one scenario.
+"""
+
+import re
+import math
+import numpy as np
+from .constants import SCHEDULE_FREQUENCIES, DEFAULT_SCHEDULE_FREQUENCY, DEFAULT_ISTISNA_FREQUENCY
+
+def _period_label(period, periods_per_year):
+    """Return the label of a period numbered from 1 ("Year 2", "Year 2 Q3", "Year 2 Month 7")."""
+    year, within = divmod(period - 1, periods_per_year)
+    if periods_per_year == 1:
+        return f"Year {year + 1}"
+    if periods_per_year == 4:
+        return f"Year {year + 1} Q{within + 1}"
+    return f"Year {year + 1} Month {within + 1}"
+
+def ijarah_schedules(purchase_price, yearly_rental, lease_term, import_tax=0, freight_charges=0,
+                     residual_value=0, purchase_option=0, frequency=DEFAULT_SCHEDULE_FREQUENCY):
+    """
+    Compute the Ijarah MBT totals and per-period schedules of many contracts at once.
+
+    Every amount is a number or an array of contracts; they are broadcast
+    against each other. Lease terms are whole years, as calculate_ijarah_values
+    reads them.
+
+    Args:
+        purchase_price: Purchase price of the leased asset
+        yearly_rental: Rental paid per year
+        lease_term: Lease term, in years
+        import_tax: Import tax paid on the asset
+        freight_charges: Freight charges paid on the asset
+        residual_value: Expected residual value at the end of the lease
+        purchase_option: Price of the purchase option at the end of the lease
+        frequency (str): "yearly", "quarterly" or "monthly"
+
+    Returns:
+        dict: Arrays of contracts: prime_cost, rou_asset, total_rentals,
+              deferred_cost, terminal_value_diff, amortizable_amount,
+              ijarah_liability, transfer_amount (the asset recognized on the
+              terminal transfer) and periods (the number of periods of each
+              lease); and (contracts, periods) matrices: rental, amortization,
+              deferred_cost_allocation, and the closing balances
+              rou_carrying_amount, deferred_cost_balance and liability_balance
+
+    Raises:
+        ValueError: If the frequency is not one of SCHEDULE_FREQUENCIES
+    """
+    if frequency not in SCHEDULE_FREQUENCIES:
+        raise ValueError(f"frequency must be one of {', '.join(SCHEDULE_FREQUENCIES)}")
+    periods_per_year = SCHEDULE_FREQUENCIES[frequency]
+    (purchase_price, yearly_rental, lease_term, import_tax, freight_charges,
+     residual_value, purchase_option) = np.broadcast_arrays(*(
+        np.atleast_1d(np.asarray(value, dtype=np.float64))
+        for value in (purchase_price, yearly_rental, lease_term, import_tax, freight_charges,
+                      residual_value, purchase_option)
+    ))
+    lease_term = np.trunc(lease_term)
+
+    # Totals, as calculate_ijarah_values has always computed them
+    prime_cost = purchase_price + import_tax + freight_charges
+    rou_asset = prime_cost - purchase_option
+    total_rentals = yearly_rental * lease_term
+    deferred_cost = total_rentals - rou_asset
+    terminal_value_diff = residual_value - purchase_option
+    amortizable_amount = rou_asset - terminal_value_diff
+
+    periods = lease_term.astype(np.int64) * periods_per_year
+    periods = np.maximum(periods, 0)
+    elapsed = np.arange(1, int(periods.max(initial=0)) + 1)[None, :]
+    active = elapsed <= periods[:, None]
+    # Periods elapsed at the end of each period, and the share of the lease they make up
+    elapsed = np.minimum(elapsed, periods[:, None])
+    share = elapsed / np.maximum(periods, 1)[:, None]
+
+    per_period = active / np.maximum(periods, 1)[:, None]
+    amortization = amortizable_amount[:, None] * per_period
+    deferred_cost_allocation = deferred_cost[:, None] * per_period
+    rental = np.where(active, (yearly_rental / periods_per_year)[:, None], 0.0)
+
+    # Closing balances, exact at the end of each lease
+    ended = elapsed == periods[:, None]
+    rou_carrying_amount = np.where(ended, terminal_value_diff[:, None],
+                                   rou_asset[:, None] - amortizable_amount[:, None] * share)
+    deferred_cost_balance = np.where(ended, 0.0, deferred_cost[:, None] * (1 - share))
+    liability_balance = np.where(ended, 0.0, total_rentals[:, None] * (1 - share))
+
+    return {
+        "prime_cost": prime_cost,
+        "rou_asset": rou_asset,
+        "total_rentals": total_rentals,
+        "deferred_cost": deferred_cost,
+        "terminal_value_diff": terminal_value_diff,
+        "amortizable_amount": amortizable_amount,
+        "ijarah_liability": total_rentals,
+        # The ROU carrying amount left at the end plus the purchase option price paid
+        "transfer_amount": terminal_value_diff + purchase_option,
+        "periods": periods,
+        "rental": rental,
+        "amortization": amortization,
+        "deferred_cost_allocation": deferred_cost_allocation,
+        "rou_carrying_amount": rou_carrying_amount,
+        "deferred_cost_balance": deferred_cost_balance,
+        "liability_balance": liability_balance,
+    }
+
+def calculate_ijarah_schedule(variables, frequency=DEFAULT_SCHEDULE_FREQUENCY):
+    """
+    Compute the per-period schedule of one Ijarah MBT scenario.
+
+    Args:
+        variables (dict): The extracted variables, as extract_ijarah_variables returns them
+        frequency (str): "yearly", "quarterly" or "monthly"
+
+    Returns:
+        dict: The totals (see calculate_ijarah_values), "schedule", a list with
+              one row per period, and "terminal_transfer", the amounts of the
+              entry transferring the asset at the end of the lease
+    """
+    schedules = ijarah_schedules(
+        variables.get('purchase_price', 0), variables.get('yearly_rental', 0), int(variables.get('lease_term', 0)),
+        import_tax=variables.get('import_tax', 0), freight_charges=variables.get('freight_charges', 0),
+        residual_value=variables.get('residual_value', 0), purchase_option=variables.get('purchase_option', 0),
+        frequency=frequency
+    )
+    result = {
+        name: float(schedules[name][0])
+        for name in ('prime_cost', 'rou_asset', 'total_rentals', 'deferred_cost', 'terminal_value_diff',
+                     'amortizable_amount', 'ijarah_liability')
+    }
+
+    periods_per_year = SCHEDULE_FREQUENCIES[frequency]
+    columns = {
+        name: schedules[name][0].tolist()
+        for name in ('rental', 'amortization', 'deferred_cost_allocation', 'rou_carrying_amount',
+                     'deferred_cost_balance', 'liability_balance')
+    }
+    result['schedule'] = [
+        {"period": _period_label(index + 1, periods_per_year),
+         **{name: values[index] for name, values in columns.items()}}
+        for index in range(int(schedules['periods'][0]))
+    ]
+    result['frequency'] = frequency
+    result['terminal_transfer'] = {
+        'accumulated_amortization': result['amortizable_amount'],
+        'rou_asset': result['rou_asset'],
+        'purchase_option': float(variables.get('purchase_option', 0)),
+        'transfer_amount': float(schedules['transfer_amount'][0]),
+    }
+    return result
+
+_ISTISNA_PERIOD_NAMES = {"yearly": "Year", "quarterly": "Quarter", "monthly": "Month"}
+
+def istisna_schedules(contract_value, total_cost, period_costs, billings=None, contractor_payments=None):
+    """
+    Compute the percentage of completion schedules of many Istisna'a contracts at once.
+
+    Contracts are rows and periods columns: shorter contracts are padded with
+    zero costs, billings and payments, which leaves their cumulative figures
+    unchanged after their last period.
+
+    Args:
+        contract_value: Price of each contract with the customer
+        total_cost: Total estimated cost of each contract; for a parallel
+            Istisna'a, the price of the parallel contract with the manufacturer
+        period_costs: (contracts, periods) costs incurred in each period
+        billings: (contracts, periods) amounts billed to and received from
+            the customer in each period, if any
+        contractor_payments: (contracts, periods) payments to the manufacturer
+            of a parallel Istisna'a in each period, if any
+
+    Returns:
+        dict: Arrays of contracts: expected_profit and profit_margin (in
+              percent); and (contracts, periods) matrices: period_cost,
+              cumulative_cost, completion (in percent, at most 100), the
+              cumulative revenue and profit, incremental_revenue,
+              incremental_profit, billed, contractor_payment, and the
+              closing receivable_balance (revenue not yet received) and
+              payable_balance (costs not yet paid to the manufacturer),
+              both negative while billings or payments run ahead of the work
+    """
+    period_costs = np.atleast_2d(np.asarray(period_costs, dtype=np.float64))
+    contract_value = np.atleast_1d(np.asarray(contract_value, dtype=np.float64))
+    total_cost = np.atleast_1d(np.asarray(total_cost, dtype=np.float64))
+    contracts = np.broadcast_shapes(contract_value.shape, total_cost.shape, period_costs.shape[:1])[0]
+    shape = (contracts, period_costs.shape[1])
+    period_costs = np.broadcast_to(period_costs, shape)
+    contract_value = np.broadcast_to(contract_value, (contracts,))
+    total_cost = np.broadcast_to(total_cost, (contracts,))
+    billed = np.zeros(shape) if billings is None else np.broadcast_to(np.asarray(billings, dtype=np.float64), shape)
+    contractor_payment = (np.zeros(shape) if contractor_payments is None
+                          else np.broadcast_to(np.asarray(contractor_payments, dtype=np.float64), shape))
+
+    expected_profit = contract_value - total_cost
+    profit_margin = expected_profit / np.where(contract_value != 0, contract_value, 1.0) * 100
+    profit_margin = np.where(contract_value != 0, profit_margin, 0.0)
+
+    cumulative_cost = np.cumsum(period_costs, axis=1)
+    estimated = total_cost[:, None]
+    completion = np.minimum(cumulative_cost / np.where(estimated > 0, estimated, 1.0), 1.0)
+    # Rounding in the cost curve must not leave a completed contract short of 100%
+    completion = np.where(np.isclose(cumulative_cost, estimated, rtol=1e-9, atol=0), 1.0, completion)
+    completion = np.where(estimated > 0, completion, 0.0)
+
+    revenue = contract_value[:, None] * completion
+    profit = expected_profit[:, None] * completion
+    return {
+        "expected_profit": expected_profit,
+        "profit_margin": profit_margin,
+        "period_cost": period_costs,
+        "cumulative_cost": cumulative_cost,
+        "completion": completion * 100,
+        "revenue": revenue,
+        "profit": profit,
+        "incremental_revenue": np.diff(revenue, axis=1, prepend=0.0),
+        "incremental_profit": np.diff(profit, axis=1, prepend=0.0),
+        "billed": billed,
+        "contractor_payment": contractor_payment,
+        "receivable_balance": revenue - np.cumsum(billed, axis=1),
+        "payable_balance": cumulative_cost - np.cumsum(contractor_payment, axis=1),
+    }
+
+def _per_period(amounts, periods):
+    """Return a list of per-period amounts cut or padded with zeros to ``periods`` periods."""
+    amounts = [float(amount) for amount in amounts][:periods]
+    return amounts + [0.0] * (periods - len(amounts))
+
+def calculate_istisna_schedule(variables, frequency=DEFAULT_ISTISNA_FREQUENCY):
+    """
+    Compute the percentage of completion schedule of one Istisna'a scenario.
+
+    Costs follow the scenario's cost curve ("cost_curve", the cost incurred
+    in each period) or are spread evenly over "periods" periods. Without
+    either, the periods cover the "delivery_period" (in months, rounded up
+    to whole periods: an 18-month contract runs over 6 quarters), or one
+    year of periods when the scenario gives no delivery period. Customer
+    billings come from "billings", one amount per period. Upfront and
+    completion payments are payments to the manufacturer of the parallel
+    Istisna'a, made in the first and the last period, unless
+    "contractor_payments" lists them per period.
+
+    Args:
+        variables (dict): The extracted variables, as extract_istisna_variables
+            returns them, with the scenario as "description"
+        frequency (str): "yearly", "quarterly" or "monthly"
+
+    Returns:
+        dict: contract_value, total_cost, expected_profit, profit_margin,
+              frequency, and quarterly_progress, a list with one row per period
+
+    Raises:
+        ValueError: If the frequency is not yearly, quarterly or monthly
+    """
+    if frequency not in SCHEDULE_FREQUENCIES:
+        raise ValueError(f"frequency must be one of {', '.join(SCHEDULE_FREQUENCIES)}")
+    contract_value = float(variables.get('contract_value', 0))
+    total_cost = float(variables.get('total_cost', 0))
+
+    # A parallel Istisna'a states the cost as the price of the parallel contract
+    if total_cost == 0 and "parallel istisna'a" in str(variables).lower():
+        description = variables.get('description', '').lower()
+        if 'cost' in description and '$' in description:
+            cost_match = re.search(r'cost:?\s*\$?([0-9,.]+)', description)
+            if cost_match:
+                total_cost = float(cost_match.group(1).replace(',', ''))
+
+    if variables.get('cost_curve'):
+        periods = len(variables['cost_curve'])
+        period_costs = _per_period(variables['cost_curve'], periods)
+    else:
+        if 'periods' in variables:
+            periods = int(variables['periods'])
+        elif variables.get('delivery_period'):
+            months_per_period = 12 // SCHEDULE_FREQUENCIES[frequency]
+            periods = math.ceil(float(variables['delivery_period']) / months_per_period)
+        else:
+            periods = SCHEDULE_FREQUENCIES[frequency]
+        periods = max(periods, 1)
+        period_costs = [total_cost / periods] * periods
+
+    if variables.get('contractor_payments'):
+        contractor_payments = _per_period(variables['contractor_payments'], periods)
+    else:
+        contractor_payments = [0.0] * periods
+        contractor_payments[0] += float(variables.get('upfront_payment', 0))
+        contractor_payments[-1] += float(variables.get('completion_payment', 0))
+
+    schedules = istisna_schedules(contract_value, total_cost, [period_costs],
+                                  billings=[_per_period(variables.get('billings', []), periods)],
+                                  contractor_payments=[contractor_payments])
+    columns = {
+        name: schedules[name][0].tolist()
+        for name in ('period_cost', 'cumulative_cost', 'completion', 'revenue', 'profit', 'incremental_revenue',
+                     'incremental_profit', 'billed', 'contractor_payment', 'receivable_balance', 'payable_balance')
+    }
+    period_name = _ISTISNA_PERIOD_NAMES[frequency]
+    quarterly_progress = [
+        {
+            'period': f"{period_name} {index + 1}",
+            'cumulative_cost': columns['cumulative_cost'][index],
+            'percentage_of_completion': columns['completion'][index],
+            'revenue': columns['revenue'][index],
+            'profit': columns['profit'][index],
+            'incremental_revenue': columns['incremental_revenue'][index],
+            'incremental_profit': columns['incremental_profit'][index],
+            'quarterly_cost': columns['period_cost'][index],
+            'billed': columns['billed'][index],
+            'contractor_payment': columns['contractor_payment'][index],
+            'receivable_balance': columns['receivable_balance'][index],
+            'payable_balance': columns['payable_balance'][index],
+        }
+        for index in range(periods)
+    ]
+    return {
+        'contract_value': contract_value,
+        'total_cost': total_cost,
+        'expected_profit': float(schedules['expected_profit'][0]),
+        'profit_margin': float(schedules['profit_margin'][0]),
+        'frequency': frequency,
+        'quarterly_progress': quarterly_progress,
+    }
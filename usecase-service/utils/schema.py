@@ -0,0 +1,305 @@
+"""
+Structured (JSON) answers for the Islamic Finance API.
+
+In the "json" output format the LLM answers with an object following
+USECASE_RESPONSE_SCHEMA instead of the text layout of the standard's
+prompt. The answer is validated here and returned as is, so no numbers
+have to be recovered from text; markdown is only rendered for display.
+"""
+
+import json
+import re
+
+_STRING = {"type": "string"}
+_NUMBER = {"type": "number"}
+_ENTRY_LINE = {
+    "type": "object",
+    "properties": {"account": _STRING, "amount": _NUMBER},
+    "required": ["account", "amount"],
+}
+
+USECASE_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "analysis": {
+            "type": "object",
+            "properties": {
+                "transaction_type": _STRING,
+                "applicable_standard": _STRING,
+                "accounting_method": _STRING,
+            },
+        },
+        "variables": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"name": _STRING, "value": _NUMBER, "unit": _STRING},
+                "required": ["name", "value"],
+            },
+        },
+        "calculations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"label": _STRING, "formula": _STRING, "value": _NUMBER},
+                "required": ["label", "value"],
+            },
+        },
+        "journal_entries": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "description": _STRING,
+                    "debits": {"type": "array", "items": _ENTRY_LINE},
+                    "credits": {"type": "array", "items": _ENTRY_LINE},
+                },
+                "required": ["debits", "credits"],
+            },
+        },
+        "explanation": _STRING,
+    },
+    "required": ["variables", "calculations", "journal_entries", "explanation"],
+}
+
+# Appended to the prompt of the "json" output format. Braces are doubled as
+# the prompt is a ChatPromptTemplate
+STRUCTURED_OUTPUT_INSTRUCTIONS = """
+
+ANSWER WITH A SINGLE JSON OBJECT FOLLOWING THIS JSON SCHEMA, WITHOUT ANY TEXT BEFORE OR AFTER IT:
+{schema}
+
+- "variables": every monetary value, rate and term of the scenario; "unit" is the currency code, "%" or the time unit
+- "calculations": each step of the calculation, with "formula" showing the operation on the actual numbers
+- "journal_entries": the journal entries, each with its debit and credit lines
+- "explanation": a concise explanation of the accounting treatment and its compliance with Islamic finance principles
+- Amounts are plain numbers, without currency symbols or thousands separators
+""".replace("{schema}", json.dumps(USECASE_RESPONSE_SCHEMA)).replace("{", "{{").replace("}", "}}")
+
+# A number with an optional currency, thousands separators and percent sign ("USD 1,250.50", "$300", "5%")
+_NUMBER_TEXT = re.compile(r"\s*(?:[A-Za-z]{3}|\$)?\s*(-?[0-9][0-9,]*(?:\.[0-9]+)?)\s*%?\s*")
+
+def _to_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = _NUMBER_TEXT.fullmatch(value)
+        if match:
+            return float(match.group(1).replace(",", ""))
+    return None
+
+def _validate(value, schema, path, errors):
+    """Return ``value`` reduced to the properties of ``schema``, recording what does not conform in ``errors``."""
+    expected = schema["type"]
+    if expected == "object":
+        if not isinstance(value, dict):
+            errors.append(f"{path} must be an object")
+            return None
+        result = {}
+        for name in schema.get("required", []):
+            if value.get(name) is None:
+                errors.append(f"{path}.{name} is required")
+        for name, property_schema in schema["properties"].items():
+            if value.get(name) is not None:
+                result[name] = _validate(value[name], property_schema, f"{path}.{name}", errors)
+        return result
+    if expected == "array":
+        if not isinstance(value, list):
+            errors.append(f"{path} must be an array")
+            return None
+        return [_validate(item, schema["items"], f"{path}[{index}]", errors) for index, item in enumerate(value)]
+    if expected == "number":
+        number = _to_number(value)
+        if number is None:
+            errors.append(f"{path} must be a number")
+        return number
+    if not isinstance(value, str):
+        errors.append(f"{path} must be a string")
+        return None
+    return value.strip()
+
+def validate_structured_response(data):
+    """
+    Validate a structured answer against USECASE_RESPONSE_SCHEMA.
+
+    Amounts given as text ("USD 1,250", "5%") are converted to numbers and
+    properties outside the schema are dropped.
+
+    Args:
+        data: The decoded JSON answer
+
+    Returns:
+        dict: The validated answer
+
+    Raises:
+        ValueError: If the answer does not follow the schema
+    """
+    errors = []
+    result = _validate(data, USECASE_RESPONSE_SCHEMA, "response", errors)
+    if errors:
+        raise ValueError("Invalid structured response: " + "; ".join(errors[:10]))
+    return result
+
+def load_json_object(response_text):
+    """
+    Decode the JSON object of an LLM's output.
+
+    Reasoning in <think> tags and Markdown code fences around the JSON
+    object are ignored.
+
+    Args:
+        response_text (str): The LLM's output
+
+    Returns:
+        The decoded JSON value
+
+    Raises:
+        ValueError: If the output holds no valid JSON object
+    """
+    thinking_end = response_text.rfind("</think>")
+    if thinking_end != -1:
+        response_text = response_text[thinking_end + len("</think>"):]
+    start = response_text.find("{")
+    end = response_text.rfind("}") + 1
+    if start == -1 or end <= start:
+        raise ValueError("The response does not contain a JSON object")
+    try:
+        return json.loads(response_text[start:end])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"The response is not valid JSON: {e}")
+
+def load_structured_response(response_text):
+    """
+    Decode and validate a structured answer from the LLM's output.
+
+    Args:
+        response_text (str): The LLM's output
+
+    Returns:
+        dict: The validated answer
+
+    Raises:
+        ValueError: If the output holds no valid JSON object following the schema
+    """
+    return validate_structured_response(load_json_object(response_text))
+
+def load_variable_values(response_text, names):
+    """
+    Decode the variable values of an LLM's output.
+
+    Args:
+        response_text (str): The LLM's output, a JSON object of values by variable name
+        names: The names of the requested variables
+
+    Returns:
+        dict: The values given as numbers, by name; null, missing and
+              non-numeric values are left out
+
+    Raises:
+        ValueError: If the output holds no valid JSON object
+    """
+    data = load_json_object(response_text)
+    if not isinstance(data, dict):
+        raise ValueError("The response is not a JSON object")
+    values = {}
+    for name in names:
+        number = _to_number(data.get(name))
+        if number is not None:
+            values[name] = number
+    return values
+
+def _format_amount(value):
+    return f"{value:,.2f}"
+
+def _format_variable(value, unit):
+    if unit in ("$", "USD"):
+        return f"${value:,.2f}"
+    if unit == "%":
+        return f"{value:g}%"
+    if unit and len(unit) == 3 and unit.isupper():
+        # Other currency codes
+        return f"{unit} {value:,.2f}"
+    number = f"{value:,.2f}".rstrip("0").rstrip(".")
+    return f"{number} {unit}" if unit else number
+
+def render_structured_response(data):
+    """
+    Render a validated structured answer as Markdown for display.
+
+    Args:
+        data (dict): The validated answer
+
+    Returns:
+        str: The Markdown answer, in the layout of the calculated responses
+    """
+    parts = []
+    analysis = data.get("analysis", {})
+    transaction_type = analysis.get("transaction_type")
+    parts.append(f"## ANALYSIS OF {transaction_type.upper()}" if transaction_type else "## ANALYSIS")
+    parts.append("")
+    for key, title in (("transaction_type", "Transaction Type"), ("applicable_standard", "Applicable Standard"),
+                       ("accounting_method", "Accounting Method")):
+        if analysis.get(key):
+            parts.append(f"**{title}:** {analysis[key]}")
+    parts.append("")
+
+    parts.append("### EXTRACTED VARIABLES")
+    for variable in data["variables"]:
+        parts.append(f"**{variable['name']}:** {_format_variable(variable['value'], variable.get('unit'))}")
+    parts.append("")
+
+    parts.append("### CALCULATIONS")
+    parts.append("")
+    for calculation in data["calculations"]:
+        formula = f" = {calculation['formula']}" if calculation.get("formula") else ""
+        parts.append(f"**{calculation['label']}**{formula} = {_format_amount(calculation['value'])}")
+    parts.append("")
+
+    parts.append("### JOURNAL ENTRIES")
+    parts.append("")
+    for entry in data["journal_entries"]:
+        if entry.get("description"):
+            parts.append(f"**{entry['description']}:**")
+        for line in entry["debits"]:
+            parts.append(f"**Dr.** {line['account']:<36} {_format_amount(line['amount'])}")
+        for line in entry["credits"]:
+            parts.append(f"    **Cr.** {line['account']:<32} {_format_amount(line['amount'])}")
+        parts.append("")
+
+    parts.append("### EXPLANATION")
+    parts.append(data["explanation"])
+    return "\n".join(parts)
+
+def structured_to_financial_data(data, response_text=None):
+    """
+    Convert a structured answer to the result of parse_financial_data.
+
+    The ledger summary, amortizable amount table and sections that calculated
+    answers carry besides the schema's properties are kept as they are.
+
+    Args:
+        data (dict): The structured answer
+        response_text (str, optional): The rendered answer, if it was rendered
+
+    Returns:
+        dict: Structured financial data, as parse_financial_data returns it
+    """
+    journal_entries = []
+    for entry in data["journal_entries"]:
+        journal_entries.extend({"debit": line["account"], "amount": line["amount"]} for line in entry["debits"])
+        journal_entries.extend({"credit": line["account"], "amount": line["amount"]} for line in entry["credits"])
+    result = {
+        "explanation": data["explanation"],
+        "calculations": [
+            {"label": calculation["label"], "value": calculation["value"]} for calculation in data["calculations"]
+        ],
+        "journal_entries": journal_entries,
+        "ledger_summary": data.get("ledger_summary", []),
+        "amortizable_amount_table": data.get("amortizable_amount_table", []),
+        "full_response": response_text,
+    }
+    if data.get("sections"):
+        result["sections"] = data["sections"]
+    return result
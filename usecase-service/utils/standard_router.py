@@ -0,0 +1,269 @@
+"""
+Standard routing for the Islamic Finance API.
+
+Classifies a query against one centroid embedding per standard type, built
+from the index's standard centroids and the validated examples. Keyword
+matches act as a prior instead of a first-match cascade, so a query
+mentioning several standards is scored on all of them, and the router
+returns a probability for every standard type. The query embedding is the
+one computed for retrieval, so routing adds no embedding call.
+"""
+
+import os
+import threading
+import numpy as np
+from .constants import (
+    STANDARD_TYPE_MURABAHA, STANDARD_TYPE_SALAM, STANDARD_TYPE_ISTISNA,
+    STANDARD_TYPE_IJARAH, STANDARD_TYPE_SUKUK, STANDARD_TYPE_MUSHARAKA, STANDARD_FAS_NUMBERS
+)
+from .examples import EXAMPLES_FILE, load_examples
+from .hierarchical import load_centroids
+from .keyword_matcher import KeywordMatcher
+
+# Keyword ties are broken in this order
+STANDARD_TYPES = (
+    STANDARD_TYPE_MUSHARAKA, STANDARD_TYPE_MURABAHA, STANDARD_TYPE_SALAM,
+    STANDARD_TYPE_ISTISNA, STANDARD_TYPE_IJARAH, STANDARD_TYPE_SUKUK
+)
+
+# Each standard's own terms; its "aaoifi fas N" keyword comes from FAS_STANDARD_TYPES,
+# so every standard number is a keyword of exactly one standard type
+STANDARD_TERMS = {
+    STANDARD_TYPE_MUSHARAKA: [
+        'musharaka', 'musharakah', 'sharikah', 'partnership', 'joint venture',
+        'profit sharing', 'capital contribution', 'diminishing musharaka'
+    ],
+    STANDARD_TYPE_MURABAHA: [
+        'murabaha', 'murabahah', 'cost plus sale', 'cost-plus financing',
+        'deferred payment sale'
+    ],
+    STANDARD_TYPE_SALAM: [
+        'salam', 'salaam', 'advance payment', 'future delivery',
+        'parallel salam'
+    ],
+    STANDARD_TYPE_ISTISNA: [
+        'istisna', "istisna'a", 'istisna`a', 'manufacturing contract',
+        'construction contract', 'parallel istisna'
+    ],
+    STANDARD_TYPE_IJARAH: [
+        'ijarah', 'ijara', 'lease', 'leasing',
+        'muntahia bittamleek', 'ijara wa iqtina',
+        'right of use', 'rou'
+    ],
+    STANDARD_TYPE_SUKUK: [
+        'sukuk', 'investment certificates', 'islamic bonds',
+        'asset-backed securities'
+    ],
+}
+
+STANDARD_KEYWORDS = {
+    standard_type: terms + [f"aaoifi fas {STANDARD_FAS_NUMBERS[standard_type]}"]
+    for standard_type, terms in STANDARD_TERMS.items()
+}
+
+# Whole words only ("rou" must not match "through"), allowing plural and verb endings
+_KEYWORD_MATCHER = KeywordMatcher(STANDARD_KEYWORDS, whole_words=True, ignore_case=True)
+
+# Pseudo-count of every standard type in the keyword prior
+PRIOR_SMOOTHING = 1.0
+
+# Weight of the validated examples against the corpus in a standard's centroid
+EXAMPLE_WEIGHT = 0.5
+
+# Softmax temperature used when there are too few validated examples to fit one
+ROUTER_TEMPERATURE = 0.05
+CALIBRATION_TEMPERATURES = (0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.2)
+
+# Below this probability the embedding router defers to the keyword label
+MIN_CONFIDENCE = 0.5
+
+# Router centroids keyed by (index path, examples file mtime)
+_router_cache = {}
+_router_lock = threading.Lock()
+
+def keyword_scan(query_text):
+    """
+    Find the keywords of every standard type in a query in one pass.
+
+    Args:
+        query_text (str): The query text
+
+    Returns:
+        dict: "counts" (standard type -> number of distinct matching keywords) and
+        "positions" (standard type -> list of (start, keyword)), see KeywordMatcher.scan
+    """
+    return _KEYWORD_MATCHER.scan(query_text)
+
+def keyword_hits(query_text):
+    """
+    Count the distinct keywords of every standard type found in a query.
+
+    Args:
+        query_text (str): The query text
+
+    Returns:
+        dict: Standard type -> number of distinct matching keywords
+    """
+    return keyword_scan(query_text)["counts"]
+
+def keyword_label(hits):
+    """Return the standard type with the most keyword hits, or None if nothing matched."""
+    best = max(STANDARD_TYPES, key=lambda standard_type: hits[standard_type])
+    return best if hits[best] else None
+
+def keyword_prior(hits):
+    """Turn keyword hits into a smoothed probability for every standard type."""
+    counts = np.array([PRIOR_SMOOTHING + hits[standard_type] for standard_type in STANDARD_TYPES])
+    return counts / counts.sum()
+
+def _normalize(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+def _softmax(similarities, temperature):
+    scaled = (similarities - similarities.max()) / temperature
+    weights = np.exp(scaled)
+    return weights / weights.sum()
+
+def calibrate_temperature(matrix, vectors, labels):
+    """
+    Pick the softmax temperature minimising the negative log-likelihood of labelled vectors.
+
+    Args:
+        matrix (numpy.ndarray): One centroid per row
+        vectors (numpy.ndarray): Normalized labelled query vectors
+        labels (list): Row of the correct centroid for every vector
+
+    Returns:
+        float: The temperature
+    """
+    similarities = vectors @ matrix.T
+    best, best_loss = ROUTER_TEMPERATURE, None
+    for temperature in CALIBRATION_TEMPERATURES:
+        loss = -sum(np.log(_softmax(row, temperature)[label] + 1e-12) for row, label in zip(similarities, labels))
+        if best_loss is None or loss < best_loss:
+            best, best_loss = temperature, loss
+    return best
+
+def build_router(index_path, embedding_function):
+    """
+    Build one centroid per standard type from the index's centroids and the validated examples.
+
+    The softmax temperature is fitted on the validated examples against the
+    corpus centroids, which do not contain them, when at least two standard
+    types have examples.
+
+    Args:
+        index_path (str): Directory of the served index version
+        embedding_function: The index's embedding function, used for the examples
+
+    Returns:
+        dict or None: "standard_types", "matrix" (one centroid per row) and
+            "temperature", or None if no standard type has a centroid
+    """
+    corpus = {}
+    centroids = load_centroids(index_path)
+    if centroids is not None:
+        for entry, vector in zip(centroids["standards"], centroids["standard_matrix"]):
+            if entry.get("standard_type") in STANDARD_KEYWORDS:
+                corpus.setdefault(entry["standard_type"], []).append(vector * entry["chunks"])
+        corpus = {standard_type: _normalize(np.sum(vectors, axis=0)) for standard_type, vectors in corpus.items()}
+
+    queries, query_types = [], []
+    for standard_type, examples in load_examples().items():
+        if standard_type in STANDARD_KEYWORDS:
+            for example in examples:
+                queries.append(example["query"])
+                query_types.append(standard_type)
+    example_vectors = (np.array([_normalize(np.asarray(v, dtype=np.float32))
+                                 for v in embedding_function.embed_documents(queries)])
+                       if queries else np.zeros((0, 0), dtype=np.float32))
+
+    temperature = ROUTER_TEMPERATURE
+    labelled = [i for i, standard_type in enumerate(query_types) if standard_type in corpus]
+    if len(corpus) > 1 and len({query_types[i] for i in labelled}) > 1:
+        corpus_types = [standard_type for standard_type in STANDARD_TYPES if standard_type in corpus]
+        temperature = calibrate_temperature(
+            np.stack([corpus[standard_type] for standard_type in corpus_types]),
+            example_vectors[labelled],
+            [corpus_types.index(query_types[i]) for i in labelled]
+        )
+
+    standard_types, rows = [], []
+    for standard_type in STANDARD_TYPES:
+        positions = [i for i, query_type in enumerate(query_types) if query_type == standard_type]
+        example_centroid = _normalize(example_vectors[positions].mean(axis=0)) if positions else None
+        corpus_centroid = corpus.get(standard_type)
+        if corpus_centroid is not None and example_centroid is not None:
+            centroid = _normalize((1 - EXAMPLE_WEIGHT) * corpus_centroid + EXAMPLE_WEIGHT * example_centroid)
+        else:
+            centroid = corpus_centroid if corpus_centroid is not None else example_centroid
+        if centroid is not None:
+            standard_types.append(standard_type)
+            rows.append(centroid)
+    if not rows:
+        return None
+    return {"standard_types": standard_types, "matrix": np.stack(rows).astype(np.float32), "temperature": temperature}
+
+def get_router(index_path, embedding_function):
+    """Return the router of an index version, rebuilt when the validated examples change."""
+    try:
+        examples_mtime = os.path.getmtime(EXAMPLES_FILE)
+    except OSError:
+        examples_mtime = None
+    key = (index_path, examples_mtime)
+    with _router_lock:
+        if key in _router_cache:
+            return _router_cache[key]
+    router = build_router(index_path, embedding_function)
+    with _router_lock:
+        for stale in [k for k in _router_cache if k[0] == index_path]:
+            del _router_cache[stale]
+        _router_cache[key] = router
+    return router
+
+def route_standard(query_text, query_vector=None, router=None):
+    """
+    Score every standard type for a query.
+
+    Without a query vector or router only the keyword prior is used.
+
+    Args:
+        query_text (str): The query text
+        query_vector (list): The query embedding computed for retrieval
+        router (dict): Router from get_router
+
+    Returns:
+        dict: "standard_type" (the chosen type or None), "confidence" (its
+            probability), "scores" (probability of every standard type, highest
+            first), "keyword_hits", "keyword_positions" (the (start, keyword)
+            matches of every standard type with a hit) and "method" ("embedding" or "keywords")
+    """
+    scan = keyword_scan(query_text)
+    hits = scan["counts"]
+    prior = keyword_prior(hits)
+    label = keyword_label(hits)
+    if query_vector is None or router is None:
+        scores = dict(zip(STANDARD_TYPES, prior))
+        method = "keywords"
+    else:
+        vector = _normalize(np.asarray(query_vector, dtype=np.float32))
+        likelihood = dict(zip(router["standard_types"],
+                              _softmax(router["matrix"] @ vector, router["temperature"])))
+        # Standard types without a centroid are neither favoured nor penalised
+        missing = 1.0 / len(STANDARD_TYPES)
+        posterior = np.array([p * likelihood.get(standard_type, missing) for standard_type, p in zip(STANDARD_TYPES, prior)])
+        scores = dict(zip(STANDARD_TYPES, posterior / posterior.sum()))
+        best = max(scores, key=scores.get)
+        if scores[best] >= MIN_CONFIDENCE:
+            label = best
+        method = "embedding"
+    return {
+        "standard_type": label,
+        "confidence": round(float(scores[label]), 4) if label else 0.0,
+        "scores": {standard_type: round(float(score), 4)
+                   for standard_type, score in sorted(scores.items(), key=lambda item: -item[1])},
+        "keyword_hits": {standard_type: count for standard_type, count in hits.items() if count},
+        "keyword_positions": {standard_type: matches for standard_type, matches in scan["positions"].items() if matches},
+        "method": method
+    }
@@ -0,0 +1,200 @@
+"""
+Linear-time text scanning primitives for parsing LLM responses and scenarios.
+
+Patterns such as ``label.*?other.*?\\$([0-9,.]+)`` backtrack: every
+occurrence of the label rescans the rest of its line, once per occurrence
+of ``other``, so a long pasted contract can pin a worker for seconds. The
+helpers here return the same first match as those patterns while reading
+each character a bounded number of times:
+
+- a lazy ``.*?`` gap cannot cross a newline, so once a label has failed,
+  later labels whose gap lies on the same line fail too and are skipped;
+- a chain of ``.*?`` gaps only needs the first occurrence of each step.
+"""
+
+import re
+from bisect import bisect_left
+
+def cap_text(text, limit):
+    """Truncate a text to at most ``limit`` characters (no limit if ``limit`` is falsy)."""
+    if not text or not limit or len(text) <= limit:
+        return text
+    return text[:limit]
+
+def find_between(text, start, end):
+    """
+    Return the text between the first ``start`` and the next ``end`` marker, like ``start(.*?)end`` with DOTALL.
+
+    Returns:
+        str or None: The enclosed text, None if the markers are missing
+    """
+    begin = text.find(start)
+    if begin == -1:
+        return None
+    finish = text.find(end, begin + len(start))
+    if finish == -1:
+        # Later start markers have even less text after them
+        return None
+    return text[begin + len(start):finish]
+
+def _line_end(text, position):
+    end = text.find("\n", position)
+    return len(text) if end == -1 else end
+
+def matches_at(pattern, text, starts):
+    """
+    Match a pattern at given offsets, such as the landmarks of a tokenized response.
+
+    Args:
+        pattern (re.Pattern): The pattern to match
+        text (str): The text to match in
+        starts (iterable): Offsets in ``text``, in text order
+
+    Returns:
+        generator: The successful matches, in text order
+    """
+    for start in starts:
+        match = pattern.match(text, start)
+        if match:
+            yield match
+
+def first_per_line(text, anchors):
+    """
+    Skip the anchors whose lazy gap lies on the line of an anchor already yielded.
+
+    A lazy ``.*?`` gap starts where its anchor ends and cannot cross a
+    newline, so a later anchor ending on the same line only reaches part of
+    what the gap after the earlier one reached. The anchor pattern must
+    include any whitespace run that precedes the gap.
+
+    Args:
+        text (str): The text the anchors were found in
+        anchors (iterable): Non-overlapping anchor matches, in text order
+
+    Returns:
+        generator: The anchors worth trying
+    """
+    line_end = -1
+    for found in anchors:
+        if found.end() <= line_end:
+            continue
+        yield found
+        line_end = _line_end(text, found.end())
+
+def search_per_line(pattern, text, anchors):
+    """
+    Search a pattern whose anchor is followed by a lazy, line-bounded ``.*?`` gap.
+
+    Each line is only scanned by the gap of the first anchor ending on it
+    (see ``first_per_line``).
+
+    Args:
+        pattern (re.Pattern): The full pattern, starting with the anchor
+        text (str): The text to search
+        anchors (iterable): The matches of the pattern's leading part, up to its
+            lazy gap, in text order (such as ``anchor.finditer(text)``)
+
+    Returns:
+        re.Match or None: The first match, as ``pattern.search(text)`` would return it
+    """
+    return next(matches_at(pattern, text, (found.start() for found in first_per_line(text, anchors))), None)
+
+def search_chain(text, steps, value):
+    """
+    Find ``step1.*?step2.*?...value`` on one line, returning the value match.
+
+    Equivalent to searching the concatenated pattern without DOTALL: on each
+    line only the first occurrence of every step can lead to a match, so
+    the line is read once instead of once per occurrence.
+
+    Args:
+        text (str): The text to search
+        steps (list): Compiled patterns that must occur in order on one line
+        value (re.Pattern): Compiled pattern of the captured value, after the last step
+
+    Returns:
+        re.Match or None: The value match
+    """
+    return search_chain_at(text, steps[0].finditer(text), steps[1:], value)
+
+def search_chain_at(text, firsts, steps, value):
+    """
+    ``search_chain`` for a first step that was already found.
+
+    Args:
+        text (str): The text to search
+        firsts (iterable): Non-overlapping matches of the first step, in text order
+        steps (list): Compiled patterns of the later steps
+        value (re.Pattern): Compiled pattern of the captured value, after the last step
+
+    Returns:
+        re.Match or None: The value match
+    """
+    position = 0
+    for first in firsts:
+        if first.start() < position:
+            # Only the first occurrence on a line can lead to a match
+            continue
+        line_end = _line_end(text, first.start())
+        end = first.end()
+        for step in steps:
+            found = step.search(text, end, line_end)
+            if found is None:
+                break
+            end = found.end()
+        else:
+            match = value.search(text, end, line_end)
+            if match:
+                return match
+        position = line_end + 1
+    return None
+
+# An entry amount: whitespace, an optional "USD" and whitespace, then the number
+_ENTRY_AMOUNT = re.compile(r"\s+(?:usd\s+)?([0-9,.]+)", re.IGNORECASE)
+# Starts of the whitespace runs an entry amount can begin with (zero-width, so they may overlap)
+_ENTRY_AMOUNT_START = re.compile(r"(?<!\s)(?=\s+(?:usd\s+)?[0-9,.])", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+_NEWLINE = re.compile(r"\n")
+
+def find_ledger_entries(text, marker):
+    """
+    Find journal entry lines such as "Dr. Cash USD 1,000" in one pass.
+
+    Returns what ``re.findall(marker + r"\\.?\\s+(.*?)(?:\\s+(?:USD|$)?)?\\s+([0-9,.]+)",
+    text, re.IGNORECASE)`` returns: the account is the shortest text on the
+    marker's line followed by whitespace and an amount.
+
+    Args:
+        text (str): The text to scan
+        marker (str): "Dr" or "Cr"
+
+    Returns:
+        list: (account, amount string) tuples in text order
+    """
+    starts = re.compile(re.escape(marker) + r"\.?(?=\s)", re.IGNORECASE)
+    amount_starts = [match.start() for match in _ENTRY_AMOUNT_START.finditer(text)]
+    newlines = [match.start() for match in _NEWLINE.finditer(text)]
+    entries = []
+    position = 0
+    while True:
+        found = starts.search(text, position)
+        if found is None:
+            return entries
+        run_end = _SPACES.match(text, found.end()).end()
+        # The account cannot contain a newline; the amount may follow on the next line
+        index = bisect_left(newlines, run_end)
+        line_end = newlines[index] if index < len(newlines) else len(text)
+        index = bisect_left(amount_starts, run_end)
+        amount = None
+        if index < len(amount_starts) and amount_starts[index] <= line_end:
+            account_end = amount_starts[index]
+            amount = _ENTRY_AMOUNT.match(text, account_end)
+        elif run_end - found.end() >= 2:
+            # No amount after the account: the amount may directly follow the marker
+            account_end = run_end - 1
+            amount = _ENTRY_AMOUNT.match(text, account_end)
+        if amount is None:
+            position = found.start() + 1
+            continue
+        entries.append((text[run_end:account_end] if account_end >= run_end else "", amount.group(1)))
+        position = amount.end()
@@ -0,0 +1,315 @@
+"""
+Vector store backends for the Islamic Finance API.
+
+Chroma is the default backend. The in-memory backends read every vector of
+the served Chroma index once, build an approximate nearest neighbour index
+in process memory (HNSW with hnswlib, or IVF with FAISS) and answer queries
+without going through Chroma's persistence layer. All backends expose the
+part of the LangChain vector store interface the service uses, so callers
+do not depend on the backend in use. Scores follow Chroma's relevance scale
+(``1 - squared L2 distance / sqrt(2)``) whatever the backend.
+"""
+
+import json
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain.schema import Document
+from langchain_community.vectorstores import Chroma
+from .constants import (
+    VECTOR_STORE_BACKEND, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, IVF_NPROBE
+)
+
+BACKEND_CHROMA = "chroma"
+BACKEND_EXACT = "exact"
+BACKEND_HNSW = "hnsw"
+BACKEND_IVF = "ivf"
+
+# Filtered searches fetch this many times more neighbours before filtering
+FILTER_OVERSAMPLE = 4
+
+# Filters matching at most this fraction of the chunks are answered by an
+# exact scan of the matching chunks, so cost scales with the partition size
+EXACT_FILTER_FRACTION = 0.25
+FILTER_CACHE_SIZE = 256
+
+def matches_filter(metadata, where):
+    """
+    Evaluate a Chroma ``where`` filter against a chunk's metadata.
+    Supports equality, $eq, $ne, $in, $nin, $and and $or.
+
+    Args:
+        metadata (dict): Chunk metadata
+        where (dict): The filter
+
+    Returns:
+        bool: True if the metadata matches
+    """
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+def relevance_score(squared_distance):
+    """Convert a squared L2 distance to Chroma's relevance score."""
+    return 1.0 - float(squared_distance) / math.sqrt(2)
+
+class InMemoryVectorStore:
+    """Exact nearest neighbour search over vectors held in memory; base of the ANN backends."""
+
+    backend = BACKEND_EXACT
+
+    def __init__(self, ids, vectors, documents, metadatas, embedding_function=None):
+        self.ids = list(ids)
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.documents = list(documents)
+        self.metadatas = [metadata or {} for metadata in metadatas]
+        self.embedding_function = embedding_function
+        self._squared_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        self._filter_cache = OrderedDict()
+        self._filter_lock = threading.Lock()
+
+    @classmethod
+    def from_chroma(cls, db, embedding_function=None, **params):
+        """
+        Load every vector of an opened Chroma store into a new in-memory store.
+
+        Args:
+            db (Chroma): The opened Chroma store
+            embedding_function: Embedding function used to embed query text
+            **params: Backend-specific index parameters
+
+        Returns:
+            InMemoryVectorStore: The loaded store
+        """
+        data = db._collection.get(include=["embeddings", "documents", "metadatas"])
+        embeddings = data["embeddings"]
+        vectors = np.asarray(embeddings if embeddings is not None and len(embeddings) else np.zeros((0, 0)),
+                             dtype=np.float32)
+        return cls(data["ids"], vectors, data["documents"], data["metadatas"], embedding_function, **params)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def set_search_params(self, **params):
+        """Tune search parameters; exact search has none."""
+
+    def _exact_search(self, vector, k, candidates=None):
+        if candidates is None:
+            vectors, norms, positions = self.vectors, self._squared_norms, None
+        else:
+            positions = np.asarray(candidates, dtype=np.int64)
+            vectors, norms = self.vectors[positions], self._squared_norms[positions]
+        if len(vectors) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        distances = norms - 2 * (vectors @ vector) + float(vector @ vector)
+        k = min(k, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        indices = top if positions is None else positions[top]
+        return indices, np.maximum(distances[top], 0)
+
+    def _search(self, vector, k):
+        """Return (indices, squared distances) of the ``k`` nearest vectors."""
+        return self._exact_search(vector, k)
+
+    def _filter_positions(self, where):
+        """Return the positions of the chunks matching a filter, cached per filter."""
+        key = json.dumps(where, sort_keys=True)
+        with self._filter_lock:
+            if key in self._filter_cache:
+                self._filter_cache.move_to_end(key)
+                return self._filter_cache[key]
+        positions = np.array([i for i, metadata in enumerate(self.metadatas) if matches_filter(metadata, where)],
+                             dtype=np.int64)
+        with self._filter_lock:
+            self._filter_cache[key] = positions
+            while len(self._filter_cache) > FILTER_CACHE_SIZE:
+                self._filter_cache.popitem(last=False)
+        return positions
+
+    def _result(self, index, distance):
+        document = Document(page_content=self.documents[index], metadata=self.metadatas[index])
+        return document, relevance_score(distance)
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4, filter=None, **kwargs):
+        """
+        Find the chunks nearest to a query vector.
+
+        Args:
+            embedding (list): The query vector
+            k (int): Number of results
+            filter (dict): Optional Chroma-style metadata filter
+
+        Returns:
+            list: (Document, relevance score) tuples, most relevant first
+        """
+        if not self.ids:
+            return []
+        vector = np.asarray(embedding, dtype=np.float32)
+        if not filter:
+            indices, distances = self._search(vector, min(k, len(self.ids)))
+            return [self._result(i, d) for i, d in zip(indices, distances)]
+
+        candidates = self._filter_positions(filter)
+        if len(candidates) <= EXACT_FILTER_FRACTION * len(self.ids):
+            indices, distances = self._exact_search(vector, k, candidates)
+            return [self._result(i, d) for i, d in zip(indices, distances)]
+
+        # Oversample from the ANN index; fall back to exact search over the
+        # matching chunks when too few neighbours match
+        fetch = min(len(self.ids), k * FILTER_OVERSAMPLE)
+        indices, distances = self._search(vector, fetch)
+        results = [(i, d) for i, d in zip(indices, distances) if matches_filter(self.metadatas[i], filter)]
+        if len(results) < k and fetch < len(self.ids):
+            indices, distances = self._exact_search(vector, k, candidates)
+            results = list(zip(indices, distances))
+        return [self._result(i, d) for i, d in results[:k]]
+
+    def similarity_search_with_relevance_scores(self, query, k=4, filter=None, **kwargs):
+        embedding = self.embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _score in self.similarity_search_with_relevance_scores(query, k=k, filter=filter)]
+
+class HnswVectorStore(InMemoryVectorStore):
+    """HNSW graph index built with hnswlib; ``ef_search`` trades recall for latency."""
+
+    backend = BACKEND_HNSW
+
+    def __init__(self, ids, vectors, documents, metadatas, embedding_function=None,
+                 m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH):
+        super().__init__(ids, vectors, documents, metadatas, embedding_function)
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("The hnsw vector store backend requires hnswlib (pip install hnswlib)")
+        self.ef_search = ef_search
+        self._ef_lock = threading.Lock()
+        self.index = None
+        if len(self.ids):
+            self.index = hnswlib.Index(space="l2", dim=self.vectors.shape[1])
+            self.index.init_index(max_elements=len(self.ids), M=m, ef_construction=ef_construction)
+            self.index.add_items(self.vectors, np.arange(len(self.ids)))
+            self.index.set_ef(ef_search)
+
+    def set_search_params(self, ef_search=None, **params):
+        if ef_search:
+            with self._ef_lock:
+                self.ef_search = ef_search
+                if self.index is not None:
+                    self.index.set_ef(ef_search)
+
+    def _search(self, vector, k):
+        if k <= self.ef_search:
+            labels, distances = self.index.knn_query(vector, k=k)
+        else:
+            # hnswlib needs ef >= k to return k results
+            with self._ef_lock:
+                self.index.set_ef(k)
+                try:
+                    labels, distances = self.index.knn_query(vector, k=k)
+                finally:
+                    self.index.set_ef(self.ef_search)
+        return labels[0].astype(np.int64), distances[0]
+
+class IvfVectorStore(InMemoryVectorStore):
+    """Inverted file index built with FAISS; ``nprobe`` trades recall for latency."""
+
+    backend = BACKEND_IVF
+
+    def __init__(self, ids, vectors, documents, metadatas, embedding_function=None,
+                 nlist=None, nprobe=IVF_NPROBE):
+        super().__init__(ids, vectors, documents, metadatas, embedding_function)
+        try:
+            import faiss
+        except ImportError:
+            raise ImportError("The ivf vector store backend requires FAISS (pip install faiss-cpu)")
+        self.index = None
+        if len(self.ids):
+            dim = self.vectors.shape[1]
+            # About 4 * sqrt(n) lists, with enough training points per list
+            nlist = nlist or max(1, min(int(4 * math.sqrt(len(self.ids))), len(self.ids) // 39 or 1))
+            self.quantizer = faiss.IndexFlatL2(dim)
+            self.index = faiss.IndexIVFFlat(self.quantizer, dim, nlist)
+            self.index.train(self.vectors)
+            self.index.add(self.vectors)
+            self.index.nprobe = min(nprobe, nlist)
+
+    def set_search_params(self, nprobe=None, **params):
+        if nprobe and self.index is not None:
+            self.index.nprobe = min(nprobe, self.index.nlist)
+
+    def _search(self, vector, k):
+        distances, labels = self.index.search(vector.reshape(1, -1), k)
+        found = labels[0] >= 0
+        return labels[0][found].astype(np.int64), distances[0][found]
+
+def search_by_vector(db, embedding, k=4, filter=None):
+    """
+    Search any backend with a precomputed query vector.
+
+    Args:
+        db: An opened vector store
+        embedding (list): The query vector
+        k (int): Number of results
+        filter (dict): Optional Chroma-style metadata filter
+
+    Returns:
+        list: (Document, relevance score) tuples, most relevant first
+    """
+    if isinstance(db, InMemoryVectorStore):
+        return db.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter)
+    # Chroma returns raw distances for vector queries
+    embedding = [float(value) for value in embedding]
+    return [(doc, relevance_score(distance))
+            for doc, distance in db.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter)]
+
+IN_MEMORY_BACKENDS = {
+    BACKEND_EXACT: InMemoryVectorStore,
+    BACKEND_HNSW: HnswVectorStore,
+    BACKEND_IVF: IvfVectorStore,
+}
+VECTOR_STORE_BACKENDS = (BACKEND_CHROMA,) + tuple(IN_MEMORY_BACKENDS)
+
+def open_vector_store(index_path, embedding_function, backend=VECTOR_STORE_BACKEND, **params):
+    """
+    Open the index at ``index_path`` with the requested backend.
+
+    Args:
+        index_path (str): Directory of the Chroma index version
+        embedding_function: Embedding function used to embed query text
+        backend (str): One of VECTOR_STORE_BACKENDS
+        **params: Backend-specific index parameters (e.g. ef_search, nprobe)
+
+    Returns:
+        The opened vector store
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    if backend not in VECTOR_STORE_BACKENDS:
+        raise ValueError(f"Unknown vector store backend {backend!r}; expected one of {', '.join(VECTOR_STORE_BACKENDS)}")
+    db = Chroma(persist_directory=index_path, embedding_function=embedding_function)
+    if backend == BACKEND_CHROMA:
+        return db
+    return IN_MEMORY_BACKENDS[backend].from_chroma(db, embedding_function, **params)